@@ -20,7 +20,8 @@ def analyze_overlap(ticker="AMD"):
     
     # Override Watchlist
     run.WHALE_WATCHLIST = [ticker]
-    run.WHALE_HISTORY = {}
+    run.WHALE_DEDUPE.seen.clear()
+    run.WHALE_DEDUPE.volumes.clear()
     
     # 1. Fetch Both
     print("   Fetching Polygon...")
@@ -1340,11 +1340,18 @@ document.addEventListener('DOMContentLoaded', () => {
     function initWhaleStream() {
         const evtSource = new EventSource(`${API_BASE_URL}/api/whales/stream`);
 
+        // Full snapshot (on connect + periodic resync)
         evtSource.onmessage = function (event) {
             const response = JSON.parse(event.data);
             handleWhaleData(response);
         };
 
+        // Delta: only the whales added since the last message (already-seen trades are skipped anyway)
+        evtSource.addEventListener('delta', function (event) {
+            const { added, stale, timestamp } = JSON.parse(event.data);
+            handleWhaleData({ data: added, stale, timestamp });
+        });
+
         evtSource.onerror = function (err) {
             console.warn("🐳 SSE Stream Error:", err);
             updateStatus('status-whales', false);
@@ -1765,6 +1772,14 @@ document.addEventListener('DOMContentLoaded', () => {
             const res = await fetch(`/api/gamma?symbol=${ticker}`);
             const data = await res.json();
 
+            // Cold symbol: server is computing it in the background - poll again shortly
+            if (data.loading) {
+                if (ticker === currentGammaTicker) {
+                    setTimeout(() => fetchGammaWall(ticker), (data.retry_after || 2) * 1000);
+                }
+                return;
+            }
+
             if (data.error) {
                 console.error("Gamma Error:", data.error);
                 if (gammaChartBars) {
@@ -0,0 +1,299 @@
+"""
+Bar Store - On-disk columnar OHLCV bars, partitioned by underlying and date
+
+Chart endpoints used to refetch the same option/stock aggregates from Polygon on
+every request. Bars are now kept as NumPy structured arrays (.npy), one file per
+<underlying>/<ET date>/<ticker>__<resolution>:
+1. Past trading days are immutable: fetched once, then memory-mapped on read
+2. Missing days are grouped into contiguous ranges -> one upstream call per range
+3. Today stays in memory and is topped up from its last bar every today_ttl seconds
+4. Survives restarts (files under /tmp, override with BAR_STORE_DIR); prune() drops
+   partitions past the retention window
+5. resample_bars(): 5m / 15m / 1h / 1d built locally from stored 1-minute bars
+   (vectorized OHLC, summed volume/transactions, volume-weighted VWAP)
+
+Columns follow the Polygon aggregate keys: t (ms), o, h, l, c, v, vw, n.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytz
+
+BAR_DTYPE = np.dtype([
+    ("t", np.int64), ("o", np.float64), ("h", np.float64), ("l", np.float64),
+    ("c", np.float64), ("v", np.float64), ("vw", np.float64), ("n", np.int64)
+])
+BAR_FIELDS = BAR_DTYPE.names
+EASTERN = pytz.timezone("US/Eastern")
+
+
+def default_bar_dir():
+    return os.environ.get("BAR_STORE_DIR") or os.path.join(tempfile.gettempdir(), "pigmentos_bars")
+
+
+def underlying_of(ticker):
+    """'O:NVDA260116C00150000' -> 'NVDA', 'SPY' -> 'SPY'."""
+    clean = ticker.split(":", 1)[-1]
+    i = 0
+    while i < len(clean) and clean[i].isalpha():
+        i += 1
+    return clean[:i] or clean
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def to_array(bars):
+    """Polygon bar dicts -> BAR_DTYPE array sorted by t (missing fields are 0)."""
+    arr = np.zeros(len(bars), dtype=BAR_DTYPE)
+    for name in BAR_FIELDS:
+        arr[name] = [bar.get(name) or 0 for bar in bars]
+    arr.sort(order="t")
+    return arr
+
+
+def to_dicts(arr):
+    """BAR_DTYPE array -> list of Polygon-shaped bar dicts."""
+    columns = [arr[name].tolist() for name in BAR_FIELDS]
+    return [dict(zip(BAR_FIELDS, row)) for row in zip(*columns)]
+
+
+def day_bounds_ms(day):
+    """[start, end) of an ET calendar day in epoch ms."""
+    start = EASTERN.localize(datetime(day.year, day.month, day.day))
+    end = EASTERN.localize(datetime(day.year, day.month, day.day) + timedelta(days=1))
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+RESAMPLE_UNIT_MS = {"minute": 60_000, "hour": 3_600_000}
+
+
+def resample_bars(arr, timespan, multiplier=1):
+    """
+    Aggregate ascending 1-minute bars into multiplier x timespan bars.
+    minute/hour windows are epoch-aligned like Polygon's (ET offsets are whole
+    hours); day bars are ET sessions stamped at ET midnight. Returns None for
+    timespans it can't build (week, month, multi-day).
+    """
+    if timespan == "day":
+        if multiplier != 1:
+            return None
+    elif timespan not in RESAMPLE_UNIT_MS:
+        return None
+    if not len(arr):
+        return np.zeros(0, dtype=BAR_DTYPE)
+
+    t = arr["t"]
+    if timespan == "day":
+        first = datetime.fromtimestamp(t[0] / 1000, EASTERN).date()
+        last = datetime.fromtimestamp(t[-1] / 1000, EASTERN).date()
+        starts_ms = np.array([day_bounds_ms(first + timedelta(days=i))[0]
+                              for i in range((last - first).days + 1)], dtype=np.int64)
+        keys = np.searchsorted(starts_ms, t, side="right") - 1
+        bucket_t = starts_ms[keys]
+    else:
+        width = RESAMPLE_UNIT_MS[timespan] * multiplier
+        bucket_t = t - t % width
+        keys = bucket_t
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.append(starts[1:], len(arr)) - 1
+
+    volume = np.add.reduceat(arr["v"], starts)
+    notional = np.add.reduceat(arr["vw"] * arr["v"], starts)
+    close = arr["c"][ends]
+
+    out = np.zeros(len(starts), dtype=BAR_DTYPE)
+    out["t"] = bucket_t[starts]
+    out["o"] = arr["o"][starts]
+    out["h"] = np.maximum.reduceat(arr["h"], starts)
+    out["l"] = np.minimum.reduceat(arr["l"], starts)
+    out["c"] = close
+    out["v"] = volume
+    out["vw"] = np.divide(notional, volume, out=close.copy(), where=volume > 0)
+    out["n"] = np.add.reduceat(arr["n"], starts)
+    return out
+
+
+class BarStore:
+
+    def __init__(self, directory=None, today_ttl=60, retention_days=120):
+        self.directory = directory or default_bar_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.today_ttl = today_ttl
+        self.retention_days = retention_days
+        self.today = {}  # {(ticker, resolution, day): (bars, fetched_at)}
+        self.lock = threading.Lock()
+        self.counters = {
+            "reads": 0, "partitions_hit": 0, "partitions_fetched": 0, "upstream_calls": 0,
+            "upstream_failures": 0, "today_hits": 0, "today_refreshes": 0, "bars_served": 0
+        }
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counters[key] += n
+
+    def _path(self, ticker, resolution, day):
+        safe = "".join(c if c.isalnum() else "_" for c in ticker)
+        return os.path.join(self.directory, underlying_of(ticker), day.isoformat(), f"{safe}__{resolution}.npy")
+
+    def _load(self, path):
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, path, arr):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def read(self, ticker, resolution, start_day, end_day, fetch):
+        """
+        Bars for ticker in [start_day, end_day] (ET dates, weekends skipped), ascending.
+
+        fetch(ticker, frm, to) -> list of bar dicts or None, where frm/to are
+        'YYYY-MM-DD' dates or epoch ms. Returns (bars, failed): failed is True if an
+        upstream call failed, in which case those days are simply left out.
+        """
+        self._count("reads")
+        today = datetime.now(EASTERN).date()
+        start_day, end_day = _as_date(start_day), min(_as_date(end_day), today)
+        days = []
+        day = start_day
+        while day <= end_day:
+            if day.weekday() < 5:
+                days.append(day)
+            day += timedelta(days=1)
+
+        parts = {}
+        missing = []  # indexes into days
+        for i, day in enumerate(days):
+            if day == today:
+                continue
+            arr = self._load(self._path(ticker, resolution, day))
+            if arr is None:
+                missing.append(i)
+            else:
+                parts[day] = arr
+                self._count("partitions_hit")
+
+        failed = False
+        for lo, hi in self._ranges(missing):
+            first, last = days[lo], days[hi]
+            self._count("upstream_calls")
+            bars = fetch(ticker, first.isoformat(), last.isoformat())
+            if bars is None:
+                self._count("upstream_failures")
+                failed = True
+                continue
+            arr = to_array(bars)
+            for day in days[lo:hi + 1]:
+                start_ms, end_ms = day_bounds_ms(day)
+                part = arr[(arr["t"] >= start_ms) & (arr["t"] < end_ms)]
+                self._save(self._path(ticker, resolution, day), part)
+                parts[day] = part
+                self._count("partitions_fetched")
+
+        if days and days[-1] == today:
+            part = self._today_bars(ticker, resolution, today, fetch)
+            if part is None:
+                failed = True
+            else:
+                parts[today] = part
+
+        ordered = [parts[day] for day in days if day in parts]
+        bars = np.concatenate(ordered) if ordered else np.zeros(0, dtype=BAR_DTYPE)
+        self._count("bars_served", len(bars))
+        return bars, failed
+
+    @staticmethod
+    def _ranges(indexes):
+        """[0, 1, 2, 5, 6] -> [(0, 2), (5, 6)]"""
+        ranges = []
+        for i in indexes:
+            if ranges and i == ranges[-1][1] + 1:
+                ranges[-1][1] = i
+            else:
+                ranges.append([i, i])
+        return ranges
+
+    def _today_bars(self, ticker, resolution, today, fetch):
+        """Today's (still growing) bars: cached for today_ttl, then topped up from the last bar."""
+        key = (ticker, resolution, today)
+        now = time.time()
+        entry = self.today.get(key)
+        if entry and now - entry[1] < self.today_ttl:
+            self._count("today_hits")
+            return entry[0]
+
+        start_ms, end_ms = day_bounds_ms(today)
+        if entry and len(entry[0]):
+            # The last bar may still have been forming - refetch it with everything after
+            frm = int(entry[0]["t"][-1])
+            base = entry[0][entry[0]["t"] < frm]
+        else:
+            frm = today.isoformat()
+            base = np.zeros(0, dtype=BAR_DTYPE)
+
+        self._count("upstream_calls")
+        bars = fetch(ticker, frm, today.isoformat())
+        if bars is None:
+            self._count("upstream_failures")
+            return entry[0] if entry else None
+
+        fresh = to_array(bars)
+        fresh = fresh[(fresh["t"] >= max(start_ms, frm if isinstance(frm, int) else 0)) & (fresh["t"] < end_ms)]
+        arr = np.concatenate([base, fresh])
+        with self.lock:
+            for stale in [k for k in self.today if k[2] != today]:
+                del self.today[stale]
+            self.today[key] = (arr, now)
+        self._count("today_refreshes")
+        return arr
+
+    def prune(self):
+        """Delete date partitions older than retention_days."""
+        cutoff = (datetime.now(EASTERN).date() - timedelta(days=self.retention_days)).isoformat()
+        removed = 0
+        try:
+            underlyings = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for underlying in underlyings:
+            if not underlying.is_dir():
+                continue
+            for partition in os.scandir(underlying.path):
+                if partition.is_dir() and partition.name < cutoff:
+                    shutil.rmtree(partition.path, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["today_series"] = len(self.today)
+        counters["directory"] = self.directory
+        counters["retention_days"] = self.retention_days
+        return counters
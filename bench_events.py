@@ -0,0 +1,157 @@
+"""
+Benchmark: events.WhaleEvent / SweepEvent records vs the old per-event dicts
+
+Builds N synthetic whale and sweep events in the old dict shape (as the
+scanners / WS handlers emitted them) and as records, and reports the traced
+memory per event plus the cost of producing the Fish Finder / feed payloads.
+
+Usage: python bench_events.py [events ...]
+"""
+
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from events import SweepEvent, WhaleEvent, format_money
+
+TICKERS = ["NVDA", "TSLA", "AAPL", "AMD", "META", "MSFT", "AMZN", "GOOGL", "SPY", "QQQ"]
+
+
+def make_raw(n, seed=7):
+    rng = random.Random(seed)
+    today = date.today()
+    now = time.time()
+    rows = []
+    for i in range(n):
+        ticker = rng.choice(TICKERS)
+        expiry = (today + timedelta(days=rng.randint(0, 30))).isoformat()
+        is_call = rng.random() < 0.5
+        strike = round(rng.uniform(50, 900), 1)
+        price = round(rng.uniform(0.1, 40), 2)
+        size = rng.randint(50, 5000)
+        rows.append({
+            "ticker": ticker, "expiry": expiry, "is_call": is_call, "strike": strike, "price": price,
+            "size": size, "premium": price * size * 100, "timestamp": now - rng.uniform(0, 23400),
+            "delta": round(rng.uniform(-1, 1), 2), "moneyness": rng.choice(["ITM", "ATM", "OTM"]),
+            "symbol": f"O:{ticker}{expiry[2:4]}{expiry[5:7]}{expiry[8:10]}{'C' if is_call else 'P'}{int(strike * 1000):08d}"
+        })
+    return rows
+
+
+def legacy_whale(r):
+    """The dict scan_whales_polygon used to build."""
+    return {
+        "baseSymbol": r["ticker"], "symbol": r["symbol"], "strikePrice": r["strike"],
+        "expirationDate": r["expiry"], "putCall": "C" if r["is_call"] else "P", "openInterest": 1200,
+        "lastPrice": r["price"], "tradeTime": datetime.fromtimestamp(r["timestamp"]).strftime("%H:%M:%S"),
+        "timestamp": r["timestamp"], "premium": format_money(r["premium"]), "volume": r["size"],
+        "notional_value": r["premium"], "delta": r["delta"], "side": "BUY" if r["delta"] > 0 else "SELL",
+        "moneyness": r["moneyness"], "bid": 0, "ask": 0, "is_mega_whale": r["premium"] >= 5_000_000,
+        "is_sweep": r["delta"] > 0, "source": "polygon"
+    }
+
+
+def record_whale(r):
+    return WhaleEvent(
+        base_symbol=r["ticker"], symbol=r["symbol"], strike=r["strike"], expiry=r["expiry"],
+        put_call="C" if r["is_call"] else "P", open_interest=1200, last_price=r["price"],
+        trade_time=datetime.fromtimestamp(r["timestamp"]).strftime("%H:%M:%S"), timestamp=r["timestamp"],
+        volume=r["size"], notional=r["premium"], delta=r["delta"], side="BUY" if r["delta"] > 0 else "SELL",
+        moneyness=r["moneyness"], bid=0, ask=0, is_mega_whale=r["premium"] >= 5_000_000,
+        is_sweep=r["delta"] > 0, source="polygon"
+    )
+
+
+def sweep_tags(r):
+    tags = []
+    if r["delta"] > 0: tags.append("SWEEP")
+    if r["size"] >= 500: tags.append("BLOCK")
+    if r["premium"] >= 1000000: tags.append("WHALE")
+    return tags
+
+
+def legacy_sweep(r):
+    """The dict handle_massive_ws_msg used to build."""
+    tags = sweep_tags(r)
+    return {
+        "ticker": r["ticker"], "symbol": r["symbol"], "strike": r["strike"],
+        "type": "CALL" if r["is_call"] else "PUT", "expiry": r["expiry"], "premium": f"${r['premium']:,.0f}",
+        "size": r["size"], "price": r["price"], "timestamp": r["timestamp"],
+        "timeStr": datetime.fromtimestamp(r["timestamp"]).strftime('%H:%M:%S'), "side": "BUY",
+        "bid": 0, "ask": 0, "spot": 0, "details": f"{' '.join(tags)}", "tags": tags,
+        "is_sweep": r["delta"] > 0, "is_block": r["size"] >= 500, "exchange": 65
+    }
+
+
+def record_sweep(r):
+    return SweepEvent(
+        ticker=r["ticker"], symbol=r["symbol"], strike=r["strike"], option_type="CALL" if r["is_call"] else "PUT",
+        expiry=r["expiry"], premium=r["premium"], size=r["size"], price=r["price"], timestamp=r["timestamp"],
+        side="BUY", exchange=65, is_sweep=r["delta"] > 0, is_block=r["size"] >= 500, tags=sweep_tags(r)
+    )
+
+
+def legacy_fish(trade):
+    """The remap the ALL branch of /api/library/options did per whale dict."""
+    put_call = trade.get('putCall', '')
+    raw_premium = trade.get('notional_value', 0) or 0
+    return {
+        "ticker": trade.get('baseSymbol') or trade.get('ticker', ''),
+        "strike": trade.get('strikePrice', 0) or trade.get('strike', 0),
+        "type": 'CALL' if put_call == 'C' else 'PUT' if put_call == 'P' else trade.get('type', ''),
+        "expiry": trade.get('expirationDate', '') or trade.get('expiry', ''),
+        "premium": raw_premium,
+        "size": trade.get('volume', 0) or trade.get('size', 0) or 0,
+        "price": trade.get('lastPrice', 0) or trade.get('price', 0),
+        "timestamp": trade.get('timestamp', 0),
+        "timeStr": trade.get('tradeTime', '') or trade.get('timeStr', 'N/A'),
+        "moneyness": trade.get('moneyness', ''),
+        "side": trade.get('side', 'NEUTRAL'),
+        "bid": trade.get('bid', 0),
+        "ask": trade.get('ask', 0),
+        "delta": trade.get('delta', 0),
+        "is_sweep": trade.get('is_sweep', False),
+        "is_mega_whale": trade.get('is_mega_whale', False),
+        "is_lotto": abs(float(trade.get('delta', 0) or 0)) < 0.20,
+        "notional_value": raw_premium,
+    }
+
+
+def traced_bytes(build, rows):
+    """Bytes still allocated after building one event per row (the events list itself included)."""
+    gc.collect()
+    tracemalloc.start()
+    events = [build(r) for r in rows]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, events
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'events':>8} {'kind':>6} {'dict B/ev':>10} {'record B/ev':>12} {'saved':>7} {'dict->api ms':>13} {'record->api ms':>15}")
+    for n in sizes:
+        rows = make_raw(n)
+        for kind, legacy, record, legacy_api, record_api in (
+            ("whale", legacy_whale, record_whale, legacy_fish, WhaleEvent.to_fish),
+            ("sweep", legacy_sweep, record_sweep, dict, SweepEvent.to_dict),
+        ):
+            dict_bytes, dicts = traced_bytes(legacy, rows)
+            record_bytes, records = traced_bytes(record, rows)
+            dict_ms = timed(lambda: [legacy_api(d) for d in dicts]) * 1000
+            record_ms = timed(lambda: [record_api(e) for e in records]) * 1000
+            print(f"{n:>8} {kind:>6} {dict_bytes / n:>10.0f} {record_bytes / n:>12.0f} "
+                  f"{1 - record_bytes / dict_bytes:>7.0%} {dict_ms:>13.1f} {record_ms:>15.1f}")
+            del dicts, records
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100000])
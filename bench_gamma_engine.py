@@ -0,0 +1,108 @@
+"""
+Benchmark: gamma_engine (NumPy) vs the old per-contract dict loop
+
+Builds synthetic multi-expiry chains (same JSON shape as the Polygon snapshot)
+and times snapshot -> per-strike GEX table for both implementations, plus the
+zero-gamma / wall levels the old loop never computed.
+
+Usage: python bench_gamma_engine.py [contracts ...]
+"""
+
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from gamma_engine import GammaChain, aggregate_strikes, compute_gamma_profile
+
+
+def make_chain(n_contracts, spot=600.0, n_expiries=12, seed=7):
+    rng = random.Random(seed)
+    today = date.today()
+    expiries = [(today + timedelta(days=7 * i)).isoformat() for i in range(n_expiries)]
+    per_expiry_side = max(1, n_contracts // (2 * n_expiries))
+    chain = []
+    for expiry in expiries:
+        for side in ("call", "put"):
+            for k in range(per_expiry_side):
+                strike = round(spot * 0.7 + k * (spot * 0.6 / per_expiry_side), 1)
+                chain.append({
+                    "details": {"strike_price": strike, "contract_type": side, "expiration_date": expiry},
+                    "day": {"volume": rng.randint(0, 20000), "close": round(rng.uniform(0.05, 40), 2)},
+                    "open_interest": rng.randint(0, 50000),
+                    "greeks": {"gamma": rng.uniform(0, 0.05)},
+                    "implied_volatility": rng.uniform(0.1, 0.6)
+                })
+    return chain
+
+
+def legacy_parse(contracts, underlying_price):
+    """The pre-gamma_engine loop from parse_polygon_to_gamma_format."""
+    gamma_data = {}
+    for contract in contracts:
+        details = contract.get("details", {})
+        strike = details.get("strike_price")
+        side = details.get("contract_type", "").lower()
+        if not strike or not side:
+            continue
+        if strike not in gamma_data:
+            gamma_data[strike] = {
+                "call_vol": 0, "put_vol": 0, "call_oi": 0, "put_oi": 0,
+                "call_premium": 0, "put_premium": 0, "call_gex": 0, "put_gex": 0, "net_gex": 0
+            }
+        day_data = contract.get("day", {})
+        greeks = contract.get("greeks", {})
+        vol = int(day_data.get("volume", 0) or 0)
+        oi = int(contract.get("open_interest", 0) or 0)
+        price = float(day_data.get("close", 0) or day_data.get("vwap", 0) or 0)
+        gamma_val = float(greeks.get("gamma", 0) or 0)
+        gex = gamma_val * oi * 100 * (underlying_price ** 2) * 0.01 if gamma_val and oi else 0
+        if side == "call":
+            gamma_data[strike]["call_vol"] += vol
+            gamma_data[strike]["call_oi"] += oi
+            gamma_data[strike]["call_premium"] = max(gamma_data[strike]["call_premium"], price)
+            gamma_data[strike]["call_gex"] += gex
+            gamma_data[strike]["net_gex"] += gex
+        else:
+            gamma_data[strike]["put_vol"] += vol
+            gamma_data[strike]["put_oi"] += oi
+            gamma_data[strike]["put_premium"] = max(gamma_data[strike]["put_premium"], price)
+            gamma_data[strike]["put_gex"] -= gex
+            gamma_data[strike]["net_gex"] -= gex
+    return gamma_data
+
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    spot = 600.0
+    print(f"{'contracts':>10} {'legacy ms':>10} {'engine ms':>10} {'+levels ms':>11} {'contracts/s':>13}  max |net_gex| diff")
+    for n in sizes:
+        chain = make_chain(n, spot)
+        repeats = 5 if n <= 20000 else 2
+
+        legacy_s = best_of(lambda: legacy_parse(chain, spot), repeats)
+        engine_s = best_of(lambda: aggregate_strikes(GammaChain.from_snapshot(chain), spot), repeats)
+        full_s = best_of(lambda: compute_gamma_profile(chain, spot), repeats)
+
+        legacy = legacy_parse(chain, spot)
+        table = aggregate_strikes(GammaChain.from_snapshot(chain), spot)
+        diff = max(abs(legacy[k]["net_gex"] - v) / max(1.0, abs(v))
+                   for k, v in zip(table.strike.tolist(), table.net_gex.tolist()))
+
+        print(f"{len(chain):>10} {legacy_s * 1000:>10.2f} {engine_s * 1000:>10.2f} {full_s * 1000:>11.2f} "
+              f"{len(chain) / full_s:>13,.0f}  {diff:.2e}")
+
+    _, levels = compute_gamma_profile(make_chain(5000, spot), spot)
+    print(f"\nLevels (5k contracts, spot {spot}): {levels}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [500, 2000, 10000, 50000])
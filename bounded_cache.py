@@ -0,0 +1,117 @@
+"""
+Bounded Cache - LRU + TTL cache with entry and byte limits
+
+Replaces unbounded module-level dicts whose keys multiply per filter combination:
+1. get()/set(): LRU order, entries expire after ttl seconds
+2. Evicts least recently used entries once max_entries or max_bytes is exceeded
+3. find(): newest fresh entry whose meta matches a predicate, so a narrower
+   query can be answered by filtering a cached wider result
+4. Hit / miss / derived / eviction counters for the debug endpoints
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def json_size(value):
+    """Approximate memory cost of a JSON-able value (its serialized length)."""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class BoundedCache:
+
+    def __init__(self, name, max_entries=128, max_bytes=64 * 1024 * 1024, ttl=300, sizeof=json_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.entries = OrderedDict()  # {key: (value, meta, size, timestamp)}, oldest use first
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0, "misses": 0, "derived_hits": 0, "sets": 0,
+            "expired": 0, "evicted": 0, "rejected": 0
+        }
+
+    def _drop(self, key):
+        _, _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        """Fresh value for key (marks it recently used) or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if time.time() - entry[3] >= self.ttl:
+                self._drop(key)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[0]
+
+    def set(self, key, value, meta=None, size=None):
+        """Store value; meta is what find() predicates see. Values bigger than max_bytes are not cached."""
+        size = self.sizeof(value) if size is None else size
+        with self.lock:
+            if size > self.max_bytes:
+                self.counters["rejected"] += 1
+                return False
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (value, meta, size, time.time())
+            self.bytes += size
+            self.counters["sets"] += 1
+            self._evict()
+        return True
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, entry in self.entries.items() if now - entry[3] >= self.ttl]:
+            self._drop(key)
+            self.counters["expired"] += 1
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.counters["evicted"] += 1
+
+    def find(self, predicate):
+        """
+        Newest fresh (value, meta) where predicate(meta) is true, or None.
+        Counts a derived hit when found - callers filter the value down themselves.
+        """
+        now = time.time()
+        with self.lock:
+            for key in reversed(self.entries):
+                value, meta, _, timestamp = self.entries[key]
+                if now - timestamp < self.ttl and meta is not None and predicate(meta):
+                    self.entries.move_to_end(key)
+                    self.counters["derived_hits"] += 1
+                    return value, meta
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self.entries)
+            counters["bytes"] = self.bytes
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round((counters["hits"] + counters["derived_hits"]) / lookups, 3) if lookups else 0
+        counters["name"] = self.name
+        counters["max_entries"] = self.max_entries
+        counters["max_bytes"] = self.max_bytes
+        counters["ttl"] = self.ttl
+        return counters
@@ -19,7 +19,8 @@ def compare_whale_yield(ticker="AMD"):
     run.WHALE_WATCHLIST = [ticker]
     
     # Clear History to ensure we capture everything
-    run.WHALE_HISTORY = {}
+    run.WHALE_DEDUPE.seen.clear()
+    run.WHALE_DEDUPE.volumes.clear()
     
     print("\n1. Scanning Polygon...")
     try:
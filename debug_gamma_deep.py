@@ -39,7 +39,8 @@ def deep_debug_ticker(symbol):
             
     # 2. Analyze Parsed Data
     print("\nParsing Data...")
-    gamma_data, _ = parse_polygon_to_gamma_format(data, current_price=price)
+    gamma_table, _, _ = parse_polygon_to_gamma_format(data, current_price=price)
+    gamma_data = gamma_table.to_dict()
     
     parsed_call_vol = sum(d['call_vol'] for d in gamma_data.values())
     parsed_put_vol = sum(d['put_vol'] for d in gamma_data.values())
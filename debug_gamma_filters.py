@@ -8,7 +8,8 @@ def debug_ticker_filters(symbol):
     data = fetch_options_chain_polygon(symbol)
     
     if data:
-        gamma_data, underlying = parse_polygon_to_gamma_format(data, current_price=price)
+        gamma_table, underlying, _ = parse_polygon_to_gamma_format(data, current_price=price)
+        gamma_data = gamma_table.to_dict()
         print(f"Total Strikes (Pre-filter): {len(gamma_data)}")
         
         MIN_VOLUME = 100
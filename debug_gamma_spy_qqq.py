@@ -25,8 +25,10 @@ def debug_ticker(symbol):
         
         # 3. Parse Data
         print("Parsing data...")
-        gamma_data, underlying = parse_polygon_to_gamma_format(data, current_price=price)
+        gamma_table, underlying, levels = parse_polygon_to_gamma_format(data, current_price=price)
+        gamma_data = gamma_table.to_dict()
         print(f"Parsed Underlying Price: {underlying}")
+        print(f"Levels: {levels}")
         print(f"Strikes found: {len(gamma_data)}")
         
         # Show a sample strike
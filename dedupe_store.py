@@ -0,0 +1,147 @@
+"""
+Dedupe Store - Per-session whale dedupe + volume watermarks, persisted to disk
+
+Replaces the WHALE_HISTORY dict (trade-id timestamps in one scanner, last seen
+volumes in the other, sorted and pruned when it grew past 10k):
+1. Two insertion-ordered maps: seen trade ids and per-contract volume watermarks;
+   past max_entries the oldest entry is popped - O(1), no sort
+2. roll(session): everything is keyed to a trading session (the caller decides
+   what a session is); the first call with a new session clears both maps
+3. snapshot()/load(): JSON written atomically next to the whale cache, so a
+   restarted leader resumes the session without re-emitting seen whales
+   (a snapshot from an older session is ignored)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class DedupeStore:
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.session = None
+        self.seen = OrderedDict()  # {trade_id: first seen (epoch s)}, oldest first
+        self.volumes = OrderedDict()  # {contract: last reported volume}, least recently updated first
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.counters = {"added": 0, "duplicates": 0, "evicted": 0, "resets": 0, "snapshots": 0}
+
+    def __len__(self):
+        return len(self.seen) + len(self.volumes)
+
+    def roll(self, session):
+        """Start a new session (clearing everything) if session differs; returns True on reset."""
+        with self.lock:
+            if session == self.session:
+                return False
+            had_data = bool(self.seen or self.volumes)
+            self.session = session
+            self.seen.clear()
+            self.volumes.clear()
+            self.dirty = True
+            if had_data:
+                self.counters["resets"] += 1
+            return had_data
+
+    def add(self, trade_id, now=None):
+        """Atomic check-and-insert: True if trade_id is new this session."""
+        with self.lock:
+            if trade_id in self.seen:
+                self.counters["duplicates"] += 1
+                return False
+            self.seen[trade_id] = now or time.time()
+            self._trim(self.seen)
+            self.counters["added"] += 1
+            self.dirty = True
+            return True
+
+    def seed(self, trade_id, first_seen):
+        """Mark trade_id as seen without counting it (rebuilding from a mirrored feed)."""
+        with self.lock:
+            if trade_id not in self.seen:
+                self.seen[trade_id] = first_seen
+                self._trim(self.seen)
+                self.dirty = True
+
+    def last_volume(self, contract):
+        return self.volumes.get(contract, 0)
+
+    def set_volume(self, contract, volume):
+        with self.lock:
+            self.volumes.pop(contract, None)
+            self.volumes[contract] = volume
+            self._trim(self.volumes)
+            self.dirty = True
+
+    def _trim(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    def snapshot(self):
+        """Write the session to disk if anything changed since the last snapshot."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            data = {
+                "session": self.session,
+                "seen": list(self.seen.items()),
+                "volumes": list(self.volumes.items())
+            }
+            self.dirty = False
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_dedupe_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            with self.lock:
+                self.dirty = True
+            raise
+        self.counters["snapshots"] += 1
+        return True
+
+    def load(self, session):
+        """Merge a snapshot of `session` from disk; returns how many entries were restored."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get("session") != session:
+            return 0
+        self.roll(session)
+        with self.lock:
+            restored = 0
+            for trade_id, first_seen in data.get("seen", []):
+                if trade_id not in self.seen:
+                    self.seen[trade_id] = first_seen
+                    restored += 1
+            for contract, volume in data.get("volumes", []):
+                if contract not in self.volumes:
+                    self.volumes[contract] = volume
+                    restored += 1
+            self._trim(self.seen)
+            self._trim(self.volumes)
+        return restored
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["session"] = self.session
+            counters["seen"] = len(self.seen)
+            counters["volumes"] = len(self.volumes)
+        counters["max_entries"] = self.max_entries
+        counters["path"] = self.path
+        return counters
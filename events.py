@@ -0,0 +1,251 @@
+"""
+Events - Compact __slots__ records for whale and sweep events
+
+Whale / sweep entries used to be ~20-key dicts carrying both the raw and the
+pre-formatted premium, a tags list, a details string and a time string, then
+copied and remapped again for the Fish Finder. The records are the in-memory
+form everywhere (CACHE, the shared cache pickles, SWEEP_CACHE):
+1. __slots__, raw values only - premium strings, tags, details and time strings
+   are derived when serializing
+2. One serialization path per API shape: WhaleEvent.to_feed() (/api/whales, SSE,
+   whale cache file), WhaleEvent.to_fish() (Fish Finder ALL), SweepEvent.to_dict()
+3. Read-compatible with the old dict shape (record.get("strikePrice"),
+   record["timestamp"], "seq" in record) so feed helpers work on either
+4. Repeated strings (tickers, side, moneyness, source) are interned
+
+bench_events.py measures the footprint of 100k records vs the old dicts.
+"""
+
+import sys
+from datetime import datetime
+
+import pytz
+
+EASTERN = pytz.timezone("US/Eastern")
+
+
+def format_money(val):
+    if val >= 1_000_000: return f"${val/1_000_000:.1f}M"
+    if val >= 1_000: return f"${val/1_000:.0f}k"
+    return f"${val:.0f}"
+
+
+_ET_OFFSETS = {}  # {epoch hour: ET utc offset in seconds}
+
+
+def et_clock(timestamp):
+    """Epoch seconds -> 'HH:MM:SS' in ET (offset looked up once per hour, not per event)."""
+    hour = int(timestamp // 3600)
+    offset = _ET_OFFSETS.get(hour)
+    if offset is None:
+        offset = int(datetime.fromtimestamp(hour * 3600, EASTERN).utcoffset().total_seconds())
+        _ET_OFFSETS[hour] = offset
+    seconds = int(timestamp + offset) % 86400
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Record:
+    """Dict-style read/write access by API key (FIELDS: api key -> slot)."""
+    __slots__ = ()
+    FIELDS = {}
+    DERIVED = {}  # api key -> method name (computed, read-only)
+
+    def get(self, key, default=None):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            method = self.DERIVED.get(key)
+            return getattr(self, method)() if method else default
+        value = getattr(self, slot)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, self.FIELDS[key], value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(record, slot, None)
+        for key, slot in cls.FIELDS.items():
+            if data.get(key) is not None:
+                setattr(record, slot, _intern(data[key]))
+        return record
+
+
+class WhaleEvent(_Record):
+    # Optional fields (side/bid/ask, vol_oi/iv/is_lotto, ...) are None when a scanner doesn't set them
+    __slots__ = (
+        "base_symbol", "symbol", "strike", "expiry", "put_call", "open_interest", "last_price",
+        "trade_time", "timestamp", "volume", "notional", "delta", "side", "moneyness", "bid", "ask",
+        "is_mega_whale", "is_sweep", "is_lotto", "vol_oi", "iv", "source", "seq"
+    )
+    FIELDS = {
+        "baseSymbol": "base_symbol", "symbol": "symbol", "strikePrice": "strike",
+        "expirationDate": "expiry", "putCall": "put_call", "openInterest": "open_interest",
+        "lastPrice": "last_price", "tradeTime": "trade_time", "timestamp": "timestamp",
+        "volume": "volume", "notional_value": "notional", "delta": "delta", "side": "side",
+        "moneyness": "moneyness", "bid": "bid", "ask": "ask", "is_mega_whale": "is_mega_whale",
+        "is_sweep": "is_sweep", "is_lotto": "is_lotto", "vol_oi": "vol_oi", "iv": "iv",
+        "source": "source", "seq": "seq"
+    }
+    DERIVED = {"premium": "premium"}
+
+    def __init__(self, base_symbol, symbol, strike, expiry, put_call, timestamp, volume, notional,
+                 open_interest=None, last_price=None, trade_time=None, delta=None, side=None, moneyness=None,
+                 bid=None, ask=None, is_mega_whale=None, is_sweep=None, is_lotto=None, vol_oi=None, iv=None,
+                 source=None, seq=None):
+        self.base_symbol = sys.intern(base_symbol)
+        self.symbol = symbol
+        self.strike = strike
+        self.expiry = _intern(expiry)
+        self.put_call = sys.intern(put_call)
+        self.open_interest = open_interest
+        self.last_price = last_price
+        self.trade_time = trade_time
+        self.timestamp = timestamp
+        self.volume = volume
+        self.notional = notional
+        self.delta = delta
+        self.side = _intern(side)
+        self.moneyness = _intern(moneyness)
+        self.bid = bid
+        self.ask = ask
+        self.is_mega_whale = is_mega_whale
+        self.is_sweep = is_sweep
+        self.is_lotto = is_lotto
+        self.vol_oi = vol_oi
+        self.iv = iv
+        self.source = _intern(source)
+        self.seq = seq
+
+    def premium(self):
+        return format_money(self.notional or 0)
+
+    def to_feed(self):
+        """Whale feed shape (same keys the scanners used to emit; unset optional fields are left out)."""
+        feed = {}
+        for key, slot in self.FIELDS.items():
+            value = getattr(self, slot)
+            if value is not None:
+                feed[key] = value
+        feed["premium"] = self.premium()
+        return feed
+
+    @classmethod
+    def from_feed(cls, data):
+        return cls.from_dict(data)
+
+    def to_fish(self):
+        """Fish Finder trade shape (the ALL feed)."""
+        delta = self.delta or 0
+        return {
+            "ticker": self.base_symbol,
+            "strike": self.strike or 0,
+            "type": "CALL" if self.put_call == "C" else "PUT" if self.put_call == "P" else "",
+            "expiry": self.expiry or "",
+            "premium": self.notional or 0,
+            "size": self.volume or 0,
+            "price": self.last_price or 0,
+            "timestamp": self.timestamp or 0,
+            "timeStr": self.trade_time or "N/A",
+            "moneyness": self.moneyness or "",
+            "side": self.side or "NEUTRAL",
+            "bid": self.bid or 0,
+            "ask": self.ask or 0,
+            "delta": delta,
+            "is_sweep": bool(self.is_sweep),
+            "is_mega_whale": bool(self.is_mega_whale),
+            "is_lotto": abs(float(delta)) < 0.20,
+            "notional_value": self.notional or 0,
+        }
+
+
+# Shared tag tuples - every event with the same tags points at one tuple
+_TAG_SETS = {}
+
+
+class SweepEvent(_Record):
+    __slots__ = (
+        "ticker", "symbol", "strike", "type", "expiry", "premium", "size", "price", "timestamp",
+        "side", "bid", "ask", "exchange", "is_sweep", "is_block", "tags"
+    )
+    FIELDS = {
+        "ticker": "ticker", "symbol": "symbol", "strike": "strike", "type": "type", "expiry": "expiry",
+        "premium_value": "premium", "size": "size", "price": "price", "timestamp": "timestamp",
+        "side": "side", "bid": "bid", "ask": "ask", "exchange": "exchange",
+        "is_sweep": "is_sweep", "is_block": "is_block"
+    }
+    DERIVED = {"premium": "premium_str", "timeStr": "time_str", "details": "details"}
+
+    def __init__(self, ticker, symbol, strike, option_type, expiry, premium, size, price, timestamp,
+                 side="NEUTRAL", bid=0, ask=0, exchange=0, is_sweep=False, is_block=False, tags=()):
+        self.ticker = sys.intern(ticker)
+        self.symbol = symbol
+        self.strike = strike
+        self.type = sys.intern(option_type)
+        self.expiry = sys.intern(expiry)
+        self.premium = premium
+        self.size = size
+        self.price = price
+        self.timestamp = timestamp
+        self.side = sys.intern(side)
+        self.bid = bid
+        self.ask = ask
+        self.exchange = exchange
+        self.is_sweep = bool(is_sweep)
+        self.is_block = bool(is_block)
+        tags = tuple(tags)
+        self.tags = _TAG_SETS.setdefault(tags, tags)
+
+    def premium_str(self):
+        return f"${self.premium:,.0f}"
+
+    def time_str(self):
+        return et_clock(self.timestamp)
+
+    def details(self):
+        return " ".join(self.tags)
+
+    def to_dict(self):
+        """Sweep feed shape (/api/demo/stream)."""
+        return {
+            "ticker": self.ticker,
+            "symbol": self.symbol,
+            "strike": self.strike,
+            "type": self.type,
+            "expiry": self.expiry,
+            "premium": self.premium_str(),
+            "size": self.size,
+            "price": self.price,
+            "timestamp": self.timestamp,
+            "timeStr": self.time_str(),
+            "side": self.side,
+            "bid": self.bid,
+            "ask": self.ask,
+            "spot": 0,
+            "details": self.details(),
+            "tags": list(self.tags),
+            "is_sweep": self.is_sweep,
+            "is_block": self.is_block,
+            "exchange": self.exchange
+        }
@@ -0,0 +1,302 @@
+"""
+Firestore Sync - Write-behind queue + snapshot-listener caches for Firestore
+
+Saving / deleting a whale, the Stripe webhook and the lotto feed all waited on
+Firestore round-trips inside the request:
+1. WriteBehindQueue: requests enqueue set / delete / update-by-field ops and
+   return; one writer thread commits them in batched writes (up to batch_size
+   ops per commit). Pending ops on the same document are coalesced (later
+   fields win, a delete supersedes earlier writes)
+2. A failed commit is retried with exponential backoff + jitter; after
+   max_attempts the batch is dropped and counted (queue depth, oldest pending
+   age, commits, retries and failures are in stats())
+3. SnapshotCache: local copy of a query's documents (lottos, saved_whales)
+   kept current by an on_snapshot listener, so reads are a dict copy. Until the
+   listener has delivered a snapshot (or after its stream closes / errors)
+   reads fall back to query().stream(), cached for `ttl` seconds, and the
+   listener is re-subscribed (at most once per `ttl` after a failed subscribe)
+4. Local writes are overlaid on the cache (put / remove) until the listener has
+   had time to echo them, so a save shows up in the next read
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class WriteBehindQueue:
+
+    def __init__(self, client, batch_size=400, flush_interval=0.5, max_attempts=6, backoff=0.5, max_backoff=30):
+        self.client = client  # client() -> Firestore client (None = writes are dropped)
+        self.batch_size = batch_size  # Firestore caps a batched write at 500 ops
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pending = OrderedDict()  # {key: op}, oldest first
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.started = False
+        self.inflight = 0
+        self.counters = {
+            "enqueued": 0, "coalesced": 0, "committed": 0, "batches": 0,
+            "retries": 0, "failed": 0, "unmatched": 0, "max_depth": 0
+        }
+        self.last_error = None
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._run, daemon=True, name="firestore-write-behind").start()
+
+    def _enqueue(self, key, op):
+        self._start()
+        with self.lock:
+            previous = self.pending.pop(key, None)
+            if previous is not None:
+                self.counters["coalesced"] += 1
+                op = self._coalesce(previous, op)
+            self.pending[key] = op
+            self.counters["enqueued"] += 1
+            self.counters["max_depth"] = max(self.counters["max_depth"], len(self.pending))
+        self.wakeup.set()
+
+    @staticmethod
+    def _coalesce(previous, op):
+        """Fold op into an earlier pending op on the same document."""
+        if op["kind"] == "delete" or previous["kind"] == "delete" or op["kind"] == "set" and not op["merge"]:
+            op["queued_at"] = previous["queued_at"]
+            return op
+        merged = dict(previous)
+        merged["data"] = {**previous["data"], **op["data"]}
+        merged["defaults"] = {**(op.get("defaults") or {}), **(previous.get("defaults") or {})}
+        return merged
+
+    def set(self, collection, doc_id, data, merge=False):
+        self._enqueue((collection, doc_id), {
+            "kind": "set", "collection": collection, "doc_id": doc_id, "data": dict(data),
+            "merge": merge, "queued_at": time.time()
+        })
+
+    def delete(self, collection, doc_id):
+        self._enqueue((collection, doc_id), {
+            "kind": "delete", "collection": collection, "doc_id": doc_id, "queued_at": time.time()
+        })
+
+    def update_where(self, collection, field, value, data, defaults=None):
+        """
+        Update the first document whose `field` == value (resolved by a query at
+        flush time). defaults are only written if the document lacks them.
+        """
+        self._enqueue((collection, field, value), {
+            "kind": "update_where", "collection": collection, "field": field, "value": value,
+            "data": dict(data), "defaults": dict(defaults or {}), "queued_at": time.time()
+        })
+
+    def _take_batch(self):
+        with self.lock:
+            batch = []
+            while self.pending and len(batch) < self.batch_size:
+                batch.append(self.pending.popitem(last=False)[1])
+            self.inflight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(timeout=self.flush_interval)
+            self.wakeup.clear()
+            batch = self._take_batch()
+            if batch:
+                self._commit(batch)
+                with self.lock:
+                    self.inflight = 0
+                if self.pending:
+                    self.wakeup.set()
+
+    def _resolve(self, db, op):
+        """update_where -> (document reference, fields) or None if nothing matches."""
+        query = db.collection(op["collection"]).where(op["field"], "==", op["value"]).limit(1)
+        for doc in query.stream():
+            data = dict(op["data"])
+            if op["defaults"]:
+                current = doc.to_dict() or {}
+                data.update({k: v for k, v in op["defaults"].items() if not current.get(k)})
+            return doc.reference, data
+        return None
+
+    def _commit(self, ops):
+        """Commit ops as one batched write, retrying with backoff; drops them after max_attempts."""
+        resolved = {}  # {op index: update_where target} - queried once, reused by retries
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                db = self.client()
+                if db is None:
+                    self.counters["failed"] += len(ops)
+                    return
+                batch = db.batch()
+                for i, op in enumerate(ops):
+                    if op["kind"] == "update_where":
+                        if i not in resolved:
+                            resolved[i] = self._resolve(db, op)
+                        if resolved[i] is not None:
+                            batch.update(*resolved[i])
+                        continue
+                    ref = db.collection(op["collection"]).document(op["doc_id"])
+                    if op["kind"] == "delete":
+                        batch.delete(ref)
+                    else:
+                        batch.set(ref, op["data"], merge=op["merge"])
+                batch.commit()
+                for i, target in resolved.items():
+                    if target is None:
+                        op = ops[i]
+                        self.counters["unmatched"] += 1
+                        print(f"⚠️ Firestore update skipped: no {op['collection']} with {op['field']}={op['value']}")
+                self.counters["committed"] += len(ops) - sum(target is None for target in resolved.values())
+                self.counters["batches"] += 1
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt == self.max_attempts:
+                    break
+                self.counters["retries"] += 1
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        self.counters["failed"] += len(ops)
+        print(f"❌ Firestore write-behind dropped {len(ops)} ops after {self.max_attempts} attempts: {self.last_error}")
+
+    def flush(self, timeout=10):
+        """Wait (up to timeout) for everything queued so far to be committed or dropped."""
+        deadline = time.time() + timeout
+        self.wakeup.set()
+        while time.time() < deadline:
+            with self.lock:
+                if not self.pending and not self.inflight:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["depth"] = len(self.pending)
+            counters["inflight"] = self.inflight
+            oldest = next(iter(self.pending.values()), None)
+        counters["oldest_pending_s"] = round(time.time() - oldest["queued_at"], 3) if oldest else 0
+        counters["last_error"] = self.last_error
+        return counters
+
+
+class SnapshotCache:
+
+    def __init__(self, name, query, sort_key, ttl=30, overlay_ttl=15):
+        self.name = name
+        self.query = query  # query() -> Firestore query (None if Firestore is unavailable)
+        self.sort_key = sort_key  # Documents are returned sorted by this field, newest first
+        self.ttl = ttl
+        self.overlay_ttl = overlay_ttl
+        self.docs = {}  # {doc_id: dict}
+        self.synced_at = 0  # Last listener snapshot (0 = listener not live)
+        self.fetched_at = 0  # Last read-through fetch
+        self.overlay = {}  # {doc_id: (dict or None for deleted, expires)}
+        self.watch = None
+        self.listen_after = 0  # No subscribe attempt before this (after a failed one)
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "fetches": 0, "snapshots": 0, "listener_errors": 0, "resubscribes": 0}
+
+    def _listen(self):
+        with self.lock:
+            if self.watch is not None or time.time() < self.listen_after:
+                return
+            query = self.query()
+            if query is None:
+                return
+            self.watch = False  # Claimed - one listener per cache
+        try:
+            watch = query.on_snapshot(self._on_snapshot)
+        except Exception as e:
+            with self.lock:
+                self.watch = None  # Read-through until the next attempt
+                self.listen_after = time.time() + self.ttl
+            self.counters["listener_errors"] += 1
+            print(f"⚠️ {self.name} snapshot listener failed: {e}")
+            return
+        with self.lock:
+            self.watch = watch
+
+    def _check_listener(self):
+        """Drop a listener whose stream has shut down (RPC error / close) so reads fall back and it re-subscribes."""
+        watch = self.watch
+        if not watch or not getattr(watch, "_closed", False):
+            return
+        with self.lock:
+            if self.watch is not watch:
+                return
+            self.watch = None
+            self.synced_at = self.fetched_at = 0  # Next read goes to Firestore
+            self.counters["listener_errors"] += 1
+            self.counters["resubscribes"] += 1
+        print(f"⚠️ {self.name} snapshot listener closed - reading through until it re-subscribes")
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            snapshot = {doc.id: doc.to_dict() for doc in docs}
+        except Exception as e:
+            self.counters["listener_errors"] += 1
+            print(f"⚠️ {self.name} snapshot error: {e}")
+            return
+        with self.lock:
+            self.docs = snapshot
+            self.synced_at = time.time()
+            self.counters["snapshots"] += 1
+
+    def _fetch(self):
+        query = self.query()
+        if query is None:
+            return
+        snapshot = {doc.id: doc.to_dict() for doc in query.stream()}
+        with self.lock:
+            if not self.synced_at:
+                self.docs = snapshot
+            self.fetched_at = time.time()
+            self.counters["fetches"] += 1
+
+    def get(self):
+        """Cached documents (local writes applied), sorted by sort_key descending."""
+        self._check_listener()
+        self._listen()
+        if not self.synced_at and time.time() - self.fetched_at > self.ttl:
+            self._fetch()
+        else:
+            self.counters["hits"] += 1
+        now = time.time()
+        with self.lock:
+            docs = dict(self.docs)
+            for doc_id, (data, expires) in list(self.overlay.items()):
+                if expires < now:
+                    del self.overlay[doc_id]
+                elif data is None:
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = data
+        return sorted(docs.values(), key=lambda d: d.get(self.sort_key) or 0, reverse=True)
+
+    def put(self, doc_id, data):
+        with self.lock:
+            self.overlay[doc_id] = (data, time.time() + self.overlay_ttl)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self.overlay[doc_id] = (None, time.time() + self.overlay_ttl)
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["docs"] = len(self.docs)
+            counters["overlay"] = len(self.overlay)
+            counters["listening"] = bool(self.watch)
+            counters["synced_age_s"] = round(time.time() - self.synced_at, 1) if self.synced_at else None
+        return counters
@@ -0,0 +1,273 @@
+"""
+Gamma Engine - Columnar (NumPy) gamma exposure for options chains
+
+Ingests a Polygon/Massive options snapshot once into flat arrays and computes
+everything the Gamma Wall needs with vectorized ops instead of per-contract dicts:
+1. Per-strike call/put volume, OI, premium, GEX and net GEX (bincount by strike)
+2. Zero-gamma flip: spot level where the dealer net GEX profile crosses zero
+3. Call wall / put wall: strikes with the largest call / put GEX
+
+GEX Formula (Industry Standard - 1% Move Normalization):
+GEX = Gamma x OI x 100 shares x Spot^2 x 0.01
+Calls = positive GEX (MM buys dips), Puts = negative GEX (MM sells dips)
+
+Works on any number of expirations - see bench_gamma_engine.py for throughput.
+"""
+
+import math
+from datetime import date
+
+import numpy as np
+
+CONTRACT_MULTIPLIER = 100
+MOVE_NORMALIZATION = 0.01  # GEX per 1% move
+
+# Zero-gamma search: re-price the chain across spot +/- this range on a coarse
+# grid, then again on a fine grid inside the bracket that crossed zero
+FLIP_SEARCH_RANGE = 0.10
+FLIP_COARSE_POINTS = 41  # 0.5% steps
+FLIP_FINE_POINTS = 21
+MIN_TIME_TO_EXPIRY = 1 / (365 * 24)  # 1 hour, keeps 0DTE gamma finite
+
+
+class GammaChain:
+    """Flat column arrays for one symbol's options chain (one row per contract)."""
+
+    __slots__ = ("strike", "is_call", "volume", "oi", "price", "gamma", "iv", "expiry_days")
+
+    def __init__(self, strike, is_call, volume, oi, price, gamma, iv, expiry_days):
+        self.strike = strike
+        self.is_call = is_call
+        self.volume = volume
+        self.oi = oi
+        self.price = price
+        self.gamma = gamma
+        self.iv = iv
+        self.expiry_days = expiry_days
+
+    def __len__(self):
+        return len(self.strike)
+
+    @classmethod
+    def from_snapshot(cls, contracts, today=None):
+        """
+        Build columns from snapshot results (iterable of contract dicts).
+        Contracts without a strike or contract_type are skipped.
+        """
+        today_ord = (today or date.today()).toordinal()
+        expiry_ord = {}  # "YYYY-MM-DD" -> ordinal, parsed once per expiration
+        rows = []
+        append = rows.append
+
+        for contract in contracts:
+            details = contract.get("details") or {}
+            strike = details.get("strike_price")
+            side = (details.get("contract_type") or "").lower()
+            if not strike or not side:
+                continue
+
+            day_data = contract.get("day") or {}
+            greeks = contract.get("greeks") or {}
+
+            expiry = details.get("expiration_date")
+            days = -1
+            if expiry:
+                ordinal = expiry_ord.get(expiry)
+                if ordinal is None:
+                    try:
+                        ordinal = date.fromisoformat(expiry).toordinal()
+                    except ValueError:
+                        ordinal = -1
+                    expiry_ord[expiry] = ordinal
+                if ordinal >= 0:
+                    days = ordinal - today_ord
+
+            append((
+                strike,
+                side == "call",
+                day_data.get("volume") or 0,
+                contract.get("open_interest") or 0,
+                day_data.get("close") or day_data.get("vwap") or 0,  # Contract price
+                greeks.get("gamma") or 0,
+                contract.get("implied_volatility") or 0,
+                days
+            ))
+
+        if not rows:
+            empty_f = np.zeros(0, dtype=np.float64)
+            return cls(empty_f, np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                       empty_f, empty_f, empty_f, empty_f)
+
+        strike, is_call, volume, oi, price, gamma, iv, days = zip(*rows)
+        return cls(
+            np.asarray(strike, dtype=np.float64),
+            np.asarray(is_call, dtype=bool),
+            np.asarray(volume, dtype=np.float64).astype(np.int64),
+            np.asarray(oi, dtype=np.float64).astype(np.int64),
+            np.asarray(price, dtype=np.float64),
+            np.asarray(gamma, dtype=np.float64),
+            np.asarray(iv, dtype=np.float64),
+            np.asarray(days, dtype=np.float64)
+        )
+
+    def gex(self, spot):
+        """Unsigned GEX per contract at the given spot."""
+        return self.gamma * self.oi * CONTRACT_MULTIPLIER * (spot ** 2) * MOVE_NORMALIZATION
+
+
+class StrikeTable:
+    """Per-strike aggregates, strikes ascending. All columns are NumPy arrays."""
+
+    __slots__ = ("strike", "call_vol", "put_vol", "call_oi", "put_oi",
+                 "call_premium", "put_premium", "call_gex", "put_gex", "net_gex")
+
+    def __init__(self, **columns):
+        for name in self.__slots__:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.strike)
+
+    def mask(self, keep):
+        """New table with only the rows where keep is True."""
+        return StrikeTable(**{name: getattr(self, name)[keep] for name in self.__slots__})
+
+    def to_rows(self, descending=True):
+        """List of per-strike dicts in the Gamma Wall JSON shape."""
+        order = slice(None, None, -1) if descending else slice(None)
+        cols = {name: getattr(self, name)[order].tolist() for name in self.__slots__}
+        return [dict(zip(self.__slots__, values)) for values in zip(*(cols[name] for name in self.__slots__))]
+
+    def to_dict(self):
+        """{strike: {...}} - same shape parse_polygon_to_gamma_format always returned."""
+        return {row.pop("strike"): row for row in self.to_rows(descending=False)}
+
+
+def aggregate_strikes(chain, spot):
+    """Sum volume / OI / GEX per strike; premium is the max contract price at the strike."""
+    if not len(chain):
+        empty_f = np.zeros(0, dtype=np.float64)
+        empty_i = np.zeros(0, dtype=np.int64)
+        return StrikeTable(strike=empty_f, call_vol=empty_i, put_vol=empty_i, call_oi=empty_i, put_oi=empty_i,
+                           call_premium=empty_f, put_premium=empty_f, call_gex=empty_f, put_gex=empty_f,
+                           net_gex=empty_f)
+
+    strikes, idx = np.unique(chain.strike, return_inverse=True)
+    n = len(strikes)
+    calls = chain.is_call
+    puts = ~calls
+
+    gex = chain.gex(spot)
+
+    def summed(values, side_mask):
+        return np.bincount(idx[side_mask], weights=values[side_mask], minlength=n)
+
+    def maxed(values, side_mask):
+        out = np.zeros(n, dtype=np.float64)
+        np.maximum.at(out, idx[side_mask], values[side_mask])
+        return out
+
+    call_gex = summed(gex, calls)
+    put_gex = -summed(gex, puts)  # Negative (bearish hedging)
+
+    return StrikeTable(
+        strike=strikes,
+        call_vol=summed(chain.volume, calls).astype(np.int64),
+        put_vol=summed(chain.volume, puts).astype(np.int64),
+        call_oi=summed(chain.oi, calls).astype(np.int64),
+        put_oi=summed(chain.oi, puts).astype(np.int64),
+        call_premium=maxed(chain.price, calls),
+        put_premium=maxed(chain.price, puts),
+        call_gex=call_gex,
+        put_gex=put_gex,
+        net_gex=call_gex + put_gex  # Net GEX: calls add, puts subtract
+    )
+
+
+def find_walls(table):
+    """Call wall = strike with most call GEX, put wall = strike with most put GEX (by magnitude)."""
+    if not len(table):
+        return None, None
+    call_wall = float(table.strike[np.argmax(table.call_gex)]) if table.call_gex.max() > 0 else None
+    put_wall = float(table.strike[np.argmin(table.put_gex)]) if table.put_gex.min() < 0 else None
+    return call_wall, put_wall
+
+
+def _bs_gamma(spot_levels, strike, iv, t_years):
+    """Black-Scholes gamma, shape (levels, contracts). r = q = 0 (short-dated approximation)."""
+    s = spot_levels[:, None]
+    vol_sqrt_t = iv * np.sqrt(t_years)
+    d1 = (np.log(s / strike) + 0.5 * iv ** 2 * t_years) / vol_sqrt_t
+    return np.exp(-0.5 * d1 ** 2) / (math.sqrt(2 * math.pi) * s * vol_sqrt_t)
+
+
+def zero_gamma_level(chain, spot, table=None):
+    """
+    Spot price where total dealer net GEX flips sign.
+
+    Re-prices every contract's gamma across spot +/- FLIP_SEARCH_RANGE (needs IV +
+    expiry). Without IV it falls back to the strike where cumulative net GEX
+    (low -> high strike) crosses zero. Returns None if the profile never flips.
+    """
+    if not len(chain) or not spot:
+        return None
+
+    usable = (chain.iv > 0) & (chain.expiry_days >= 0) & (chain.oi > 0)
+    if usable.any():
+        strike = chain.strike[usable]
+        iv = chain.iv[usable]
+        t_years = np.maximum(chain.expiry_days[usable] / 365.0, MIN_TIME_TO_EXPIRY)
+        sign = np.where(chain.is_call[usable], 1.0, -1.0)
+        weight = sign * chain.oi[usable] * CONTRACT_MULTIPLIER * MOVE_NORMALIZATION
+
+        def profile(levels):
+            return (_bs_gamma(levels, strike, iv, t_years) * weight).sum(axis=1) * levels ** 2
+
+        coarse = np.linspace(spot * (1 - FLIP_SEARCH_RANGE), spot * (1 + FLIP_SEARCH_RANGE), FLIP_COARSE_POINTS)
+        bracket = _closest_bracket(coarse, profile(coarse), spot)
+        if bracket is None:
+            return None
+        fine = np.linspace(coarse[bracket], coarse[bracket + 1], FLIP_FINE_POINTS)
+        return _first_crossing(fine, profile(fine), spot)
+
+    table = table if table is not None else aggregate_strikes(chain, spot)
+    if not len(table):
+        return None
+    return _first_crossing(table.strike, np.cumsum(table.net_gex), spot)
+
+
+def _crossings(x, y):
+    """Interpolated x of every sign change in y, plus the left index of each bracket."""
+    signs = np.sign(y)
+    idx = np.nonzero(signs[:-1] * signs[1:] < 0)[0]
+    x0, x1 = x[idx], x[idx + 1]
+    y0, y1 = y[idx], y[idx + 1]
+    return x0 - y0 * (x1 - x0) / (y1 - y0), idx
+
+
+def _closest_bracket(x, y, spot):
+    levels, idx = _crossings(x, y)
+    if not len(levels):
+        return None
+    return int(idx[np.argmin(np.abs(levels - spot))])
+
+
+def _first_crossing(x, y, spot):
+    """Linear-interpolated zero crossing of y(x) closest to spot."""
+    levels, _ = _crossings(x, y)
+    if not len(levels):
+        return None
+    return round(float(levels[np.argmin(np.abs(levels - spot))]), 2)
+
+
+def compute_gamma_profile(contracts, spot, today=None):
+    """One-shot: snapshot contracts -> (StrikeTable, {zero_gamma, call_wall, put_wall})."""
+    chain = contracts if isinstance(contracts, GammaChain) else GammaChain.from_snapshot(contracts, today)
+    table = aggregate_strikes(chain, spot)
+    call_wall, put_wall = find_walls(table)
+    levels = {
+        "zero_gamma": zero_gamma_level(chain, spot, table),
+        "call_wall": call_wall,
+        "put_wall": put_wall
+    }
+    return table, levels
@@ -0,0 +1,276 @@
+"""
+Pooled HTTP Client - Shared keep-alive sessions for every upstream vendor
+
+One requests.Session per vendor (Polygon, Massive, Alpaca, Finnhub, ...) so
+repeat calls reuse the same TCP+TLS connection instead of paying a fresh
+handshake each time. Each vendor gets:
+1. A keep-alive connection pool sized per host
+2. A retry/backoff policy for transient failures (connect errors, 429, 5xx)
+3. A unified default timeout (connect, read)
+4. A token-bucket rate budget so concurrent scans can't burst past the vendor limit
+
+Counters (requests, connection reuse rate, latency histogram per endpoint)
+are exposed via get_http_stats() for the /api/debug/http endpoint.
+"""
+
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# === VENDOR CONFIGURATION ===
+# pool_maxsize = max keep-alive connections held per host
+# timeout = (connect, read) seconds, used when the caller doesn't pass one
+# rate = sustained requests/sec budget (None = unmetered), burst = bucket size
+VENDORS = {
+    "polygon": {"hosts": ("api.polygon.io",), "pool_maxsize": 32, "timeout": (3.05, 15), "retries": 2, "rate": 100, "burst": 50},
+    "massive": {"hosts": ("api.massive.com",), "pool_maxsize": 32, "timeout": (3.05, 15), "retries": 2, "rate": 100, "burst": 50},
+    "alpaca": {"hosts": ("data.alpaca.markets",), "pool_maxsize": 8, "timeout": (3.05, 10), "retries": 2, "rate": 3, "burst": 10},  # 200/min plan
+    "finnhub": {"hosts": ("finnhub.io",), "pool_maxsize": 4, "timeout": (3.05, 10), "retries": 1, "rate": 1, "burst": 5},  # 60/min free tier
+    "polymarket": {"hosts": ("gamma-api.polymarket.com",), "pool_maxsize": 4, "timeout": (3.05, 10), "retries": 1, "rate": None, "burst": None},
+    "marketdata": {"hosts": ("api.marketdata.app",), "pool_maxsize": 4, "timeout": (3.05, 10), "retries": 1, "rate": None, "burst": None},
+    "default": {"hosts": (), "pool_maxsize": 8, "timeout": (3.05, 10), "retries": 1, "rate": None, "burst": None},
+}
+
+# Env overrides, e.g. POLYGON_RATE_LIMIT=50 on a lower plan
+for _name, _cfg in VENDORS.items():
+    _override = os.getenv(f"{_name.upper()}_RATE_LIMIT")
+    if _override:
+        try:
+            _cfg["rate"] = float(_override)
+            _cfg["burst"] = _cfg["burst"] or max(1, int(_cfg["rate"]))
+        except ValueError:
+            pass
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF_FACTOR = 0.25  # 0.25s, 0.5s, 1s ...
+RETRY_BACKOFF_MAX = 2  # Never sleep more than 2s between attempts
+
+# Latency histogram bucket upper bounds (ms)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_HOST_TO_VENDOR = {host: name for name, cfg in VENDORS.items() for host in cfg["hosts"]}
+
+_SESSIONS = {}  # {(vendor, retry): requests.Session}
+_SESSIONS_LOCK = threading.Lock()
+
+_STATS = {}  # {vendor: {"requests": int, "errors": int, "endpoints": {...}}}
+_STATS_LOCK = threading.Lock()
+
+_BUCKETS = {}  # {vendor: RateBudget}
+
+# Path segments that carry symbols, dates or ids collapse to {id} so the
+# histogram groups by endpoint instead of by ticker.
+_ID_SEGMENT = re.compile(r"[0-9:]|^[A-Z.\-]+$")
+
+
+def vendor_for_url(url):
+    """Map a URL to its vendor name (falls back to 'default')."""
+    host = urlsplit(url).hostname or ""
+    return _HOST_TO_VENDOR.get(host, "default")
+
+
+class RateBudget:
+    """
+    Token bucket shared by every caller of one vendor.
+    acquire() blocks (time.sleep, cooperative under gevent) until a token is free.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0  # Requests that had to wait for a token
+        self.wait_ms = 0.0
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if waited:
+                        self.waited += 1
+                        self.wait_ms += waited * 1000
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _get_budget(vendor):
+    budget = _BUCKETS.get(vendor)
+    if budget is None:
+        cfg = VENDORS[vendor]
+        if not cfg.get("rate"):
+            return None
+        with _SESSIONS_LOCK:
+            budget = _BUCKETS.get(vendor)
+            if budget is None:
+                budget = RateBudget(cfg["rate"], cfg["burst"] or cfg["rate"])
+                _BUCKETS[vendor] = budget
+    return budget
+
+
+def _build_session(vendor, retry):
+    cfg = VENDORS[vendor]
+    retries = cfg["retries"] if retry else 0
+    retry_policy = Retry(
+        total=retries,
+        connect=retries,
+        read=0,  # Never replay a request whose response was lost mid-read
+        status=retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        backoff_max=RETRY_BACKOFF_MAX,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,  # Callers check status_code themselves
+        respect_retry_after_header=False,  # A 60s Retry-After would stall the scan loop
+    )
+    adapter = HTTPAdapter(
+        pool_connections=max(1, len(cfg["hosts"])),
+        pool_maxsize=cfg["pool_maxsize"],
+        max_retries=retry_policy,
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(vendor="default", retry=True):
+    """Return the shared session for a vendor (created on first use)."""
+    key = (vendor, retry)
+    session = _SESSIONS.get(key)
+    if session is None:
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(key)
+            if session is None:
+                session = _build_session(vendor, retry)
+                _SESSIONS[key] = session
+    return session
+
+
+def _endpoint_label(url):
+    path = urlsplit(url).path or "/"
+    parts = ["{id}" if _ID_SEGMENT.search(seg) else seg for seg in path.split("/") if seg]
+    return "/" + "/".join(parts)
+
+
+def _record(vendor, endpoint, elapsed_ms, ok):
+    with _STATS_LOCK:
+        vstats = _STATS.setdefault(vendor, {"requests": 0, "errors": 0, "endpoints": {}})
+        vstats["requests"] += 1
+        if not ok:
+            vstats["errors"] += 1
+        ep = vstats["endpoints"].get(endpoint)
+        if ep is None:
+            ep = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+            vstats["endpoints"][endpoint] = ep
+        ep["count"] += 1
+        ep["total_ms"] += elapsed_ms
+        ep["max_ms"] = max(ep["max_ms"], elapsed_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                ep["buckets"][i] += 1
+                break
+        else:
+            ep["buckets"][-1] += 1
+
+
+def http_get(url, params=None, vendor=None, timeout=None, retry=True, **kwargs):
+    """
+    Drop-in replacement for requests.get() that goes through the vendor pool.
+    Raises the same exceptions as requests.get() so existing try/except blocks keep working.
+
+    retry=False skips the retry policy (use on latency-critical paths like the WS callback).
+    """
+    vendor = vendor or vendor_for_url(url)
+    if vendor not in VENDORS:
+        vendor = "default"
+    if timeout is None:
+        timeout = VENDORS[vendor]["timeout"]
+
+    session = get_session(vendor, retry)
+    endpoint = _endpoint_label(url)
+    budget = _get_budget(vendor)
+    if budget is not None:
+        budget.acquire()
+    start = time.perf_counter()
+    ok = False
+    try:
+        resp = session.get(url, params=params, timeout=timeout, **kwargs)
+        ok = resp.status_code < 500
+        return resp
+    finally:
+        _record(vendor, endpoint, (time.perf_counter() - start) * 1000, ok)
+
+
+def _pool_connection_counts(session):
+    """Sum new-connection counters across every urllib3 pool in the session."""
+    opened = 0
+    for adapter in set(session.adapters.values()):
+        poolmanager = getattr(adapter, "poolmanager", None)
+        if poolmanager is None:
+            continue
+        for key in list(poolmanager.pools.keys()):
+            pool = poolmanager.pools.get(key)
+            if pool is not None:
+                opened += getattr(pool, "num_connections", 0)
+    return opened
+
+
+def get_http_stats():
+    """Snapshot of per-vendor counters for the debug endpoint."""
+    with _STATS_LOCK:
+        snapshot = {
+            vendor: {
+                "requests": v["requests"],
+                "errors": v["errors"],
+                "endpoints": {
+                    name: {
+                        "count": ep["count"],
+                        "avg_ms": round(ep["total_ms"] / ep["count"], 1) if ep["count"] else 0,
+                        "max_ms": round(ep["max_ms"], 1),
+                        "histogram": dict(zip(
+                            [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"],
+                            ep["buckets"]
+                        ))
+                    }
+                    for name, ep in v["endpoints"].items()
+                }
+            }
+            for vendor, v in _STATS.items()
+        }
+
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS.items())
+    opened_by_vendor = {}
+    for (vendor, _retry), session in sessions:
+        opened_by_vendor[vendor] = opened_by_vendor.get(vendor, 0) + _pool_connection_counts(session)
+
+    for vendor, v in snapshot.items():
+        opened = opened_by_vendor.get(vendor, 0)
+        v["connections_opened"] = opened
+        # Every request beyond the connections we had to open rode an existing socket
+        v["reuse_rate"] = round(max(0.0, 1 - opened / v["requests"]), 3) if v["requests"] else 0
+        budget = _BUCKETS.get(vendor)
+        if budget is not None:
+            v["rate_budget"] = {
+                "rate_per_sec": budget.rate,
+                "burst": budget.capacity,
+                "throttled_requests": budget.waited,
+                "throttled_ms": round(budget.wait_ms, 1)
+            }
+    return snapshot
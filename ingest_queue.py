@@ -0,0 +1,138 @@
+"""
+Ingest Queue - Decouples WebSocket readers from message processing
+
+The socket callback only does queue.put(raw_text) and returns, so a slow
+enrichment step can no longer stall the socket into a server-side disconnect:
+1. Bounded ring buffer (deque maxlen) - when full the OLDEST frame is dropped
+   and counted, the reader never blocks
+2. Worker pool drains up to `batch_size` frames at a time and decodes them with
+   a single json.loads over the joined frames (one parse call per batch)
+3. Gauges: depth, max depth, drops, processed messages, end-to-end latency
+   (socket receive -> handler done)
+
+Use workers=1 where ordering matters (quotes); trades can fan out.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+class IngestQueue:
+
+    def __init__(self, name, handler, maxlen=50_000, workers=4, batch_size=200):
+        self.name = name
+        self.handler = handler  # handler(list_of_decoded_msgs)
+        self.buffer = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        self.workers = workers
+        self.batch_size = batch_size
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.started = False
+
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self.decode_errors = 0
+        self.handler_errors = 0
+        self.max_depth = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def put(self, raw):
+        """Called from the socket thread. Never blocks; drops oldest when full."""
+        if len(self.buffer) >= self.maxlen:
+            self.dropped += 1
+        self.buffer.append((time.time(), raw))
+        self.received += 1
+        depth = len(self.buffer)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"{self.name}-ingest-{i}", daemon=True).start()
+
+    def _take_batch(self):
+        batch = []
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(self.buffer.popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def _decode(self, raws):
+        """One json.loads for the whole batch; per-frame fallback if any frame is bad."""
+        try:
+            frames = json.loads("[" + ",".join(raws) + "]")
+        except ValueError:
+            frames = []
+            for raw in raws:
+                try:
+                    frames.append(json.loads(raw))
+                except ValueError:
+                    self.decode_errors += 1
+                    print(f"❌ {self.name} WS Parse Error | Msg: {raw[:100]}...")
+
+        msgs = []
+        for frame in frames:
+            # Each frame is either a single event or a list of events
+            if isinstance(frame, list):
+                msgs.extend(frame)
+            else:
+                msgs.append(frame)
+        return msgs
+
+    def _worker(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                self.wakeup.clear()
+                # Re-check after clear so a put() racing the clear isn't missed
+                if not self.buffer:
+                    self.wakeup.wait(timeout=1)
+                continue
+
+            msgs = self._decode([raw for _, raw in batch])
+            try:
+                self.handler(msgs)
+            except Exception as e:
+                self.handler_errors += 1
+                print(f"❌ {self.name} ingest handler error: {e}")
+
+            self.batches += 1
+            self.processed += len(msgs)
+            latency = (time.time() - batch[0][0]) * 1000  # Oldest frame in the batch
+            self.last_latency_ms = latency
+            self.avg_latency_ms = latency if not self.avg_latency_ms else self.avg_latency_ms * 0.95 + latency * 0.05
+            if latency > self.max_latency_ms:
+                self.max_latency_ms = latency
+
+    def stats(self):
+        return {
+            "depth": len(self.buffer),
+            "max_depth": self.max_depth,
+            "capacity": self.maxlen,
+            "workers": self.workers,
+            "received_frames": self.received,
+            "dropped_frames": self.dropped,
+            "processed_msgs": self.processed,
+            "batches": self.batches,
+            "decode_errors": self.decode_errors,
+            "handler_errors": self.handler_errors,
+            "latency_ms": {
+                "last": round(self.last_latency_ms, 1),
+                "avg": round(self.avg_latency_ms, 1),
+                "max": round(self.max_latency_ms, 1)
+            }
+        }
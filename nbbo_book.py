@@ -0,0 +1,190 @@
+"""
+NBBO Book - In-memory best bid/offer per option contract
+
+Fed by the Massive quotes WebSocket (Q.* channel) so trade side classification
+is a local dict lookup instead of a REST /v3/quotes call per trade:
+1. NBBOBook.update() stores the latest (bid, ask, ts) per contract (bounded,
+   least recently updated contracts are evicted first)
+2. NBBOBook.lookup() returns it and counts hits/misses for the debug endpoint
+3. classify_trade_side() is the single BUY/SELL/MID rule shared by every feed
+4. quote_windows() / asof_match(): historical as-of join (latest quote at or before
+   each trade) over one ascending quote stream instead of one REST call per trade
+
+Quotes only arrive when the NBBO changes, so an old entry is still the current
+NBBO as long as the socket stayed connected - the book is cleared on disconnect.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# 2 cent tolerance for edge cases at the touch
+SIDE_TOLERANCE = 0.02
+
+# Past BOOK_MAX_SYMBOLS the least recently updated quotes are popped (O(1) each)
+# down to BOOK_LOW_WATER, so eviction runs once per ~50k new symbols, not per quote
+BOOK_MAX_SYMBOLS = 300_000
+BOOK_LOW_WATER = 250_000
+
+
+def classify_trade_side(price, bid, ask):
+    """
+    Determine side based on where trade price falls vs bid/ask.
+    Industry-standard logic matching Unusual Whales / Cheddar Flow.
+    Returns "BUY", "SELL", "MID", or "NEUTRAL" if there is no usable quote.
+    """
+    if not (bid > 0 and ask > 0):
+        return "NEUTRAL"
+
+    spread = ask - bid
+    if price >= ask - SIDE_TOLERANCE:
+        return "BUY"  # At/above ask = aggressive buyer
+    if price <= bid + SIDE_TOLERANCE:
+        return "SELL"  # At/below bid = aggressive seller
+    if spread <= 0:
+        return "MID"
+
+    # Calculate position in spread (0% = bid, 100% = ask)
+    position_pct = (price - bid) / spread * 100
+    if position_pct >= 75:
+        return "BUY"  # Upper quarter = leaning buyer
+    if position_pct <= 25:
+        return "SELL"  # Lower quarter = leaning seller
+    return "MID"  # Middle 50% = ambiguous
+
+
+class NBBOBook:
+    """Latest NBBO per contract symbol (e.g. 'O:NVDA260116C00150000')."""
+
+    def __init__(self):
+        self.quotes = OrderedDict()  # {symbol: (bid, ask, ts_ms)}, least recently updated first
+        self.lock = threading.Lock()
+        self.connected = False
+        self.quotes_ingested = 0
+        self.hits = 0
+        self.misses = 0
+        self.rest_fallbacks = 0
+        self.rest_fallback_failures = 0
+        self.evicted = 0
+        self.last_lag_ms = 0.0
+        self.avg_lag_ms = 0.0  # EWMA of (receive time - exchange time)
+        self.max_lag_ms = 0.0
+        self.last_quote_at = 0.0
+
+    def update(self, symbol, bid, ask, ts_ms):
+        # Readers don't take the lock (single dict get); it only orders writers
+        with self.lock:
+            self.quotes[symbol] = (bid, ask, ts_ms)
+            self.quotes.move_to_end(symbol)
+            if len(self.quotes) > BOOK_MAX_SYMBOLS:
+                self.evict()
+        self.quotes_ingested += 1
+
+        now = time.time()
+        self.last_quote_at = now
+        if ts_ms:
+            lag = max(0.0, now * 1000 - ts_ms)
+            self.last_lag_ms = lag
+            self.avg_lag_ms = lag if not self.avg_lag_ms else self.avg_lag_ms * 0.99 + lag * 0.01
+            if lag > self.max_lag_ms:
+                self.max_lag_ms = lag
+
+    def ingest(self, msgs):
+        """Apply a batch of Massive/Polygon quote events: ev=Q, sym, bp, ap, t (ms)."""
+        for msg in msgs:
+            if msg.get("ev") != "Q":
+                continue
+            symbol = msg.get("sym")
+            if not symbol:
+                continue
+            try:
+                self.update(symbol, float(msg.get("bp", 0) or 0), float(msg.get("ap", 0) or 0), int(msg.get("t", 0) or 0))
+            except (TypeError, ValueError):
+                continue
+
+    def lookup(self, symbol):
+        """Return (bid, ask, ts_ms) or None, counting hit rate."""
+        quote = self.quotes.get(symbol)
+        if quote is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return quote
+
+    def record_fallback(self, ok):
+        self.rest_fallbacks += 1
+        if not ok:
+            self.rest_fallback_failures += 1
+
+    def evict(self):
+        """Pop the least recently updated quotes down to BOOK_LOW_WATER (caller holds the lock)."""
+        count = len(self.quotes) - BOOK_LOW_WATER
+        for _ in range(count):
+            self.quotes.popitem(last=False)
+        self.evicted += count
+        print(f"🧹 NBBO book evicted {count} least recently updated quotes (size: {len(self.quotes)})")
+
+    def set_connected(self, connected):
+        self.connected = connected
+        if not connected:
+            # Missed updates while disconnected - entries can't be trusted any more
+            self.quotes.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "connected": self.connected,
+            "symbols": len(self.quotes),
+            "evicted": self.evicted,
+            "quotes_ingested": self.quotes_ingested,
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "rest_fallbacks": self.rest_fallbacks,
+            "rest_fallback_failures": self.rest_fallback_failures,
+            "ingest_lag_ms": {
+                "last": round(self.last_lag_ms, 1),
+                "avg": round(self.avg_lag_ms, 1),
+                "max": round(self.max_lag_ms, 1)
+            },
+            "last_quote_age_s": round(time.time() - self.last_quote_at, 1) if self.last_quote_at else None
+        }
+
+
+def quote_windows(timestamps, lookback):
+    """
+    Merge the [ts - lookback, ts] range of every trade into disjoint windows.
+    timestamps must be ascending. Returns [(start, end, [indexes])].
+    """
+    windows = []
+    for i, ts in enumerate(timestamps):
+        start = ts - lookback
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = ts
+            windows[-1][2].append(i)
+        else:
+            windows.append([start, ts, [i]])
+    return [tuple(w) for w in windows]
+
+
+def asof_match(timestamps, quotes, lookback, ts_key="sip_timestamp"):
+    """
+    Single linear pass: for each trade timestamp (ascending) yield
+    (index, quote, complete) where quote is the latest quote with
+    ts - lookback <= quote ts <= ts, or None.
+
+    quotes is any iterable ascending by ts_key and is consumed lazily, so only
+    the current and next quote are held. complete is False when the stream ran
+    out before passing the trade - if the stream was cut short (page budget) a
+    later quote may still exist and the caller should look that trade up directly.
+    """
+    stream = iter(quotes)
+    last = None
+    pending = next(stream, None)
+    for i, ts in enumerate(timestamps):
+        while pending is not None and (pending.get(ts_key) or 0) <= ts:
+            last = pending
+            pending = next(stream, None)
+        matched = last if last is not None and last[ts_key] >= ts - lookback else None
+        yield i, matched, pending is not None
@@ -0,0 +1,155 @@
+"""
+Price Service - Per-symbol single-flight price cache with refresh-ahead
+
+Wraps a price source (yfinance, Polygon/Massive, ...) around an existing
+{symbol: {"price", "timestamp"}} cache dict:
+1. Per-key single-flight: a burst of lookups for one symbol makes ONE upstream
+   call, and a slow symbol never blocks lookups for other symbols
+2. Per-source TTL + negative caching (price None) so failing symbols back off;
+   a failed fetch over a cached price keeps serving that price (timestamp bumped)
+3. Refresh-ahead: once an entry is past `refresh_ahead` of its TTL the cached
+   price is returned and a background refresh starts before it expires
+4. get_many()/refresh_many(): one batched upstream call when the source has a
+   multi-symbol fetcher, otherwise concurrent single fetches
+5. Hit / miss / coalesced / negative-hit counters for the debug endpoint
+"""
+
+import threading
+import time
+
+from gevent.pool import Pool
+
+from singleflight import SingleFlight
+
+
+class PriceSource:
+
+    def __init__(self, name, cache, fetch_one, fetch_many=None, ttl=180, negative_ttl=30, refresh_ahead=0.8,
+                 concurrency=8):
+        self.name = name
+        self.cache = cache  # Shared dict, module-level in run.py (also mirrored across workers)
+        self.fetch_one = fetch_one  # fetch_one(symbol) -> price or None
+        self.fetch_many = fetch_many  # fetch_many([symbols]) -> {symbol: price}
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.concurrency = concurrency
+        self.flight = SingleFlight(f"price:{name}")
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0, "misses": 0, "negative_hits": 0, "refresh_ahead": 0,
+            "fetches": 0, "fetch_failures": 0, "stale_served": 0, "batch_calls": 0, "batch_symbols": 0
+        }
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counters[key] += n
+
+    def store(self, symbol, price, timestamp=None):
+        """Write a fetched price (None = negative cache entry)."""
+        self.cache[symbol] = {"price": price if price else None, "timestamp": timestamp or time.time()}
+
+    def _cached(self, symbol, now):
+        """Return (state, price): state is 'fresh', 'negative' or 'miss'."""
+        entry = self.cache.get(symbol)
+        if not entry:
+            return "miss", None
+        age = now - entry["timestamp"]
+        if entry["price"] is None:
+            return ("negative", None) if age < self.negative_ttl else ("miss", None)
+        if age < self.ttl:
+            if age >= self.ttl * self.refresh_ahead:
+                if self.flight.start(symbol, self._fetch_and_store, symbol):
+                    self._count("refresh_ahead")
+            return "fresh", entry["price"]
+        return "miss", None
+
+    def _fetch_and_store(self, symbol):
+        self._count("fetches")
+        try:
+            price = self.fetch_one(symbol)
+        except Exception as e:
+            print(f"{self.name} price error ({symbol}): {e}")
+            price = None
+        if not price:
+            self._count("fetch_failures")
+            entry = self.cache.get(symbol)
+            if entry and entry["price"] is not None:
+                # Transient upstream error (e.g. during a refresh-ahead) - keep the last good price
+                self._count("stale_served")
+                self.store(symbol, entry["price"])
+                return entry["price"]
+        self.store(symbol, price)
+        return price or None
+
+    def get(self, symbol):
+        state, price = self._cached(symbol, time.time())
+        if state == "fresh":
+            self._count("hits")
+            return price
+        if state == "negative":
+            self._count("negative_hits")
+            return None
+        self._count("misses")
+        return self.flight.do(symbol, self._fetch_and_store, symbol)
+
+    def refresh_many(self, symbols):
+        """
+        Fetch all symbols now (ignores TTL). One batched call if the source supports it;
+        symbols the batch didn't return fall back to single fetches.
+        Returns {symbol: price} for the ones that resolved.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        prices = {}
+        if self.fetch_many and symbols:
+            self._count("batch_calls")
+            self._count("batch_symbols", len(symbols))
+            try:
+                prices = {sym: p for sym, p in (self.fetch_many(symbols) or {}).items() if p}
+            except Exception as e:
+                print(f"{self.name} batch price error ({len(symbols)} symbols): {e}")
+                prices = {}
+            now = time.time()
+            for sym, price in prices.items():
+                self.store(sym, price, now)
+
+        leftover = [sym for sym in symbols if sym not in prices]
+        if leftover:
+            pool = Pool(max(1, min(self.concurrency, len(leftover))))
+            for sym, price in zip(leftover, pool.imap(lambda s: self.flight.do(s, self._fetch_and_store, s), leftover)):
+                if price:
+                    prices[sym] = price
+        return prices
+
+    def get_many(self, symbols):
+        """Cached prices for every symbol; all misses are resolved in one refresh_many() pass."""
+        now = time.time()
+        result = {}
+        missing = []
+        for sym in dict.fromkeys(symbols):
+            state, price = self._cached(sym, now)
+            if state == "fresh":
+                self._count("hits")
+                result[sym] = price
+            elif state == "negative":
+                self._count("negative_hits")
+                result[sym] = None
+            else:
+                self._count("misses")
+                missing.append(sym)
+        if missing:
+            fetched = self.refresh_many(missing)
+            for sym in missing:
+                result[sym] = fetched.get(sym)
+        return result
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"] + counters["negative_hits"]
+        counters["hit_rate"] = round((counters["hits"] + counters["negative_hits"]) / lookups, 3) if lookups else 0
+        counters["coalesced"] = self.flight.coalesced
+        counters["cached_symbols"] = len(self.cache)
+        counters["ttl"] = self.ttl
+        counters["negative_ttl"] = self.negative_ttl
+        return counters
@@ -23,6 +23,26 @@ import threading
 import concurrent.futures
 import requests
 import socket
+from http_client import http_get, get_http_stats
+from scan_engine import fan_out, merge_streams, ScanStats
+from shared_cache import SharedStore, LeaderLock, default_shared_dir
+from nbbo_book import NBBOBook, asof_match, classify_trade_side, quote_windows
+from ingest_queue import IngestQueue
+from gamma_engine import compute_gamma_profile
+from singleflight import SingleFlight
+from price_service import PriceSource
+from bounded_cache import BoundedCache
+from trade_log import ContractTradeLog
+from bar_store import BarStore, resample_bars, to_dicts
+from vwap_aggregator import VWAPAggregator
+from sse_hub import BroadcastHub
+from whale_index import WhaleIndex
+from events import SweepEvent, WhaleEvent
+from dedupe_store import DedupeStore
+from whale_log import WhaleEventLog
+from firestore_sync import SnapshotCache, WriteBehindQueue
+from session_cache import SubscriptionCache, TokenCache
+from scheduler import RetryAfter, Scheduler
 
 # Set global timeout to prevent hanging requests (e.g. blocked yfinance)
 socket.setdefaulttimeout(5)
@@ -162,6 +182,33 @@ if FIREBASE_CREDENTIALS_B64:
 else:
     print("⚠️ FIREBASE_CREDENTIALS_B64 not set - Firestore updates will be disabled")
 
+# Request handlers queue Firestore writes (batched by one writer thread) and read
+# lottos / saved whales from listener-fed local copies (see firestore_sync.py)
+FIRESTORE_WRITES = WriteBehindQueue(lambda: firestore_db)
+LOTTOS_CACHE = SnapshotCache(
+    "lottos",
+    lambda: firestore_db.collection('lottos').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(50) if firestore_db else None,
+    sort_key='timestamp'
+)
+SAVED_WHALES_CACHE = SnapshotCache(
+    "saved_whales",
+    lambda: firestore_db.collection('saved_whales').order_by('savedAt', direction=firestore.Query.DESCENDING).limit(100) if firestore_db else None,
+    sort_key='savedAt'
+)
+
+def fetch_user_doc(uid):
+    """users/{uid} fields, or None for a user without a doc (timeout so a slow Firestore can't hang the request)."""
+    user_doc = firestore_db.collection('users').document(uid).get(timeout=5)
+    return user_doc.to_dict() if user_doc.exists else None
+
+# Verified ID tokens (until they expire) and users/{uid} docs (until a Stripe
+# webhook changes them) - a normal page load needs no Firebase round trip
+VERIFIED_TOKENS = TokenCache(firebase_auth.verify_id_token)
+SUBSCRIPTIONS = SubscriptionCache(
+    fetch_user_doc, default_shared_dir(),
+    ttl=int(os.environ.get("SUBSCRIPTION_CACHE_TTL", "600"))
+)
+
 
 
 @app.route('/preview')
@@ -184,8 +231,8 @@ CACHE_LOCK = threading.Lock()
 POLY_STATE = {}
 
 CACHE = {
-    "whales": {"data": [], "timestamp": 0},
-    "whales_30dte": {"data": [], "timestamp": 0},
+    "whales": {"data": [], "timestamp": 0, "version": 0, "removed": []},
+    "whales_30dte": {"data": [], "timestamp": 0, "version": 0, "removed": []},
     "vix": {"data": {"value": 0, "rating": "Neutral"}, "timestamp": 0},
     "cnn_fear_greed": {"data": {"value": 50, "rating": "Neutral"}, "timestamp": 0},
     "polymarket": {"data": [], "timestamp": 0, "is_mock": False},
@@ -216,6 +263,49 @@ WHALE_WATCHLIST = [
     'NVDA', 'TSLA', 'AAPL', 'AMD', 'MSFT', 'AMZN', 
     'META', 'GOOG', 'GOOGL', 'PLTR', 'MU', 'ORCL', 'TSM', 'WDC', 'STX', 'SNDK', 'CAT', 'ARM', 'AAOI', 'IWM', 'XOM', 'CVX', 'LMT'
 ]
+# Extra tickers via env (comma-separated) - the concurrent scan handles 200+ symbols per pass
+WHALE_WATCHLIST += [t.strip().upper() for t in os.environ.get("WHALE_WATCHLIST_EXTRA", "").split(",") if t.strip() and t.strip().upper() not in WHALE_WATCHLIST]
+
+# Concurrent whale scan: max symbols in flight (vendor rate budget lives in http_client)
+WHALE_SCAN_CONCURRENCY = int(os.environ.get("WHALE_SCAN_CONCURRENCY", "16"))
+WHALE_SCAN_STATS = ScanStats("whales")
+
+# Tickers mapped to their "Size" category and "Sector" for filtering
+HEATMAP_TICKERS = {
+    # Indices
+    "SPY": {"size": "mega", "sector": "INDICES"},
+    "QQQ": {"size": "mega", "sector": "INDICES"},
+    "IWM": {"size": "large", "sector": "INDICES"},
+    "DIA": {"size": "large", "sector": "INDICES"},
+    
+    # Mag 7 (Tech)
+    "NVDA": {"size": "mega", "sector": "TECH"},
+    "AAPL": {"size": "mega", "sector": "TECH"},
+    "MSFT": {"size": "mega", "sector": "TECH"},
+    "GOOGL": {"size": "large", "sector": "TECH"},
+    "GOOG": {"size": "large", "sector": "TECH"},
+    "AMZN": {"size": "large", "sector": "CONSUMER"},
+    "META": {"size": "large", "sector": "TECH"},
+    "TSLA": {"size": "large", "sector": "CONSUMER"},
+    
+    # Others
+    "AMD": {"size": "medium", "sector": "TECH"},
+    "NFLX": {"size": "medium", "sector": "CONSUMER"},
+    "AVGO": {"size": "medium", "sector": "TECH"},
+    "PLTR": {"size": "small", "sector": "TECH"},
+    "COIN": {"size": "small", "sector": "CRYPTO"},
+    "MSTR": {"size": "small", "sector": "CRYPTO"},
+    "RIOT": {"size": "small", "sector": "CRYPTO"},
+    "BTC-USD": {"size": "mega", "sector": "CRYPTO"}
+}
+
+# Movers widget universe
+MOVERS_TICKERS = [
+    "NVDA", "TSLA", "AAPL", "MSFT", "AMZN", "META", "GOOGL",
+    "AMD", "INTC", "AVGO", "MU", "ARM", "SMCI",
+    "PLTR", "CRWD",
+    "NFLX", "DIS", "UBER", "DASH", "ABNB", "PTON", "NKE", "SBUX"
+]
 
 # MarketData.app API Token (for enhanced options data)
 MARKETDATA_TOKEN = os.environ.get("MARKETDATA_TOKEN")
@@ -235,65 +325,60 @@ PRICE_CACHE = {}  # {symbol: {"price": float, "timestamp": float}}
 PRICE_CACHE_TTL = 900  # seconds (15 mins)
 
 # === WHALE CACHE PERSISTENCE ===
-WHALE_CACHE_FILE = "/tmp/pigmentos_whale_cache.json"
+# Append-only event log (see whale_log.py): each scan appends just its new whales,
+# startup replays the current trading session
+WHALE_LOG = WhaleEventLog(
+    os.environ.get("WHALE_LOG_FILE", "/tmp/pigmentos_whale_log.bin"),
+    compact_after=int(os.environ.get("WHALE_LOG_COMPACT_AFTER", "2000"))
+)
 WHALE_CACHE_LAST_CLEAR = 0  # Track when we last cleared
 
-def save_whale_cache():
-    """Save whale data to file for persistence across restarts."""
+def save_whale_cache(new_whales):
+    """Append newly found whales to the whale log (compacting it down to the live feed when due)."""
     try:
-        with CACHE_LOCK:
-            data = {
-                "whales": CACHE["whales"]["data"],
-                "timestamp": CACHE["whales"]["timestamp"],
-                "last_clear": WHALE_CACHE_LAST_CLEAR
-            }
-        with open(WHALE_CACHE_FILE, 'w') as f:
-            json.dump(data, f)
+        session = whale_session()
+        WHALE_LOG.append(session, [w.to_feed() for w in new_whales], time.time())
+        if WHALE_LOG.needs_compaction():
+            with CACHE_LOCK:
+                entry = CACHE["whales_30dte"]
+                live, timestamp = list(entry["data"]), entry["timestamp"]
+            WHALE_LOG.compact(session, whale_feed_json(reversed(live)), timestamp)
+            print(f"🗜️ Compacted whale log to {len(live)} whales")
     except Exception as e:
         print(f"Failed to save whale cache: {e}")
 
 def load_whale_cache():
-    """Load whale data from file on startup."""
-    global WHALE_CACHE_LAST_CLEAR
+    """Replay today's whales from the whale log on startup."""
     try:
-        if os.path.exists(WHALE_CACHE_FILE):
-            with open(WHALE_CACHE_FILE, 'r') as f:
-                data = json.load(f)
-            
-            # Check if we should clear (pre-market of next trading day)
-            if should_clear_whale_cache(data.get("last_clear", 0)):
-                print("🧹 Clearing stale whale cache (pre-market)")
-                return
+        # Check if we should clear (pre-market of next trading day)
+        if should_clear_whale_cache(WHALE_CACHE_LAST_CLEAR):
+            print("🧹 Clearing stale whale cache (pre-market)")
+            return
+        
+        tz_eastern = pytz.timezone('US/Eastern')
+        now_et = datetime.now(tz_eastern)
+        raw_whales, timestamp = WHALE_LOG.replay(whale_session(now_et))
+        if not raw_whales:
+            return
+        
+        # Apply 30-day DTE filter to ALL cached data (Main Dash + Expansion)
+        filtered_whales = []
+        today = now_et.date()
+        for w in raw_whales:
+            try:
+                expiry = w.get("expirationDate")
+                if expiry and (date.fromisoformat(expiry) - today).days <= 30:
+                    filtered_whales.append(WhaleEvent.from_feed(w))
+            except ValueError:
+                pass
+        filtered_whales.sort(key=lambda x: x['timestamp'], reverse=True)
+        
+        with CACHE_LOCK:
+            version = stamp_whale_seqs(filtered_whales)
+            set_whale_feed("whales", filtered_whales[:50], version, timestamp)
+            set_whale_feed("whales_30dte", filtered_whales[:200], version, timestamp)
             
-            with CACHE_LOCK:
-                raw_whales = data.get("whales", [])
-                
-                # Apply 30-day DTE filter to ALL cached data (Main Dash + Expansion)
-                filtered_whales = []
-                tz_eastern = pytz.timezone('US/Eastern')
-                now_et = datetime.now(tz_eastern)
-                
-                for w in raw_whales:
-                    try:
-                        # Check DTE
-                        expiry = w.get("expirationDate")
-                        if expiry:
-                            expiry_date = datetime.strptime(expiry, "%Y-%m-%d").date()
-                            days_to_expiry = (expiry_date - now_et.date()).days
-                            if days_to_expiry <= 30:
-                                filtered_whales.append(w)
-                    except:
-                        pass
-                
-                CACHE["whales"]["data"] = filtered_whales
-                CACHE["whales"]["timestamp"] = data.get("timestamp", 0)
-                
-                # 30 DTE Cache (Now redundant but kept for endpoint compatibility)
-                CACHE["whales_30dte"]["data"] = filtered_whales
-                CACHE["whales_30dte"]["timestamp"] = data.get("timestamp", 0)
-                
-            WHALE_CACHE_LAST_CLEAR = data.get("last_clear", 0)
-            print(f"📂 Loaded {len(filtered_whales)} whale trades from cache (Filtered <= 30 DTE)")
+        print(f"📂 Replayed {len(filtered_whales)} whale trades from the whale log (Filtered <= 30 DTE)")
     except Exception as e:
         print(f"Failed to load whale cache: {e}")
 
@@ -315,6 +400,17 @@ def should_clear_whale_cache(last_clear_ts):
     
     return is_premarket
 
+def whale_session(now_et=None):
+    """
+    Trading session (ISO date) the whale dedupe belongs to: a session starts at the
+    4 AM ET pre-market, weekends and market holidays stay on the last trading day.
+    """
+    now_et = now_et or datetime.now(pytz.timezone('US/Eastern'))
+    day = (now_et - timedelta(hours=4)).date()
+    while day.weekday() >= 5 or day.isoformat() in US_MARKET_HOLIDAYS:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
 def mark_whale_cache_cleared():
     """Mark the current time as when we cleared the cache."""
     global WHALE_CACHE_LAST_CLEAR
@@ -334,103 +430,94 @@ def is_currently_market_hours():
     current_time = now.hour + now.minute / 60
     return 9.5 <= current_time < 16.25 # 9:30 AM to 4:15 PM
 
+def market_session(now_et=None):
+    """
+    Session the background jobs are scheduled by: 'regular' (9:30 AM - 4:15 PM ET,
+    ETFs trade til 4:15), 'extended' (rest of 4 AM - 8 PM), 'overnight' or 'weekend'.
+    """
+    now_et = now_et or datetime.now(pytz.timezone('US/Eastern'))
+    if now_et.weekday() >= 5:
+        return "weekend"
+    current_time = now_et.hour + now_et.minute / 60
+    if 9.5 <= current_time < 16.25:
+        return "regular"
+    if 4 <= current_time < 20:
+        return "extended"
+    return "overnight"
+
+def _fetch_yfinance_price(symbol):
+    """yfinance last price (5s timeout). Primary source for get_cached_price."""
+    def fetch_price():
+        t = yf.Ticker(symbol)
+        return t.fast_info.last_price
+    
+    return with_timeout(fetch_price, timeout_seconds=5)
+
+def _fetch_yfinance_prices(symbols):
+    """One yf.download call for many symbols -> {symbol: last 1m close}."""
+    def fetch_prices():
+        df = yf.download(symbols, period="1d", interval="1m", progress=False, threads=False, auto_adjust=False)
+        if df is None or df.empty:
+            return {}
+        closes = df["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        prices = {}
+        for sym in closes.columns:
+            series = closes[sym].dropna()
+            if len(series):
+                prices[str(sym)] = float(series.iloc[-1])
+        return prices
+    
+    return with_timeout(fetch_prices, timeout_seconds=10) or {}
+
+# yfinance price service: 15 min TTL, failures back off for 120s
+YFINANCE_PRICES = PriceSource("yfinance", PRICE_CACHE, _fetch_yfinance_price, _fetch_yfinance_prices,
+                              ttl=PRICE_CACHE_TTL, negative_ttl=120)
+
 def get_cached_price(symbol):
-    """Get price from cache or fetch from yfinance if stale/missing."""
-    global PRICE_CACHE
-    
-    now = time.time()
-    
-    # Check cache
-    if symbol in PRICE_CACHE:
-        cached = PRICE_CACHE[symbol]
-        # If valid price and fresh
-        if cached["price"] is not None and (now - cached["timestamp"] < PRICE_CACHE_TTL):
-            return cached["price"]
-        # If negative cache (failed recently), wait 120s before retrying
-        if cached["price"] is None and (now - cached["timestamp"] < 120):
-            return None
-    
-    # Fetch from yfinance with timeout (Primary source for price)
-    try:
-        def fetch_price():
-            t = yf.Ticker(symbol)
-            return t.fast_info.last_price
-        
-        price = with_timeout(fetch_price, timeout_seconds=5)
-        if price:
-            PRICE_CACHE[symbol] = {"price": price, "timestamp": now}
-            return price
-    except Exception as e:
-        print(f"yfinance price error ({symbol}): {e}")
-        # Return stale cache if available
-        if symbol in PRICE_CACHE and PRICE_CACHE[symbol]["price"] is not None:
-            PRICE_CACHE[symbol]["timestamp"] = now  # Bump timestamp
-            return PRICE_CACHE[symbol]["price"]
-    
-    # Cache the failure for 30s
-    PRICE_CACHE[symbol] = {"price": None, "timestamp": now}
-    return None
+    """Get price from cache or fetch from yfinance if stale/missing (single-flight per symbol)."""
+    return YFINANCE_PRICES.get(symbol)
 
 # Separate cache for Polygon prices (used by Gamma Wall and Unusual Whales)
 POLYGON_PRICE_CACHE = {}  # {symbol: {"price": float, "timestamp": float}}
-POLYGON_PRICE_CACHE_TTL = 180  # 3 minute TTL (safe with locking)
-POLYGON_PRICE_LOCK = threading.Lock()  # Prevent cache stampede
+POLYGON_PRICE_CACHE_TTL = 180  # 3 minute TTL (single-flight per symbol, refreshed ahead of expiry)
 
-def get_polygon_price(symbol):
-    """Get price for Gamma Wall, Unusual Whales, and Fish Finder.
-    
+def _fetch_polygon_price(symbol):
+    """
     PRIORITY Logic (Avoid yfinance rate limits):
     1. Massive Options snapshot underlying_asset (Options Advanced plan included)
     2. Fallback to yfinance (cached 15 min)
     3. Final fallback to Polygon /prev (returns YESTERDAY's close)
     """
-    global POLYGON_PRICE_CACHE
-    
-    now = time.time()
-    
-    # Check cache first (any source)
-    if symbol in POLYGON_PRICE_CACHE:
-        cached = POLYGON_PRICE_CACHE[symbol]
-        if cached["price"] is not None and (now - cached["timestamp"] < POLYGON_PRICE_CACHE_TTL):
-            return cached["price"]
-    
     # 1. PRIMARY: Use Massive Options snapshot (underlying_asset.price)
     # This is INCLUDED in the Options Advanced plan - no extra cost!
     if MASSIVE_API_KEY:
-        with POLYGON_PRICE_LOCK:
-            # Double-check cache inside lock
-            if symbol in POLYGON_PRICE_CACHE:
-                cached = POLYGON_PRICE_CACHE[symbol]
-                if cached["price"] is not None and (now - cached["timestamp"] < POLYGON_PRICE_CACHE_TTL):
-                    return cached["price"]
+        try:
+            # Fetch just 1 contract to get underlying_asset price
+            url = f"https://api.massive.com/v3/snapshot/options/{symbol}"
+            resp = http_get(url, params={"apiKey": MASSIVE_API_KEY, "limit": 1}, timeout=5)
             
-            try:
-                # Fetch just 1 contract to get underlying_asset price
-                url = f"https://api.massive.com/v3/snapshot/options/{symbol}"
-                resp = requests.get(url, params={"apiKey": MASSIVE_API_KEY, "limit": 1}, timeout=5)
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get("status") == "OK" and data.get("results"):
-                        underlying = data["results"][0].get("underlying_asset", {})
-                        price = underlying.get("price")
-                        if price and price > 0:
-                            POLYGON_PRICE_CACHE[symbol] = {"price": price, "timestamp": now}
-                            return price
-            except Exception as e:
-                print(f"Massive underlying price error ({symbol}): {e}")
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get("status") == "OK" and data.get("results"):
+                    underlying = data["results"][0].get("underlying_asset", {})
+                    price = underlying.get("price")
+                    if price and price > 0:
+                        return price
+        except Exception as e:
+            print(f"Massive underlying price error ({symbol}): {e}")
     
     # 2. FALLBACK: yfinance (cached for 15 min to avoid rate limits)
     price = get_cached_price(symbol)
     if price:
-        POLYGON_PRICE_CACHE[symbol] = {"price": price, "timestamp": now}
         return price
     
     # 3. FINAL FALLBACK: Polygon /prev (returns YESTERDAY's close)
     if POLYGON_API_KEY:
         try:
             url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/prev?adjusted=true&apiKey={POLYGON_API_KEY}"
-            resp = requests.get(url, timeout=5)
+            resp = http_get(url, timeout=5)
             
             if resp.status_code == 200:
                 data = resp.json()
@@ -438,17 +525,271 @@ def get_polygon_price(symbol):
                     price = data["results"][0].get("c")  # "c" = close price
                     if price and price > 0:
                         print(f"⚠️ Using Polygon /prev for {symbol} (yesterday's close: ${price})")
-                        POLYGON_PRICE_CACHE[symbol] = {"price": price, "timestamp": now}
                         return price
         except Exception as e:
             print(f"Polygon price error ({symbol}): {e}")
     
     return None
 
-def fetch_options_chain_polygon(symbol, strike_limit=40):
+# === BULK SNAPSHOT PRICES ===
+# One multi-ticker stock snapshot per cycle prices every watchlist / heatmap / movers
+# symbol, instead of one Massive/yfinance lookup per symbol. Feeds PRICE_CACHE and
+# POLYGON_PRICE_CACHE from the same response so both caches agree.
+STOCK_SNAPSHOT_URL = "https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers"
+STOCK_SNAPSHOT_CHUNK = 200  # tickers per request (keeps the URL short)
+BULK_PRICE_INTERVAL = int(os.environ.get("BULK_PRICE_INTERVAL", "60"))
+STOCK_SNAPSHOT_CACHE = {}  # {symbol: {"price": float, "prev_close": float, "timestamp": float}}
+BULK_PRICE_STATS = {"runs": 0, "requests": 0, "symbols": 0, "resolved": 0, "errors": 0, "last_run": 0, "last_duration_ms": 0}
+
+def _snapshot_price(ticker):
+    """Freshest price in a snapshot ticker: last trade -> minute bar -> day bar -> previous close."""
+    for value in (
+        (ticker.get("lastTrade") or {}).get("p"),
+        (ticker.get("min") or {}).get("c"),
+        (ticker.get("day") or {}).get("c"),
+        (ticker.get("prevDay") or {}).get("c")
+    ):
+        if value and value > 0:
+            return value
+    return None
+
+def fetch_stock_snapshots(symbols):
+    """
+    Polygon multi-ticker stock snapshot -> {symbol: {"price", "prev_close"}}.
+    Non-stock symbols (BTC-USD) are skipped; results are also written to STOCK_SNAPSHOT_CACHE.
+    """
+    if not POLYGON_API_KEY:
+        return {}
+    stocks = [s for s in dict.fromkeys(symbols) if "-" not in s]
+    snapshots = {}
+    
+    for i in range(0, len(stocks), STOCK_SNAPSHOT_CHUNK):
+        chunk = stocks[i:i + STOCK_SNAPSHOT_CHUNK]
+        BULK_PRICE_STATS["requests"] += 1
+        try:
+            resp = http_get(STOCK_SNAPSHOT_URL, params={"tickers": ",".join(chunk), "apiKey": POLYGON_API_KEY}, timeout=10)
+            if resp.status_code != 200:
+                print(f"⚠️ Stock snapshot HTTP {resp.status_code} ({len(chunk)} tickers)")
+                BULK_PRICE_STATS["errors"] += 1
+                continue
+            for ticker in resp.json().get("tickers") or []:
+                price = _snapshot_price(ticker)
+                if ticker.get("ticker") and price:
+                    snapshots[ticker["ticker"]] = {
+                        "price": price,
+                        "prev_close": (ticker.get("prevDay") or {}).get("c") or None
+                    }
+        except Exception as e:
+            print(f"Stock snapshot error ({len(chunk)} tickers): {e}")
+            BULK_PRICE_STATS["errors"] += 1
+    
+    now = time.time()
+    for sym, snap in snapshots.items():
+        STOCK_SNAPSHOT_CACHE[sym] = {**snap, "timestamp": now}
+    return snapshots
+
+def _fetch_polygon_prices(symbols):
+    """Batch fetcher for POLYGON_PRICES: one snapshot call -> {symbol: price}."""
+    return {sym: snap["price"] for sym, snap in fetch_stock_snapshots(symbols).items()}
+
+def get_stock_snapshots(symbols, max_age=None):
+    """
+    {symbol: {"price", "prev_close"}} from STOCK_SNAPSHOT_CACHE, fetching every
+    missing/stale stock symbol in a single snapshot call.
+    """
+    max_age = max_age or BULK_PRICE_INTERVAL * 2
+    now = time.time()
+    result = {}
+    missing = []
+    for sym in dict.fromkeys(symbols):
+        entry = STOCK_SNAPSHOT_CACHE.get(sym)
+        if entry and now - entry["timestamp"] < max_age:
+            result[sym] = entry
+        elif "-" not in sym:
+            missing.append(sym)
+    if missing:
+        result.update(fetch_stock_snapshots(missing))
+    return result
+
+def bulk_price_symbols():
+    """Every stock symbol the dashboards price: whale watchlist, gamma set, heatmap and movers."""
+    symbols = WHALE_WATCHLIST + GAMMA_PRECOMPUTE_SYMBOLS + list(HEATMAP_TICKERS) + MOVERS_TICKERS
+    return [s for s in dict.fromkeys(symbols) if "-" not in s]
+
+def refresh_bulk_prices():
+    """Refresh all bulk_price_symbols() with one upstream call and store into both price caches."""
+    start = time.time()
+    symbols = bulk_price_symbols()
+    snapshots = fetch_stock_snapshots(symbols)
+    now = time.time()
+    for sym, snap in snapshots.items():
+        POLYGON_PRICES.store(sym, snap["price"], now)
+        YFINANCE_PRICES.store(sym, snap["price"], now)
+    
+    BULK_PRICE_STATS["runs"] += 1
+    BULK_PRICE_STATS["symbols"] = len(symbols)
+    BULK_PRICE_STATS["resolved"] = len(snapshots)
+    BULK_PRICE_STATS["last_run"] = now
+    BULK_PRICE_STATS["last_duration_ms"] = round((now - start) * 1000, 1)
+    return len(snapshots)
+
+POLYGON_PRICES = PriceSource("polygon", POLYGON_PRICE_CACHE, _fetch_polygon_price, _fetch_polygon_prices,
+                             ttl=POLYGON_PRICE_CACHE_TTL, negative_ttl=30)
+
+def get_polygon_price(symbol):
+    """Get price for Gamma Wall, Unusual Whales, and Fish Finder.
+    
+    Cached per symbol (POLYGON_PRICE_CACHE_TTL) with single-flight: concurrent
+    lookups for one symbol share a fetch, other symbols are never blocked.
+    Source priority: see _fetch_polygon_price.
+    """
+    return POLYGON_PRICES.get(symbol)
+
+# US Market Holiday Calendar (2024-2027)
+# These are the major holidays when US stock markets are CLOSED
+US_MARKET_HOLIDAYS = {
+    # 2024
+    "2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27",
+    "2024-06-19", "2024-07-04", "2024-09-02", "2024-11-28", "2024-12-25",
+    # 2025
+    "2025-01-01", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26",
+    "2025-06-19", "2025-07-04", "2025-09-01", "2025-11-27", "2025-12-25",
+    # 2026
+    "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25",
+    "2026-06-19", "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+    # 2027
+    "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31",
+    "2027-06-18", "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
+}
+
+def get_next_trading_day(start_date):
+    """Find next valid trading day (skip weekends and US holidays)."""
+    check_date = start_date
+    for _ in range(7):  # Max 7 days lookahead
+        if check_date.weekday() < 5 and check_date.strftime("%Y-%m-%d") not in US_MARKET_HOLIDAYS:
+            return check_date
+        check_date = check_date + timedelta(days=1)
+    return start_date + timedelta(days=1)  # Fallback
+
+
+def resolve_gamma_expiry(symbol, now_et):
+    """
+    Default Gamma Wall expiry for a symbol at a given ET time.
+    Returns (expiry_date "YYYY-MM-DD", is_next_trading_day, date_label).
+    """
+    today_weekday = now_et.weekday()  # 0=Mon, 4=Fri, 5=Sat, 6=Sun
+    is_weekend = today_weekday >= 5
+    
+    # Tickers with daily expirations (0DTE available)
+    daily_expiry_tickers = ['SPY', 'QQQ', 'IWM', 'DIA']
+    has_daily = symbol.upper() in daily_expiry_tickers
+    
+    # Custom Logic: Switch to next expiry at 5:00 PM ET (17:00)
+    # This allows users to see next day's levels after market close
+    switch_hour = 17 
+    current_hour = now_et.hour
+    
+    # Track if we're showing next trading day data
+    is_next_trading_day = False
+    date_label = "TODAY"
+    
+    if is_weekend:
+        is_next_trading_day = True
+        if has_daily:
+            # Weekend + daily ticker: find next valid trading day (skips holidays)
+            next_day = get_next_trading_day(now_et.date() + timedelta(days=1))
+            expiry_date = next_day.strftime("%Y-%m-%d")
+            # Format: "TUE JAN 20" (or MON if not holiday)
+            date_label = next_day.strftime("%a %b %d").upper()
+            print(f"Polygon: Weekend - using next trading day {expiry_date} for {symbol}")
+        else:
+            # Weekend + non-daily ticker: use next Friday for DATA, but label as next trading day for UI
+            days_until_friday = (4 - today_weekday + 7) % 7
+            if days_until_friday == 0:
+                days_until_friday = 7
+            expiry_date = (now_et + timedelta(days=days_until_friday)).strftime("%Y-%m-%d")
+            
+            # UI LABEL: Show next trading day (may skip holidays)
+            next_trading_day = get_next_trading_day(now_et.date() + timedelta(days=1))
+            date_label = next_trading_day.strftime("%a %b %d").upper()
+            
+            print(f"Polygon: Weekend - using Friday {expiry_date} for {symbol} (Label: {date_label})")
+    elif has_daily:
+        # For daily tickers (SPY, QQQ, etc.)
+        # Keep showing TODAY's expiry until 5:00 PM
+        if current_hour < switch_hour:
+            expiry_date = now_et.strftime("%Y-%m-%d")
+            date_label = "TODAY"
+            print(f"Polygon: Pre-5PM - using today {expiry_date} for {symbol}")
+        else:
+            # After 5 PM, switch to next trading day
+            is_next_trading_day = True
+            if today_weekday == 4:  # Friday -> Monday
+                days_ahead = 3
+            elif today_weekday == 5:  # Saturday -> Monday
+                days_ahead = 2
+            elif today_weekday == 6:  # Sunday -> Monday
+                days_ahead = 1
+            else:
+                days_ahead = 1
+            next_day = now_et + timedelta(days=days_ahead)
+            expiry_date = next_day.strftime("%Y-%m-%d")
+            date_label = next_day.strftime("%a %b %d").upper()
+            print(f"Polygon: Post-5PM - using next expiry {expiry_date} for {symbol}")
+    else:
+        # Non-daily tickers: always use next Friday
+        days_until_friday = (4 - today_weekday) % 7
+        
+        # If it's Friday and after 5 PM, switch to NEXT Friday for data
+        if days_until_friday == 0 and current_hour >= switch_hour:
+            days_until_friday = 7
+            
+        next_friday = now_et + timedelta(days=days_until_friday)
+        expiry_date = next_friday.strftime("%Y-%m-%d")
+        
+        # UI LABEL LOGIC:
+        # For individual tickers, show the actual Friday date we are using
+        is_next_trading_day = True
+        date_label = next_friday.strftime("%a %b %d").upper()
+        
+        print(f"Polygon: Using Friday {expiry_date} for {symbol} (Label: {date_label})")
+    
+    return expiry_date, is_next_trading_day, date_label
+
+
+def upcoming_gamma_expiries(symbol, count=1, now_et=None):
+    """
+    The default expiry plus the following ones: next trading days for daily
+    tickers (SPY/QQQ/IWM/DIA), following Fridays (holiday -> prior trading day) otherwise.
+    Returns [(expiry_date, is_next_trading_day, date_label), ...].
+    """
+    now_et = now_et or datetime.now(pytz.timezone('US/Eastern'))
+    first = resolve_gamma_expiry(symbol, now_et)
+    expiries = [first]
+    current = datetime.strptime(first[0], "%Y-%m-%d").date()
+    has_daily = symbol.upper() in ['SPY', 'QQQ', 'IWM', 'DIA']
+    
+    while len(expiries) < count:
+        if has_daily:
+            current = get_next_trading_day(current + timedelta(days=1))
+            expiry = current
+        else:
+            # Walk Friday to Friday; a holiday Friday expires the trading day before
+            current = current + timedelta(days=(4 - current.weekday()) % 7 or 7)
+            expiry = current
+            while expiry.weekday() >= 5 or expiry.strftime("%Y-%m-%d") in US_MARKET_HOLIDAYS:
+                expiry = expiry - timedelta(days=1)
+            if expiry.strftime("%Y-%m-%d") <= expiries[-1][0]:
+                continue  # The Thursday before a holiday Friday, already listed
+        expiries.append((expiry.strftime("%Y-%m-%d"), True, expiry.strftime("%a %b %d").upper()))
+    return expiries
+
+
+def fetch_options_chain_polygon(symbol, strike_limit=40, expiry=None):
     """
     Fetch options chain snapshot from Polygon.io API.
     Returns data formatted for Gamma Wall or None if failed.
+    expiry="YYYY-MM-DD" overrides the default expiry selection (resolve_gamma_expiry).
     
     Polygon Starter: Unlimited API calls, 15-min delayed, Greeks included.
     """
@@ -479,117 +820,14 @@ def fetch_options_chain_polygon(symbol, strike_limit=40):
             strike_low = int(current_price * 0.80)
             strike_high = int(current_price * 1.20)
         
-        # Smart expiration selection for SPY/QQQ/IWM/DIA:
-        tz_eastern = pytz.timezone('US/Eastern')
-        now_et = datetime.now(tz_eastern)
-        today_weekday = now_et.weekday()  # 0=Mon, 4=Fri, 5=Sat, 6=Sun
-        
-        pre_market_start = now_et.replace(hour=4, minute=0, second=0, microsecond=0)
-        market_open = now_et.replace(hour=9, minute=30, second=0, microsecond=0)
-        market_close = now_et.replace(hour=16, minute=0, second=0, microsecond=0)
-        post_market_end = now_et.replace(hour=20, minute=0, second=0, microsecond=0)
-        
-        is_weekend = today_weekday >= 5
-        
-        # US Market Holiday Calendar (2024-2027)
-        # These are the major holidays when US stock markets are CLOSED
-        US_MARKET_HOLIDAYS = {
-            # 2024
-            "2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27",
-            "2024-06-19", "2024-07-04", "2024-09-02", "2024-11-28", "2024-12-25",
-            # 2025
-            "2025-01-01", "2025-01-20", "2025-02-17", "2025-04-18", "2025-05-26",
-            "2025-06-19", "2025-07-04", "2025-09-01", "2025-11-27", "2025-12-25",
-            # 2026
-            "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25",
-            "2026-06-19", "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
-            # 2027
-            "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31",
-            "2027-06-18", "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
-        }
-        
-        def get_next_trading_day(start_date):
-            """Find next valid trading day (skip weekends and US holidays)."""
-            check_date = start_date
-            for _ in range(7):  # Max 7 days lookahead
-                if check_date.weekday() < 5 and check_date.strftime("%Y-%m-%d") not in US_MARKET_HOLIDAYS:
-                    return check_date
-                check_date = check_date + timedelta(days=1)
-            return start_date + timedelta(days=1)  # Fallback
-        
-        # Tickers with daily expirations (0DTE available)
-        daily_expiry_tickers = ['SPY', 'QQQ', 'IWM', 'DIA']
-        has_daily = symbol.upper() in daily_expiry_tickers
-        
-        # Custom Logic: Switch to next expiry at 5:00 PM ET (17:00)
-        # This allows users to see next day's levels after market close
-        switch_hour = 17 
-        current_hour = now_et.hour
-        
-        # Track if we're showing next trading day data
-        is_next_trading_day = False
-        date_label = "TODAY"
-        
-        if is_weekend:
-            is_next_trading_day = True
-            if has_daily:
-                # Weekend + daily ticker: find next valid trading day (skips holidays)
-                next_day = get_next_trading_day(now_et.date() + timedelta(days=1))
-                expiry_date = next_day.strftime("%Y-%m-%d")
-                # Format: "TUE JAN 20" (or MON if not holiday)
-                date_label = next_day.strftime("%a %b %d").upper()
-                print(f"Polygon: Weekend - using next trading day {expiry_date} for {symbol}")
-            else:
-                # Weekend + non-daily ticker: use next Friday for DATA, but label as next trading day for UI
-                days_until_friday = (4 - today_weekday + 7) % 7
-                if days_until_friday == 0:
-                    days_until_friday = 7
-                expiry_date = (now_et + timedelta(days=days_until_friday)).strftime("%Y-%m-%d")
-                
-                # UI LABEL: Show next trading day (may skip holidays)
-                next_trading_day = get_next_trading_day(now_et.date() + timedelta(days=1))
-                date_label = next_trading_day.strftime("%a %b %d").upper()
-                
-                print(f"Polygon: Weekend - using Friday {expiry_date} for {symbol} (Label: {date_label})")
-        elif has_daily:
-            # For daily tickers (SPY, QQQ, etc.)
-            # Keep showing TODAY's expiry until 5:00 PM
-            if current_hour < switch_hour:
-                expiry_date = now_et.strftime("%Y-%m-%d")
-                date_label = "TODAY"
-                print(f"Polygon: Pre-5PM - using today {expiry_date} for {symbol}")
-            else:
-                # After 5 PM, switch to next trading day
-                is_next_trading_day = True
-                if today_weekday == 4:  # Friday -> Monday
-                    days_ahead = 3
-                elif today_weekday == 5:  # Saturday -> Monday
-                    days_ahead = 2
-                elif today_weekday == 6:  # Sunday -> Monday
-                    days_ahead = 1
-                else:
-                    days_ahead = 1
-                next_day = now_et + timedelta(days=days_ahead)
-                expiry_date = next_day.strftime("%Y-%m-%d")
-                date_label = next_day.strftime("%a %b %d").upper()
-                print(f"Polygon: Post-5PM - using next expiry {expiry_date} for {symbol}")
+        # Smart expiration selection for SPY/QQQ/IWM/DIA (or the explicitly requested expiry)
+        if expiry:
+            expiry_date = expiry
+            expiry_day = datetime.strptime(expiry, "%Y-%m-%d").date()
+            is_next_trading_day = expiry_day != datetime.now(pytz.timezone('US/Eastern')).date()
+            date_label = expiry_day.strftime("%a %b %d").upper() if is_next_trading_day else "TODAY"
         else:
-            # Non-daily tickers: always use next Friday
-            days_until_friday = (4 - today_weekday) % 7
-            
-            # If it's Friday and after 5 PM, switch to NEXT Friday for data
-            if days_until_friday == 0 and current_hour >= switch_hour:
-                days_until_friday = 7
-                
-            next_friday = now_et + timedelta(days=days_until_friday)
-            expiry_date = next_friday.strftime("%Y-%m-%d")
-            
-            # UI LABEL LOGIC:
-            # For individual tickers, show the actual Friday date we are using
-            is_next_trading_day = True
-            date_label = next_friday.strftime("%a %b %d").upper()
-            
-            print(f"Polygon: Using Friday {expiry_date} for {symbol} (Label: {date_label})")
+            expiry_date, is_next_trading_day, date_label = resolve_gamma_expiry(symbol, datetime.now(pytz.timezone('US/Eastern')))
         
         # Polygon options chain snapshot endpoint
         url = f"https://api.polygon.io/v3/snapshot/options/{symbol}"
@@ -604,7 +842,7 @@ def fetch_options_chain_polygon(symbol, strike_limit=40):
             "sort": "strike_price"
         }
         
-        resp = requests.get(url, params=params, timeout=15)
+        resp = http_get(url, params=params, timeout=15)
         
         # No fallback - if no data, return None (status light will indicate issue)
         if resp.status_code == 200:
@@ -633,9 +871,9 @@ def fetch_options_chain_polygon(symbol, strike_limit=40):
 def parse_polygon_to_gamma_format(polygon_data, current_price=None):
     """
     Convert Polygon options snapshot to Gamma Wall format.
-    Groups contracts by strike and aggregates call/put volume.
+    Groups contracts by strike and aggregates call/put volume (vectorized, see gamma_engine).
+    Returns (StrikeTable, underlying_price, {"zero_gamma", "call_wall", "put_wall"}).
     """
-    gamma_data = {}
     underlying_price = current_price
     
     # Get underlying price from Polygon stocks API if not provided
@@ -643,7 +881,7 @@ def parse_polygon_to_gamma_format(polygon_data, current_price=None):
         try:
             # Use Polygon previous close endpoint for price
             price_url = f"https://api.polygon.io/v2/aggs/ticker/SPY/prev"
-            price_resp = requests.get(price_url, params={"apiKey": POLYGON_API_KEY}, timeout=5)
+            price_resp = http_get(price_url, params={"apiKey": POLYGON_API_KEY}, timeout=5)
             if price_resp.status_code == 200:
                 price_data = price_resp.json()
                 if price_data.get("results"):
@@ -655,64 +893,71 @@ def parse_polygon_to_gamma_format(polygon_data, current_price=None):
     if not underlying_price:
         underlying_price = 600  # Fallback default for SPY
     
-    for contract in polygon_data.get("results", []):
-        details = contract.get("details", {})
-        strike = details.get("strike_price")
-        side = details.get("contract_type", "").lower()  # "call" or "put"
-        
-        if not strike or not side:
-            continue
-        
-        if strike not in gamma_data:
-            gamma_data[strike] = {
-                "call_vol": 0, "put_vol": 0, 
-                "call_oi": 0, "put_oi": 0, 
-                "call_premium": 0, "put_premium": 0,
-                "call_gex": 0, "put_gex": 0,  # GEX per strike
-                "net_gex": 0  # Net GEX (industry standard: call_gex + put_gex)
-            }
-        
-        day_data = contract.get("day", {})
-        greeks = contract.get("greeks", {})
-        
-        vol = int(day_data.get("volume", 0) or 0)
-        oi = int(contract.get("open_interest", 0) or 0)
-        price = float(day_data.get("close", 0) or day_data.get("vwap", 0) or 0)  # Contract price
-        gamma_val = float(greeks.get("gamma", 0) or 0)
-        
-        # GEX Formula (Industry Standard - 1% Move Normalization):
-        # GEX = Gamma × OI × 100 shares × Spot² × 0.01
-        # This represents "$ of shares MMs must trade per 1% move in underlying"
-        # Calls = positive GEX (MM buys dips), Puts = negative GEX (MM sells dips)
-        gex = gamma_val * oi * 100 * (underlying_price ** 2) * 0.01 if gamma_val and oi else 0
-        
-        if side == "call":
-            gamma_data[strike]["call_vol"] += vol
-            gamma_data[strike]["call_oi"] += oi
-            gamma_data[strike]["call_premium"] = max(gamma_data[strike]["call_premium"], price)
-            gamma_data[strike]["call_gex"] += gex  # Positive (bullish hedging)
-            gamma_data[strike]["net_gex"] += gex  # Net GEX: calls add
-        else:
-            gamma_data[strike]["put_vol"] += vol
-            gamma_data[strike]["put_oi"] += oi
-            gamma_data[strike]["put_premium"] = max(gamma_data[strike]["put_premium"], price)
-            gamma_data[strike]["put_gex"] -= gex  # Negative (bearish hedging)
-            gamma_data[strike]["net_gex"] -= gex  # Net GEX: puts subtract
-    
-    return gamma_data, underlying_price
+    gamma_table, levels = compute_gamma_profile(polygon_data.get("results", []), underlying_price)
+    return gamma_table, underlying_price, levels
+
 
+# Snapshot pagination: each call/put chain follows next_url up to this many pages
+SNAPSHOT_PAGE_LIMIT = 250
+SNAPSHOT_MAX_PAGES = int(os.environ.get("SNAPSHOT_MAX_PAGES", "10"))
+SNAPSHOT_PAGINATION_STATS = {}  # {symbol: {"pages", "contracts", "truncated", "errors", "timestamp"}}
 
-def fetch_unusual_options_polygon(symbol):
+
+def iter_polygon_snapshot(symbol, params, max_pages=SNAPSHOT_MAX_PAGES, page_stats=None):
+    """
+    Yield contracts from /v3/snapshot/options/{symbol}, following next_url.
+    Stops after max_pages and marks page_stats["truncated"] if more pages remained.
+    """
+    url = f"https://api.polygon.io/v3/snapshot/options/{symbol}"
+    params = dict(params, apiKey=POLYGON_API_KEY, limit=SNAPSHOT_PAGE_LIMIT)
+    pages = 0
+    
+    while url:
+        if pages >= max_pages:
+            if page_stats is not None:
+                page_stats["truncated"] = True
+            break
+        
+        # The stream is consumed lazily (after fetch_unusual_options_polygon returned),
+        # so a failed page must end this cursor here instead of raising into the scan
+        try:
+            resp = http_get(url, params=params, timeout=15)
+            if resp.status_code != 200:
+                print(f"Polygon Whale Error ({symbol}): Status {resp.status_code}")
+                if page_stats is not None:
+                    page_stats["errors"] += 1
+                break
+
+            data = resp.json()
+        except Exception as e:
+            print(f"Polygon Whale Error ({symbol}): page {pages + 1} failed: {e}")
+            if page_stats is not None:
+                page_stats["errors"] += 1
+            break
+        results = data.get("results") or []
+        pages += 1
+        if page_stats is not None:
+            page_stats["pages"] += 1
+            page_stats["contracts"] += len(results)
+        
+        for contract in results:
+            yield contract
+        
+        # next_url carries the cursor + filters, only the key needs re-adding
+        url = data.get("next_url")
+        params = {"apiKey": POLYGON_API_KEY}
+
+
+def fetch_unusual_options_polygon(symbol, max_pages=SNAPSHOT_MAX_PAGES):
     """
     Fetch options data from Polygon and detect unusual activity (whale trades).
-    Returns list of whale trades meeting criteria.
+    Returns {"results": <contract generator>, "_current_price": float, "_pagination": stats}.
+    Calls and puts are paged concurrently; contracts stream to the caller as pages arrive.
     """
     if not POLYGON_API_KEY:
         return None
     
     try:
-        from datetime import timedelta
-        
         # Get current price from Polygon (faster than yfinance)
         current_price = get_polygon_price(symbol)
         
@@ -724,38 +969,101 @@ def fetch_unusual_options_polygon(symbol):
         strike_low = int(current_price * 0.90)
         strike_high = int(current_price * 1.10)
         
-        # Polygon snapshot endpoint
-        url = f"https://api.polygon.io/v3/snapshot/options/{symbol}"
         params = {
-            "apiKey": POLYGON_API_KEY,
-            "limit": 250,
             "strike_price.gte": strike_low,
             "strike_price.lte": strike_high
         }
         
-        resp = requests.get(url, params=params, timeout=15)
-        
-        if resp.status_code != 200:
-            print(f"Polygon Whale Error ({symbol}): Status {resp.status_code}")
-            return None
-        
-        data = resp.json()
-        if not data.get("results"):
-            return None
-        
-        # Store current price for moneyness calculation
-        data["_current_price"] = current_price
-        return data
+        page_stats = {"pages": 0, "contracts": 0, "truncated": False, "errors": 0, "max_pages": max_pages, "timestamp": time.time()}
+        SNAPSHOT_PAGINATION_STATS[symbol] = page_stats
+        
+        def stream():
+            # Two independent cursors (call/put) -> two pages in flight at once
+            yield from merge_streams([
+                iter_polygon_snapshot(symbol, dict(params, contract_type=side), max_pages, page_stats)
+                for side in ("call", "put")
+            ])
+            if page_stats["truncated"]:
+                print(f"⚠️ Polygon snapshot truncated for {symbol}: {page_stats['contracts']} contracts in {page_stats['pages']} pages (cap {max_pages}/side)")
+        
+        return {
+            "results": stream(),
+            # Store current price for moneyness calculation
+            "_current_price": current_price,
+            "_pagination": page_stats
+        }
         
     except Exception as e:
         print(f"Polygon Whale Fetch Failed ({symbol}): {e}")
         return None
 
 
+# === BAR STORE ===
+# Aggregates are served from bar_store.BarStore (on-disk, per underlying/date);
+# only days not on disk yet - and new bars for today - are fetched from Polygon.
+# Higher timeframes are resampled locally from the stored 1-minute bars.
+BAR_STORE = BarStore(today_ttl=60, retention_days=int(os.environ.get("BAR_STORE_RETENTION_DAYS", "120")))
+AGGS_MAX_PAGES = 20
+
+def _fetch_aggs_range(ticker, timespan, multiplier, frm, to):
+    """Every Polygon v2 aggregate bar in [frm, to] (dates or ms), following next_url. None on failure."""
+    url = f"https://api.polygon.io/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{frm}/{to}"
+    params = {
+        "apiKey": POLYGON_API_KEY,
+        "limit": 50000,
+        "adjusted": "true",
+        "sort": "asc"
+    }
+    bars = []
+    pages = 0
+    
+    try:
+        while url:
+            if pages >= AGGS_MAX_PAGES:
+                print(f"Polygon Aggs truncated ({ticker} {frm}..{to}) - not storing")
+                return None
+            resp = http_get(url, params=params, timeout=10)
+            if resp.status_code != 200:
+                print(f"Polygon Aggs Error ({ticker}): {resp.status_code}")
+                return None
+            data = resp.json()
+            bars.extend(data.get("results") or [])
+            pages += 1
+            url = data.get("next_url")
+            params = {"apiKey": POLYGON_API_KEY}
+    except Exception as e:
+        print(f"Polygon Aggs Fetch Failed ({ticker}): {e}")
+        return None
+    return bars
+
+def get_stored_aggs(ticker, timespan, multiplier, start_date, end_date):
+    """
+    Bars (Polygon dict shape, ascending) for [start_date, end_date] from BAR_STORE.
+    Minute / hour / day intervals are resampled from one stored 1-minute series,
+    so switching chart intervals never goes back to Polygon.
+    None only if Polygon failed and nothing was available locally.
+    """
+    if not POLYGON_API_KEY:
+        return None
+    # week / month / multi-day can't be built from minutes - store those natively
+    native = timespan not in ("minute", "hour", "day") or (timespan == "day" and multiplier != 1)
+    base_span, base_mult = (timespan, multiplier) if native else ("minute", 1)
+    
+    bars, failed = BAR_STORE.read(
+        ticker, f"{base_mult}{base_span}", start_date, end_date,
+        lambda t, frm, to: _fetch_aggs_range(t, base_span, base_mult, frm, to)
+    )
+    if failed and not len(bars):
+        return None
+    if (timespan, multiplier) != (base_span, base_mult):
+        bars = resample_bars(bars, timespan, multiplier)
+    return to_dicts(bars)
+
 def fetch_polygon_historical_aggs(contract_symbol, timespan="minute", multiplier=5, limit=5000, days=30):
     """
     Fetch historical aggregates (bars) for a specific option contract from Polygon.
     Used for the "Trade Visualization" chart as a fallback for restricted Trades API.
+    Served from BAR_STORE: repeat loads only fetch what isn't on disk yet.
     """
     if not POLYGON_API_KEY:
         return None
@@ -776,44 +1084,22 @@ def fetch_polygon_historical_aggs(contract_symbol, timespan="minute", multiplier
         else:
             start_date = (now - timedelta(days=days)).strftime("%Y-%m-%d")
         
-        # Polygon v2 Aggs Endpoint
-        # https://api.polygon.io/v2/aggs/ticker/{ticker}/range/{multiplier}/{timespan}/{from}/{to}
-        url = f"https://api.polygon.io/v2/aggs/ticker/{contract_symbol}/range/{multiplier}/{timespan}/{start_date}/{end_date}"
-        
-        params = {
-            "apiKey": POLYGON_API_KEY,
-            "limit": limit,
-            "adjusted": "true",
-            "sort": "asc"
-        }
-        
-        resp = requests.get(url, params=params, timeout=10)
+        results = get_stored_aggs(contract_symbol, timespan, multiplier, start_date, end_date)
+        if results is None:
+            return None
         
-        if resp.status_code == 200:
-            data = resp.json()
-            results = data.get("results", [])
+        # FALLBACK: If 1D view is empty (e.g. Pre-Market Monday), fetch previous trading day
+        if not results and days == 1:
+            # Calculate previous trading day
+            fallback_dt = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=1)
+            while fallback_dt.weekday() >= 5: # Skip weekends
+                fallback_dt -= timedelta(days=1)
             
-            # FALLBACK: If 1D view is empty (e.g. Pre-Market Monday), fetch previous trading day
-            if not results and days == 1:
-                # Calculate previous trading day
-                fallback_dt = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=1)
-                while fallback_dt.weekday() >= 5: # Skip weekends
-                    fallback_dt -= timedelta(days=1)
-                
-                fallback_date = fallback_dt.strftime("%Y-%m-%d")
-                print(f"⚠️ 1D Empty ({start_date}). Fallback to previous day: {fallback_date}")
-                
-                # Retry fetch with same params but new date range
-                url_fallback = f"https://api.polygon.io/v2/aggs/ticker/{contract_symbol}/range/{multiplier}/{timespan}/{fallback_date}/{fallback_date}"
-                resp_fallback = requests.get(url_fallback, params=params, timeout=10)
-                
-                if resp_fallback.status_code == 200:
-                    results = resp_fallback.json().get("results", [])
+            fallback_date = fallback_dt.strftime("%Y-%m-%d")
+            print(f"⚠️ 1D Empty ({start_date}). Fallback to previous day: {fallback_date}")
+            results = get_stored_aggs(contract_symbol, timespan, multiplier, fallback_date, fallback_date) or []
 
-            return results
-        else:
-            print(f"Polygon Aggs Error ({contract_symbol}): {resp.status_code}")
-            return None
+        return results[:limit]
             
     except Exception as e:
         print(f"Polygon Aggs Fetch Failed ({contract_symbol}): {e}")
@@ -929,7 +1215,7 @@ def get_flow_contracts():
         MAX_PAGES = 5
         
         while url and page_count < MAX_PAGES:
-            resp = requests.get(url, params=params, timeout=15)
+            resp = http_get(url, params=params, timeout=15)
             if resp.status_code != 200:
                 print(f"Reference API Error: {resp.status_code} - {resp.text[:200]}")
                 break
@@ -1000,7 +1286,7 @@ def get_flow_snapshot(contract_symbol):
             "apiKey": POLYGON_API_KEY
         }
         
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_get(url, params=params, timeout=10)
         if resp.status_code == 200:
             data = resp.json()
             
@@ -1042,13 +1328,12 @@ def get_whale_conviction():
             start_str = start_date.strftime("%Y-%m-%d")
             end_str = trade_date.strftime("%Y-%m-%d")
             
-            aggs_url = f"https://api.polygon.io/v2/aggs/ticker/{ticker}/range/1/day/{start_str}/{end_str}"
-            aggs_resp = requests.get(aggs_url, params={"apiKey": POLYGON_API_KEY}, timeout=5)
+            # Daily bars from BAR_STORE (past days are local after the first load)
+            aggs = get_stored_aggs(ticker, "day", 1, start_str, end_str)
             
             print(f"DEBUG: Fetching 5-day history for {ticker}")
             
-            if aggs_resp.status_code == 200:
-                aggs = aggs_resp.json().get('results', [])
+            if aggs is not None:
                 for bar in aggs:
                     bar_date = datetime.fromtimestamp(bar['t']/1000).date()
                     history_data.append({
@@ -1135,34 +1420,24 @@ def get_vol_oi_history(contract_symbol):
         else:
              lookback_days = max(18, display_days * 3)
 
-        # Fetch Aggregates from Massive API (or fallback to Polygon if needed, but let's try Massive direct for options)
+        start_date_obj = datetime.now() - timedelta(days=lookback_days)
+        # Keep trading days
+        if lookback_days > 5:
+            start_date_obj = start_date_obj - timedelta(days=(lookback_days // 5) * 2)
+        start_str = start_date_obj.strftime("%Y-%m-%d")
+
+        # Aggregates from BAR_STORE (local partitions, Polygon only for missing days / today's new bars)
         history_data = []
-        if MASSIVE_API_KEY:
+        aggs = get_stored_aggs(formatted_contract, timespan, multiplier, start_str, datetime.now().strftime("%Y-%m-%d"))
+        
+        if aggs is None and MASSIVE_API_KEY:
+            # Fallback: Massive Options Aggs Endpoint (interval is combined, e.g. "5minute", "1day")
             try:
-                # Massive Options Aggs Endpoint: /v3/historical/options/{ticker}?interval={multiplier}{timespan}&start={start}&limit=5000
-                m_timespan = timespan
-                if m_timespan == 'minute': m_timespan = 'minute'
-                elif m_timespan == 'hour': m_timespan = 'hour'
-                elif m_timespan == 'day': m_timespan = 'day'
-                
-                # For options, Massive expects the OCC symbol format but without the exact O: prefix sometimes, or with it.
-                # Documentation says it's standard ticker format.
                 clean_sym = formatted_contract.replace("O:", "")
-                
-                start_date_obj = datetime.now() - timedelta(days=lookback_days)
-                # Keep trading days
-                if lookback_days > 5:
-                    start_date_obj = start_date_obj - timedelta(days=(lookback_days // 5) * 2)
-                    
-                start_str = start_date_obj.strftime("%Y-%m-%d")
-
-                # Note: Massive API docs say `interval` is combined (e.g. "5minute", "1day")
-                interval_str = f"{multiplier}{m_timespan}"
-                
                 massive_url = f"https://api.massive.com/v3/historical/options/{clean_sym}"
                 params = {
                     "apiKey": MASSIVE_API_KEY,
-                    "interval": interval_str,
+                    "interval": f"{multiplier}{timespan}",
                     "start": start_str,
                     "limit": 5000,
                     "sort": "asc"
@@ -1170,106 +1445,46 @@ def get_vol_oi_history(contract_symbol):
                 
                 print(f"DEBUG: Fetching Massive Aggs: {massive_url} | {params}")
                 
-                m_resp = requests.get(massive_url, params=params, timeout=10)
+                m_resp = http_get(massive_url, params=params, timeout=10)
                 if m_resp.status_code == 200:
-                    m_data = m_resp.json()
-                    aggs = m_data.get("results", [])
+                    aggs = m_resp.json().get("results", [])
                     print(f"DEBUG: Massive Aggs returned {len(aggs)} bars for {clean_sym}")
-                    
-                    for bar in aggs:
-                        # Massive timestamps are usually in milliseconds
-                        ts_ms = bar.get('t', 0)
-                        if ts_ms == 0: continue
-                            
-                        # Handle potential seconds vs milliseconds
-                        if ts_ms < 1e11:
-                            ts_ms *= 1000
-                            
-                        bar_datetime = datetime.fromtimestamp(ts_ms/1000)
-                        if bar_datetime.weekday() >= 5: continue
-                        
-                        # PRE-MARKET FILTER
-                        if bar_datetime.date() == datetime.now().date() and bar_datetime.hour < 4:
-                            continue
-
-                        # Massive keys: o, h, l, c, v, vw, n
-                        history_data.append({
-                            "date": bar_datetime.strftime("%Y-%m-%d"),
-                            "timestamp": ts_ms,
-                            "volume": int(bar.get('volume', bar.get('v', 0))),
-                            "oi": 0,
-                            "vol_oi_ratio": 0,
-                            "price": float(bar.get('close', bar.get('c', 0))),
-                            "vwap": float(bar.get('vwap', bar.get('vw', 0))),
-                            "open": float(bar.get('open', bar.get('o', 0))),
-                            "high": float(bar.get('high', bar.get('h', 0))),
-                            "low": float(bar.get('low', bar.get('l', 0))),
-                            "iv": None,
-                            "transactions": int(bar.get('transactions', bar.get('n', 0)))
-                        })
                 else:
                     print(f"DEBUG: Massive Aggs Error: {m_resp.status_code} - {m_resp.text}")
-                    # Fallback to polygon if massive fails
-                    aggs = fetch_polygon_historical_aggs(
-                        formatted_contract, 
-                        timespan=timespan, 
-                        multiplier=multiplier, 
-                        days=lookback_days
-                    )
-                    if aggs:
-                        for bar in aggs:
-                            bar_datetime = datetime.fromtimestamp(bar['t']/1000)
-                            if bar_datetime.weekday() >= 5: continue
-                            
-                            if bar_datetime.date() == datetime.now().date() and bar_datetime.hour < 4:
-                                continue
-
-                            history_data.append({
-                                "date": bar_datetime.strftime("%Y-%m-%d"),
-                                "timestamp": bar['t'],  
-                                "volume": int(bar.get('v', 0)),
-                                "oi": 0,
-                                "vol_oi_ratio": 0,
-                                "price": bar.get('c', 0),
-                                "vwap": bar.get('vw', 0),
-                                "open": bar.get('o', 0),
-                                "high": bar.get('h', 0),
-                                "low": bar.get('l', 0),
-                                "iv": None,
-                                "transactions": int(bar.get('n', 0))
-                            })
             except Exception as e:
                 print(f"DEBUG: Massive Aggs Exception: {e}")
-        else:
-             # Legacy Polygon Fallback
-            aggs = fetch_polygon_historical_aggs(
-                formatted_contract, 
-                timespan=timespan, 
-                multiplier=multiplier, 
-                days=lookback_days
-            )
-            if aggs:
-                for bar in aggs:
-                    bar_datetime = datetime.fromtimestamp(bar['t']/1000)
-                    if bar_datetime.weekday() >= 5: continue
-                    
-                    if bar_datetime.date() == datetime.now().date() and bar_datetime.hour < 4:
-                        continue
+        
+        for bar in aggs or []:
+            # Timestamps are usually in milliseconds
+            ts_ms = bar.get('t', 0)
+            if ts_ms == 0: continue
+                
+            # Handle potential seconds vs milliseconds
+            if ts_ms < 1e11:
+                ts_ms *= 1000
+                
+            bar_datetime = datetime.fromtimestamp(ts_ms/1000)
+            if bar_datetime.weekday() >= 5: continue
+            
+            # PRE-MARKET FILTER
+            if bar_datetime.date() == datetime.now().date() and bar_datetime.hour < 4:
+                continue
 
-                    history_data.append({
-                        "date": bar_datetime.strftime("%Y-%m-%d"),
-                        "timestamp": bar['t'],  
-                        "volume": int(bar.get('v', 0)),
-                        "oi": 0,
-                        "vol_oi_ratio": 0,
-                        "price": bar.get('c', 0),
-                        "vwap": bar.get('vw', 0),
-                        "open": bar.get('o', 0),
-                        "high": bar.get('h', 0),
-                        "low": bar.get('l', 0),
-                        "iv": None,
-                        "transactions": int(bar.get('n', 0))
-                    })
+            # Keys: o, h, l, c, v, vw, n (Massive may spell them out)
+            history_data.append({
+                "date": bar_datetime.strftime("%Y-%m-%d"),
+                "timestamp": ts_ms,
+                "volume": int(bar.get('volume', bar.get('v', 0))),
+                "oi": 0,
+                "vol_oi_ratio": 0,
+                "price": float(bar.get('close', bar.get('c', 0))),
+                "vwap": float(bar.get('vwap', bar.get('vw', 0))),
+                "open": float(bar.get('open', bar.get('o', 0))),
+                "high": float(bar.get('high', bar.get('h', 0))),
+                "low": float(bar.get('low', bar.get('l', 0))),
+                "iv": None,
+                "transactions": int(bar.get('transactions', bar.get('n', 0)))
+            })
 
         
         # 2. Get current snapshot for today's OI
@@ -1278,7 +1493,7 @@ def get_vol_oi_history(contract_symbol):
         try:
             snap_url = f"https://api.polygon.io/v3/snapshot/options/{underlying}/{formatted_contract}"
             snap_params = {"apiKey": POLYGON_API_KEY}
-            snap_resp = requests.get(snap_url, params=snap_params, timeout=5)
+            snap_resp = http_get(snap_url, params=snap_params, timeout=5)
             
             if snap_resp.status_code == 200:
                 snap_data = snap_resp.json().get("results", {})
@@ -1364,12 +1579,15 @@ def get_vol_oi_history(contract_symbol):
 # Real-time trade streaming for per-contract VWAP charts
 
 import asyncio
-from collections import defaultdict
 from datetime import datetime
 
-# In-memory trade buffer for VWAP calculation
-# Structure: { contract_symbol: [ {timestamp, price, size, is_call} ] }
-VWAP_TRADE_BUFFER = defaultdict(list)
+# Rolling per-contract VWAP: 1-minute ring per watched contract, updated per trade
+# (see vwap_aggregator.py). /api/vwap starts watching a contract and seeds it from the
+# stored 1-minute bars; the Massive trade handler then feeds every trade for it.
+VWAP_AGGREGATOR = VWAPAggregator(
+    ring_minutes=960,  # 4:00 AM - 8:00 PM ET
+    max_contracts=int(os.environ.get("VWAP_MAX_CONTRACTS", "256"))
+)
 VWAP_BUCKET_SIZE_MINUTES = 5
 
 # Active WebSocket subscriptions
@@ -1378,124 +1596,46 @@ ACTIVE_WS_SUBSCRIPTIONS = set()
 # Firestore collection for lotto persistence
 LOTTO_TRADES_COLLECTION = "lotto_trades"
 
-def calculate_vwap_buckets(trades, bucket_minutes=5):
-    """
-    Aggregate trades into VWAP buckets.
-    Returns: [{ time: "HH:MM", vwap: float, call_volume: int, put_volume: int }]
-    """
-    if not trades:
-        return []
-    
-    tz_eastern = pytz.timezone('US/Eastern')
-    buckets = defaultdict(lambda: {"price_volume": 0, "total_volume": 0, "call_volume": 0, "put_volume": 0})
-    
-    for trade in trades:
-        ts = trade.get("timestamp")
-        if not ts:
-            continue
-        
-        # Parse timestamp
-        try:
-            if isinstance(ts, (int, float)):
-                dt = datetime.fromtimestamp(ts / 1000 if ts > 1e10 else ts, tz=tz_eastern)
-            else:
-                dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00")).astimezone(tz_eastern)
-        except:
-            continue
-        
-        # Calculate bucket key (round down to bucket_minutes)
-        bucket_minute = (dt.minute // bucket_minutes) * bucket_minutes
-        bucket_key = dt.replace(minute=bucket_minute, second=0, microsecond=0).strftime("%H:%M")
-        
-        price = trade.get("price", 0)
-        size = trade.get("size", 0)
-        is_call = trade.get("is_call", True)
-        
-        if price > 0 and size > 0:
-            buckets[bucket_key]["price_volume"] += price * size
-            buckets[bucket_key]["total_volume"] += size
-            if is_call:
-                buckets[bucket_key]["call_volume"] += size
-            else:
-                buckets[bucket_key]["put_volume"] += size
-    
-    # Calculate VWAP per bucket
-    result = []
-    for time_key in sorted(buckets.keys()):
-        bucket = buckets[time_key]
-        if bucket["total_volume"] > 0:
-            vwap = bucket["price_volume"] / bucket["total_volume"]
-            result.append({
-                "time": time_key,
-                "vwap": round(vwap, 4),
-                "call_volume": bucket["call_volume"],
-                "put_volume": bucket["put_volume"],
-                "total_volume": bucket["total_volume"]
-            })
-    
-    return result
-
 def add_trade_to_buffer(contract_symbol, price, size, timestamp, is_call=True):
-    """Add a trade to the in-memory buffer for VWAP calculation."""
-    global VWAP_TRADE_BUFFER
-    
-    trade = {
-        "timestamp": timestamp,
-        "price": price,
-        "size": size,
-        "is_call": is_call
-    }
-    VWAP_TRADE_BUFFER[contract_symbol].append(trade)
-    
-    # Limit buffer size per contract (keep last 1000 trades)
-    if len(VWAP_TRADE_BUFFER[contract_symbol]) > 1000:
-        VWAP_TRADE_BUFFER[contract_symbol] = VWAP_TRADE_BUFFER[contract_symbol][-1000:]
+    """Fold a trade into the contract's VWAP ring (O(1), no per-contract trade cap)."""
+    VWAP_AGGREGATOR.add(contract_symbol, price, size, timestamp, is_call)
 
 def clear_trade_buffer(contract_symbol=None):
-    """Clear trade buffer for a specific contract or all contracts."""
-    global VWAP_TRADE_BUFFER
-    if contract_symbol:
-        VWAP_TRADE_BUFFER[contract_symbol] = []
-    else:
-        VWAP_TRADE_BUFFER.clear()
+    """Clear VWAP data for a specific contract or all contracts."""
+    VWAP_AGGREGATOR.clear(contract_symbol)
 
 @app.route('/api/vwap/<path:contract>')
 def get_vwap_data(contract):
     """
     Get VWAP buckets for a specific option contract.
-    Returns aggregated 5-minute VWAP data + call/put volume bars.
+    Returns aggregated VWAP buckets (?bucket=N minutes, default 5) + call/put volume bars.
     """
     # Clean contract symbol
     clean_contract = contract.replace("O:", "")
     formatted_contract = f"O:{clean_contract}" if not contract.startswith("O:") else contract
     
-    # Get trades from buffer
-    trades = VWAP_TRADE_BUFFER.get(formatted_contract, [])
-    
-    # If no buffered trades, try to fetch historical data from Polygon aggs
-    if not trades:
-        bars = fetch_polygon_historical_aggs(formatted_contract, timespan="minute", multiplier=5)
+    try:
+        bucket_minutes = min(60, max(1, int(request.args.get('bucket', VWAP_BUCKET_SIZE_MINUTES))))
+    except ValueError:
+        bucket_minutes = VWAP_BUCKET_SIZE_MINUTES
+    
+    # Live trades for this contract stream into its ring from now on; the session so far
+    # is folded in once from the stored 1-minute bars (retried while none are available)
+    VWAP_AGGREGATOR.watch(formatted_contract)
+    if VWAP_AGGREGATOR.needs_seed(formatted_contract):
+        bars = fetch_polygon_historical_aggs(formatted_contract, timespan="minute", multiplier=1, days=1)
         if bars:
-            # Convert agg bars to trade-like format for VWAP calculation
-            is_call = "C" in formatted_contract.upper()
-            trades = [
-                {
-                    "timestamp": bar.get("t"),
-                    "price": bar.get("vw", bar.get("c", 0)),  # Use VWAP or close
-                    "size": bar.get("v", 0),
-                    "is_call": is_call
-                }
-                for bar in bars
-            ]
+            is_call = formatted_contract[-9:-8].upper() == "C"  # OCC: ...YYMMDD[C/P]STRIKE
+            VWAP_AGGREGATOR.seed(formatted_contract, bars, is_call)
     
-    # Calculate VWAP buckets
-    buckets = calculate_vwap_buckets(trades, VWAP_BUCKET_SIZE_MINUTES)
+    buckets = VWAP_AGGREGATOR.buckets(formatted_contract, bucket_minutes)
+    trade_count = VWAP_AGGREGATOR.trade_count(formatted_contract)
     
     return jsonify({
         "contract": formatted_contract,
-        "bucket_size_minutes": VWAP_BUCKET_SIZE_MINUTES,
+        "bucket_size_minutes": bucket_minutes,
         "buckets": buckets,
-        "trade_count": len(trades)
+        "trade_count": trade_count
     })
 
 
@@ -1528,7 +1668,7 @@ def get_polygon_contract_details(contract_symbol):
         url = f"https://api.polygon.io/v3/snapshot/options/{underlying}/{contract_symbol}"
         params = {"apiKey": POLYGON_API_KEY}
         
-        resp = requests.get(url, params=params, timeout=3)
+        resp = http_get(url, params=params, timeout=3)
         
         if resp.status_code == 200:
             data = resp.json()
@@ -1567,7 +1707,7 @@ def fetch_alpaca_options_snapshot(contract_symbol):
     params = {"symbols": contract_symbol}
     
     try:
-        resp = requests.get(url, headers=headers, params=params, timeout=5)
+        resp = http_get(url, headers=headers, params=params, timeout=5)
         if resp.status_code == 200:
             data = resp.json()
             snapshot = data.get("snapshots", {}).get(contract_symbol)
@@ -1616,7 +1756,7 @@ def fetch_alpaca_options_snapshot_batch(symbols_list):
             url = f"{ALPACA_DATA_URL}/snapshots"
             params = {"symbols": ",".join(chunk)}
             
-            resp = requests.get(url, headers=headers, params=params, timeout=5)
+            resp = http_get(url, headers=headers, params=params, timeout=5)
             if resp.status_code == 200:
                 data = resp.json()
                 snapshots = data.get("snapshots", {})
@@ -1639,14 +1779,16 @@ def fetch_alpaca_options_snapshot_batch(symbols_list):
     return results
 
 
-def scan_whales_polygon():
+def scan_whales_polygon(on_symbol=None):
     """
     Scan for unusual whale activity using Polygon.io API.
     Fetches options snapshots and filters by premium/volume thresholds.
     Returns list of whale trades with Delta and OI data.
+
+    Symbols are scanned concurrently (WHALE_SCAN_CONCURRENCY at a time).
+    If on_symbol is given, it is called with (symbol, whales) as each symbol
+    completes so the caller can stream results into the cache.
     """
-    global WHALE_HISTORY
-    
     if not POLYGON_API_KEY:
         print("⚠️ Polygon API key not configured")
         return []
@@ -1654,6 +1796,10 @@ def scan_whales_polygon():
     tz_eastern = pytz.timezone('US/Eastern')
     now_et = datetime.now(tz_eastern)
     
+    # New trading session -> forget yesterday's prints
+    if WHALE_DEDUPE.roll(whale_session(now_et)):
+        print("🧹 Clearing stale whale history (new trading day)")
+    
     # STRICT MARKET HOURS CHECK (9:30 AM - 4:15 PM ET)
     # We allow a small buffer (9:29) for pre-open checks if needed, but generally strict.
     # ETFs like SPY trade until 4:15 PM.
@@ -1662,169 +1808,263 @@ def scan_whales_polygon():
     
     # Allow weekend scanning if cache is empty (for development/testing)
     is_weekend = now_et.weekday() >= 5
-    is_cache_empty = len(WHALE_HISTORY) == 0
+    is_cache_empty = not CACHE.get("whales", {}).get("data")
     
     if (now_et < market_open or now_et > market_close) and not (is_weekend and is_cache_empty):
         # print("💤 Market closed - skipping whale scan")
         return []
     
-    def format_money(val):
-        if val >= 1_000_000: return f"${val/1_000_000:.1f}M"
-        if val >= 1_000: return f"${val/1_000:.0f}k"
-        return f"${val:.0f}"
-    
-    all_whales = []
-    
-    for symbol in WHALE_WATCHLIST:
-        # YIELD TO EVENT LOOP to prevent blocking heartbeats
-        time.sleep(0.2) 
+    def scan_symbol(symbol):
+        # Fetch raw Polygon data
+        data = fetch_unusual_options_polygon(symbol)
+        if not data:
+            return []
+            
+        results = data.get("results", [])
+        current_price = data.get("_current_price", 0)
+        symbol_whales = []
         
-        try:
-            # Fetch raw Polygon data
-            data = fetch_unusual_options_polygon(symbol)
-            if not data:
+        for contract in results:
+            details = contract.get("details", {})
+            day_data = contract.get("day", {})
+            greeks = contract.get("greeks", {})
+
+            # Check date for weekend logic
+            last_updated = day_data.get("last_updated", 0)
+            if last_updated:
+                polygon_time_obj = datetime.fromtimestamp(last_updated / 1_000_000_000, tz=tz_eastern)
+                is_weekend = now_et.weekday() >= 5
+                if not is_weekend and polygon_time_obj.date() != now_et.date():
+                    continue
+                if is_weekend:
+                     days_diff = (now_et.date() - polygon_time_obj.date()).days
+                     if days_diff > 3:
+                         continue
+            
+            # Extract key data
+            volume = int(day_data.get("volume", 0) or 0)
+            last_price = float(day_data.get("close", 0) or day_data.get("vwap", 0) or 0)
+            open_interest = int(contract.get("open_interest", 0) or 0)
+            
+            # Skip if no meaningful data
+            if volume == 0 or last_price == 0:
                 continue
                 
-            results = data.get("results", [])
-            current_price = data.get("_current_price", 0)
+            # Calculate premium
+            notional = volume * last_price * 100
             
-            for contract in results:
-                details = contract.get("details", {})
-                day_data = contract.get("day", {})
-                greeks = contract.get("greeks", {})
-
-                # Check date for weekend logic
-                last_updated = day_data.get("last_updated", 0)
-                if last_updated:
-                    polygon_time_obj = datetime.fromtimestamp(last_updated / 1_000_000_000, tz=tz_eastern)
-                    is_weekend = now_et.weekday() >= 5
-                    if not is_weekend and polygon_time_obj.date() != now_et.date():
-                        continue
-                    if is_weekend:
-                         days_diff = (now_et.date() - polygon_time_obj.date()).days
-                         if days_diff > 3:
-                             continue
-                
-                # Extract key data
-                volume = int(day_data.get("volume", 0) or 0)
-                last_price = float(day_data.get("close", 0) or day_data.get("vwap", 0) or 0)
-                open_interest = int(contract.get("open_interest", 0) or 0)
-                
-                # Skip if no meaningful data
-                if volume == 0 or last_price == 0:
-                    continue
-                    
-                # Calculate premium
-                notional = volume * last_price * 100
-                
-                # TIERED THRESHOLDS
-                symbol_upper = symbol.upper()
-                
-                # Tier 1: Indices/ETFs (Massive Liquidity)
-                if symbol_upper in ['SPY', 'QQQ', 'IWM', 'DIA']:
-                    min_whale_val = 1_000_000  # $1M
-                    min_vol = 1000
-                # Tier 2: Mag 7 / Mega Cap (High Liquidity)
-                elif symbol_upper in ['TSLA', 'NVDA', 'AAPL', 'MSFT', 'AMZN', 'GOOG', 'GOOGL', 'META', 'AMD']:
-                    min_whale_val = 500_000    # $500k
-                    min_vol = 500
-                # Tier 3: Mid Cap / Others (STX, PLTR, SOFI, etc.)
-                else:
-                    min_whale_val = 50_000    # $50k
-                    min_vol = 100
+            # TIERED THRESHOLDS
+            symbol_upper = symbol.upper()
+            
+            # Tier 1: Indices/ETFs (Massive Liquidity)
+            if symbol_upper in ['SPY', 'QQQ', 'IWM', 'DIA']:
+                min_whale_val = 1_000_000  # $1M
+                min_vol = 1000
+            # Tier 2: Mag 7 / Mega Cap (High Liquidity)
+            elif symbol_upper in ['TSLA', 'NVDA', 'AAPL', 'MSFT', 'AMZN', 'GOOG', 'GOOGL', 'META', 'AMD']:
+                min_whale_val = 500_000    # $500k
+                min_vol = 500
+            # Tier 3: Mid Cap / Others (STX, PLTR, SOFI, etc.)
+            else:
+                min_whale_val = 50_000    # $50k
+                min_vol = 100
 
-                # 1. PURE WHALE FILTER (Big Money)
-                is_pure_whale = (notional >= min_whale_val) and (volume >= min_vol)
-                
-                # 2. UNUSUAL ACTIVITY FILTER (High Relative Volume)
-                # Must be > 1.2x OI and have at least some premium ($20k+)
-                open_interest = int(contract.get("open_interest", 0) or 0)
-                is_unusual = False
-                if open_interest > 0:
-                    is_unusual = (volume > open_interest * 1.2) and (notional >= 20_000)
-                elif open_interest == 0 and volume >= 100:
-                     # If OI is 0, treat as unusual if volume is decent
-                     is_unusual = True
-
-                # COMBINED CHECK: Must be either a Whale OR Unusual
-                if not (is_pure_whale or is_unusual):
-                    continue
-                
-                # Extract contract details
-                strike = details.get("strike_price")
-                contract_type = details.get("contract_type", "").upper() # CALL/PUT
-                expiry = details.get("expiration_date")
-                ticker = details.get("ticker") # O:SPY...
-                
-                # Moneyness
-                if current_price > 0:
-                    price_diff_pct = abs(current_price - strike) / current_price
-                    if price_diff_pct <= 0.005:
-                        moneyness = "ATM"
-                    elif contract_type == "CALL":
-                        moneyness = "ITM" if current_price > strike else "OTM"
-                    else:
-                        moneyness = "ITM" if current_price < strike else "OTM"
-                else:
+            # 1. PURE WHALE FILTER (Big Money)
+            is_pure_whale = (notional >= min_whale_val) and (volume >= min_vol)
+            
+            # 2. UNUSUAL ACTIVITY FILTER (High Relative Volume)
+            # Must be > 1.2x OI and have at least some premium ($20k+)
+            open_interest = int(contract.get("open_interest", 0) or 0)
+            is_unusual = False
+            if open_interest > 0:
+                is_unusual = (volume > open_interest * 1.2) and (notional >= 20_000)
+            elif open_interest == 0 and volume >= 100:
+                 # If OI is 0, treat as unusual if volume is decent
+                 is_unusual = True
+
+            # COMBINED CHECK: Must be either a Whale OR Unusual
+            if not (is_pure_whale or is_unusual):
+                continue
+            
+            # Extract contract details
+            strike = details.get("strike_price")
+            contract_type = details.get("contract_type", "").upper() # CALL/PUT
+            expiry = details.get("expiration_date")
+            ticker = details.get("ticker") # O:SPY...
+            
+            # Moneyness
+            if current_price > 0:
+                price_diff_pct = abs(current_price - strike) / current_price
+                if price_diff_pct <= 0.005:
                     moneyness = "ATM"
-                
-                # Delta
-                greeks = contract.get("greeks") or {}
-                delta = float(greeks.get("delta", 0) or 0)
-                
+                elif contract_type == "CALL":
+                    moneyness = "ITM" if current_price > strike else "OTM"
+                else:
+                    moneyness = "ITM" if current_price < strike else "OTM"
+            else:
+                moneyness = "ATM"
+            
+            # Delta
+            greeks = contract.get("greeks") or {}
+            delta = float(greeks.get("delta", 0) or 0)
+            
 
 
-                # Deduplication (Polygon doesn't give trade IDs easily in snapshot, use ticker+vol+time approx)
-                # Actually, for snapshot, we might just use ticker + volume as a rough ID for the session
-                # Or just rely on the fact that we clear cache daily.
-                # Let's use a composite ID.
-                trade_id = f"{ticker}_{volume}_{last_price}"
-                if trade_id in WHALE_HISTORY:
-                    continue
-                
-                # MEMORY SAFEGUARD: Limit history size
-                if len(WHALE_HISTORY) > 10000:
-                    # Clear oldest 2000 entries to prevent OOM
-                    # Sort by timestamp (value)
-                    sorted_history = sorted(WHALE_HISTORY.items(), key=lambda x: x[1])
-                    for k, v in sorted_history[:2000]:
-                        del WHALE_HISTORY[k]
-                    print(f"🧹 Pruned WHALE_HISTORY (Size: {len(WHALE_HISTORY)})")
-                    
-                WHALE_HISTORY[trade_id] = time.time()
-                
-                whale_data = {
-                    "baseSymbol": symbol,
-                    "symbol": ticker,
-                    "strikePrice": strike,
-                    "expirationDate": expiry,
-                    "putCall": "C" if contract_type == "CALL" else "P",
-                    "openInterest": open_interest,
-                    "lastPrice": last_price,
-                    "tradeTime": now_et.strftime("%H:%M:%S"), # Snapshot doesn't give trade time, use current
-                    "timestamp": time.time(),
-                    "premium": format_money(notional),
-                    "volume": volume,
-                    "notional_value": notional,
-                    "delta": delta,
-                    "side": "BUY" if delta > 0 else "SELL", # Rough approx for Polygon snapshot if no quote
-                    "moneyness": moneyness,
-                    "bid": 0, # Polygon snapshot doesn't give bid/ask easily in this endpoint
-                    "ask": 0,
-                    "is_mega_whale": notional >= MEGA_WHALE_THRESHOLD,
-                    "is_sweep": (delta > 0) and (notional >= min_whale_val), # Sweep if buying and meets tier threshold
-                    "source": "polygon"
-                }
-                
-                all_whales.append(whale_data)
-                
-        except Exception as e:
-            print(f"Polygon Scan Error ({symbol}): {e}")
+            # Deduplication (Polygon doesn't give trade IDs easily in snapshot, use ticker+vol+time approx)
+            # Actually, for snapshot, we might just use ticker + volume as a rough ID for the session
+            # Or just rely on the fact that we clear cache daily.
+            # Let's use a composite ID.
+            trade_id = f"{ticker}_{volume}_{last_price}"
+            # Symbols scan concurrently - add() is an atomic check+insert (oldest ids evicted past the cap)
+            if not WHALE_DEDUPE.add(trade_id):
+                continue
+            
+            whale_data = WhaleEvent(
+                base_symbol=symbol,
+                symbol=ticker,
+                strike=strike,
+                expiry=expiry,
+                put_call="C" if contract_type == "CALL" else "P",
+                open_interest=open_interest,
+                last_price=last_price,
+                trade_time=now_et.strftime("%H:%M:%S"), # Snapshot doesn't give trade time, use current
+                timestamp=time.time(),
+                volume=volume,
+                notional=notional,
+                delta=delta,
+                side="BUY" if delta > 0 else "SELL", # Rough approx for Polygon snapshot if no quote
+                moneyness=moneyness,
+                bid=0, # Polygon snapshot doesn't give bid/ask easily in this endpoint
+                ask=0,
+                is_mega_whale=notional >= MEGA_WHALE_THRESHOLD,
+                is_sweep=(delta > 0) and (notional >= min_whale_val), # Sweep if buying and meets tier threshold
+                source="polygon"
+            )
+            
+            symbol_whales.append(whale_data)
+
+        return symbol_whales
+
+    all_whales = []
+    
+    for symbol, symbol_whales, error in fan_out(WHALE_WATCHLIST, scan_symbol, WHALE_SCAN_CONCURRENCY, WHALE_SCAN_STATS):
+        if error is not None:
+            print(f"Polygon Scan Error ({symbol}): {error}")
+            continue
+        if not symbol_whales:
             continue
+        all_whales.extend(symbol_whales)
+        if on_symbol is not None:
+            try:
+                on_symbol(symbol, symbol_whales)
+            except Exception as e:
+                print(f"⚠️ Whale stream callback error ({symbol}): {e}")
             
     return all_whales
 
 
+# === WHALE FEED VERSIONING ===
+# Every whale gets a feed-wide "seq" and every change to a whale feed bumps its
+# "version"; whales that drop out are logged as [version, seq]. Clients poll
+# /api/whales?since=<version> and get only newer whales + removed seqs.
+# Versions are seeded from the clock (ms) so they keep increasing across restarts
+# and leader changes, and a cursor's date tells which trading day it was taken on.
+WHALE_FEED_REMOVED_KEEP = 500
+WHALE_FEED_SEQ = 0  # Last seq handed out by this worker
+WHALE_FEED_SEQ_LOCK = threading.Lock()
+
+def next_whale_version(count=1):
+    """Reserve count consecutive seqs; returns the first."""
+    global WHALE_FEED_SEQ
+    with WHALE_FEED_SEQ_LOCK:
+        latest = max(CACHE["whales"].get("version", 0), CACHE["whales_30dte"].get("version", 0), WHALE_FEED_SEQ)
+        first = max(latest + 1, int(time.time() * 1000))
+        WHALE_FEED_SEQ = first + count - 1
+        return first
+
+def stamp_whale_seqs(whales):
+    """Give whales without a seq the next ones (newest = highest); returns the feed version to use."""
+    unstamped = sorted((w for w in whales if "seq" not in w), key=lambda w: w.get("timestamp", 0))
+    first = next_whale_version(max(1, len(unstamped)))
+    for offset, w in enumerate(unstamped):
+        w["seq"] = first + offset
+    return first + max(1, len(unstamped)) - 1
+
+def set_whale_feed(cache_key, data, version, timestamp):
+    """Replace a whale feed (caller holds CACHE_LOCK), logging whales that dropped out."""
+    entry = CACHE[cache_key]
+    kept = {w.get("seq") for w in data}
+    removed = [[version, w["seq"]] for w in entry["data"] if "seq" in w and w["seq"] not in kept]
+    CACHE[cache_key] = {
+        "data": data,
+        "timestamp": timestamp,
+        "version": version,
+        "removed": (entry.get("removed", []) + removed)[-WHALE_FEED_REMOVED_KEEP:]
+    }
+
+def whale_feed_removed_since(entry, since):
+    """
+    Seqs removed after cursor `since`, or None if the removal log no longer
+    reaches back that far (caller sends the full feed instead).
+    """
+    removed = entry.get("removed", [])
+    if len(removed) >= WHALE_FEED_REMOVED_KEEP and removed[0][0] > since:
+        return None
+    return [seq for version, seq in removed if version > since and seq <= since]
+
+def whale_feed_json(whales):
+    """Feed records -> API dicts (persisted Firestore lottos are already dicts)."""
+    return [w.to_feed() if isinstance(w, WhaleEvent) else w for w in whales]
+
+# Bitset index per whale feed (see whale_index.py), rebuilt when the CACHE entry is
+# replaced - a scan merge on the leader, a shared cache sync on followers
+WHALE_INDEXES = {}  # {cache_key: WhaleIndex}
+
+def whale_index(cache_key="whales"):
+    entry = CACHE[cache_key]
+    index = WHALE_INDEXES.get(cache_key)
+    if index is None or index.source is not entry:
+        index = WhaleIndex(entry["data"], pytz.timezone('US/Eastern'), source=entry)
+        WHALE_INDEXES[cache_key] = index
+    return index
+
+
+def merge_new_whales(new_whales):
+    """
+    Merge freshly scanned whales into CACHE["whales"] / CACHE["whales_30dte"].
+    Newest first, 30 DTE filter applied, feed capped at 50 / 200.
+    """
+    if not new_whales:
+        return
+    
+    # UPDATE CACHE (Atomic)
+    with CACHE_LOCK:
+        current_data = CACHE["whales"]["data"]
+        updated_data = current_data + new_whales
+        updated_data.sort(key=lambda x: x['timestamp'], reverse=True)
+        
+        # Apply 30 DTE Filter Globally
+        tz_eastern = pytz.timezone('US/Eastern')
+        now_et = datetime.now(tz_eastern)
+        filtered_whales = []
+        for w in updated_data:
+            try:
+                expiry = w.get("expirationDate")
+                if expiry:
+                    expiry_date = datetime.strptime(expiry, "%Y-%m-%d").date()
+                    days_to_expiry = (expiry_date - now_et.date()).days
+                    if days_to_expiry <= 30:
+                        filtered_whales.append(w)
+            except:
+                pass
+        
+        version = stamp_whale_seqs(new_whales)
+        set_whale_feed("whales", filtered_whales[:50], version, time.time())
+        
+        # Update 30 DTE Cache (Same data)
+        set_whale_feed("whales_30dte", filtered_whales[:200], version, time.time())
+
+
 def scan_single_whale_polygon(symbol):
     """
     Fetch unusual options activity for a single ticker using Polygon.io.
@@ -1832,21 +2072,14 @@ def scan_single_whale_polygon(symbol):
     """
     print(f"🐢 Scanning {symbol}...", end="\r")
     
-    global CACHE, WHALE_HISTORY
+    global CACHE
     
     tz_eastern = pytz.timezone('US/Eastern')
     now_et = datetime.now(tz_eastern)
     
-    def format_money(val):
-        if val >= 1_000_000: return f"${val/1_000_000:.1f}M"
-        if val >= 1_000: return f"${val/1_000:.0f}k"
-        return f"${val:.0f}"
-    
     # Check for daily reset (if server runs overnight)
-    global WHALE_CACHE_LAST_CLEAR
-    if should_clear_whale_cache(WHALE_CACHE_LAST_CLEAR):
+    if WHALE_DEDUPE.roll(whale_session(now_et)):
         print("🧹 Clearing stale whale history (new trading day)")
-        WHALE_HISTORY.clear()
         mark_whale_cache_cleared()
     
     new_whales = []
@@ -1854,7 +2087,7 @@ def scan_single_whale_polygon(symbol):
     try:
         polygon_data = fetch_unusual_options_polygon(symbol)
         
-        if not polygon_data or not polygon_data.get("results"):
+        if not polygon_data:
             # print(f"Polygon: No data for {symbol}, skipping")
             return []
         
@@ -1963,35 +2196,34 @@ def scan_single_whale_polygon(symbol):
             # Volume tracking (same as yfinance version)
             contract_id = ticker_symbol
             current_vol = volume
-            last_vol = WHALE_HISTORY.get(contract_id, 0)
+            last_vol = WHALE_DEDUPE.last_volume(contract_id)
             delta = current_vol - last_vol
             
-            whale_data = {
-                "baseSymbol": symbol,
-                "symbol": ticker_symbol,
-                "strikePrice": strike,
-                "expirationDate": expiry,
-                "putCall": 'C' if is_call else 'P',
-                "openInterest": open_interest,
-                "lastPrice": last_price,
-                "tradeTime": trade_time_str,
-                "timestamp": timestamp_val,
-                "vol_oi": round(vol_oi_ratio, 1),
-                "premium": format_money(notional),
-                "notional_value": notional,
-                "moneyness": moneyness,
+            whale_data = WhaleEvent(
+                base_symbol=symbol,
+                symbol=ticker_symbol,
+                strike=strike,
+                expiry=expiry,
+                put_call='C' if is_call else 'P',
+                open_interest=open_interest,
+                last_price=last_price,
+                trade_time=trade_time_str,
+                timestamp=timestamp_val,
+                vol_oi=round(vol_oi_ratio, 1),
+                notional=notional,
+                moneyness=moneyness,
                 # MEGA threshold: $12M for TSLA, $5M for all others
-                "is_mega_whale": notional > (12_000_000 if symbol.upper() == 'TSLA' else 5_000_000),
-                "delta": round(delta_val, 2),
-                "is_lotto": abs(delta_val) < 0.20, # Lotto Logic
-                "iv": round(iv_val, 2),
-                "source": "polygon",
-                "volume": current_vol
+                is_mega_whale=notional > (12_000_000 if symbol.upper() == 'TSLA' else 5_000_000),
+                delta=round(delta_val, 2),
+                is_lotto=abs(delta_val) < 0.20, # Lotto Logic
+                iv=round(iv_val, 2),
+                source="polygon",
+                volume=current_vol
                 # Missing: side, bid, ask (will be filled by worker)
-            }
+            )
             
             if last_vol == 0 or delta >= VOLUME_THRESHOLD:
-                WHALE_HISTORY[contract_id] = current_vol
+                WHALE_DEDUPE.set_volume(contract_id, current_vol)
                 new_whales.append(whale_data)
         
         return new_whales
@@ -2039,7 +2271,7 @@ def fetch_options_chain_marketdata(symbol, expiry=None, dte=None, strike_limit=N
             params["minVolume"] = min_volume
             
         MARKETDATA_LAST_REQUEST = time.time()
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+        resp = http_get(url, headers=headers, params=params, timeout=10)
         
         # Accept any 2xx status (MarketData.app returns 203 for cached/trial data)
         if 200 <= resp.status_code < 300:
@@ -2059,8 +2291,12 @@ def fetch_options_chain_marketdata(symbol, expiry=None, dte=None, strike_limit=N
         print(f"MarketData.app Fetch Failed ({symbol}): {e}")
         return None
 
-# Track last reported volume to simulate "stream" feel
-WHALE_HISTORY = {} 
+# Seen whale prints + last reported volumes (to simulate "stream" feel) for the
+# current trading session; snapshotted next to the whale cache so restarts resume it
+WHALE_DEDUPE = DedupeStore(
+    os.environ.get("WHALE_DEDUPE_FILE", "/tmp/pigmentos_whale_dedupe.json"),
+    max_entries=int(os.environ.get("WHALE_DEDUPE_MAX_ENTRIES", "10000"))
+)
 VOLUME_THRESHOLD = 100 # Only show update if volume increases by this much
 
 def refresh_single_whale(symbol):
@@ -2076,6 +2312,90 @@ def refresh_single_whale(symbol):
 WS_STARTED = False
 WS_LOCK = threading.Lock()
 
+# NBBO book fed by the Massive quotes socket (side classification without REST)
+NBBO_BOOK = NBBOBook()
+QUOTES_WS_STARTED = False
+QUOTES_WS_LOCK = threading.Lock()
+# Contracts to stream quotes for ("*" = whole options market)
+MASSIVE_QUOTES_TICKER = os.environ.get("MASSIVE_QUOTES_TICKER", "*")
+
+def start_massive_quotes_websocket():
+    """Start the Massive quotes (Q) WebSocket that keeps NBBO_BOOK current"""
+    global QUOTES_WS_STARTED
+    if not MASSIVE_API_KEY:
+        return
+    
+    with QUOTES_WS_LOCK:
+        if QUOTES_WS_STARTED:
+            return
+        QUOTES_WS_STARTED = True
+    
+    def run_ws():
+        url = f"wss://api.massive.com/options/Q?apiKey={MASSIVE_API_KEY}&ticker={MASSIVE_QUOTES_TICKER}"
+        
+        def on_message(ws, message):
+            # Socket thread only enqueues - decode + book update happen on the ingest worker
+            QUOTE_INGEST.put(message)
+
+        def on_error(ws, error):
+            print(f"❌ Massive Quotes WS Error: {error}")
+
+        def on_close(ws, close_status_code, close_msg):
+            global QUOTES_WS_STARTED
+            print(f"🔌 Massive Quotes WS Closed: {close_status_code} - {close_msg}")
+            NBBO_BOOK.set_connected(False)
+            with QUOTES_WS_LOCK:
+                QUOTES_WS_STARTED = False
+            # Reconnect after delay
+            time.sleep(10)
+            start_massive_quotes_websocket()
+
+        def on_open(ws):
+            print("🚀 Massive Quotes WS Connection Opened")
+            NBBO_BOOK.set_connected(True)
+
+        QUOTE_INGEST.start()
+        print(f"📡 Connecting to Massive WS for option quotes ({MASSIVE_QUOTES_TICKER})...")
+        ws = websocket.WebSocketApp(url,
+                                    on_open=on_open,
+                                    on_message=on_message,
+                                    on_error=on_error,
+                                    on_close=on_close)
+        
+        import ssl
+        ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+    
+    t = threading.Thread(target=run_ws, daemon=True)
+    t.start()
+
+def fetch_quote_rest(symbol):
+    """
+    REST fallback for contracts with no NBBO_BOOK entry yet.
+    Returns (bid, ask) - (0, 0) on a non-OK reply or if Massive has no quote (the trade
+    stays NEUTRAL) - or None if the request raised (the trade is labeled MID).
+    Seeds the book so the next trade on this contract is a local hit.
+    """
+    try:
+        quote_url = f"https://api.massive.com/v3/quotes/{symbol}"
+        quote_resp = http_get(quote_url, params={"apiKey": MASSIVE_API_KEY, "limit": 1}, timeout=2, retry=False)
+        NBBO_BOOK.record_fallback(quote_resp.ok)
+        if not quote_resp.ok:
+            return 0, 0
+        quotes = quote_resp.json().get("results", [])
+        if not quotes:
+            return 0, 0
+        latest = quotes[-1]
+        # Massive API uses: bid_price, ask_price
+        bid = float(latest.get("bid_price", 0) or 0)
+        ask = float(latest.get("ask_price", 0) or 0)
+        ts_ns = int(latest.get("sip_timestamp", 0) or 0)
+        if NBBO_BOOK.connected and symbol not in NBBO_BOOK.quotes:
+            NBBO_BOOK.update(symbol, bid, ask, ts_ns // 1_000_000)
+        return bid, ask
+    except Exception:
+        NBBO_BOOK.record_fallback(False)
+        return None
+
 def start_massive_websocket():
     """Start the Massive WebSocket client in a separate thread"""
     global WS_STARTED
@@ -2083,6 +2403,9 @@ def start_massive_websocket():
         print("⚠️ No MASSIVE_API_KEY for WebSocket")
         return
     
+    # Quotes feed runs alongside trades so the NBBO book is warm
+    start_massive_quotes_websocket()
+    
     with WS_LOCK:
         if WS_STARTED:
             print("⚠️ Massive WS Client already started, skipping.")
@@ -2094,15 +2417,8 @@ def start_massive_websocket():
         url = f"wss://api.massive.com/options/T?apiKey={MASSIVE_API_KEY}&ticker=*"
         
         def on_message(ws, message):
-            try:
-                data = json.loads(message)
-                # Handle batch or single message
-                if isinstance(data, list):
-                    handle_massive_ws_msg(data)
-                else:
-                    handle_massive_ws_msg([data])
-            except Exception as e:
-                print(f"❌ Massive WS Parse Error: {e} | Msg: {message[:100]}...")
+            # Socket thread only enqueues - parse/filter/enrich happen on TRADE_INGEST workers
+            TRADE_INGEST.put(message)
 
         def on_error(ws, error):
             print(f"❌ Massive WS Error: {error}")
@@ -2119,6 +2435,7 @@ def start_massive_websocket():
         def on_open(ws):
             print("🚀 Massive WS Connection Opened")
 
+        TRADE_INGEST.start()
         print(f"📡 Connecting to Massive WS for all option trades...")
         
         # Disable SSL verification for compatibility with local environments
@@ -2134,10 +2451,13 @@ def start_massive_websocket():
     t = threading.Thread(target=run_ws, daemon=True)
     t.start()
 
+def _is_call_symbol(symbol):
+    """O:NVDA230616C00400000 -> True (type char sits 9 from the end: C/P + 8-digit strike)."""
+    return len(symbol) > 9 and symbol[-9] == "C"
+
 def handle_massive_ws_msg(msgs):
     """Callback for Massive WebSocket messages (Trades)"""
     global SWEEP_CACHE
-    tz_eastern = pytz.timezone('US/Eastern')
     
     for msg in msgs:
         try:
@@ -2154,6 +2474,10 @@ def handle_massive_ws_msg(msgs):
 
             if not symbol or price <= 0 or size <= 0: continue
 
+            # Contracts with an open VWAP chart get every trade, before the whale filters
+            if symbol in VWAP_AGGREGATOR:
+                add_trade_to_buffer(symbol, price, size, ts_ms, is_call=_is_call_symbol(symbol))
+
             premium = price * size * 100
             
             # Filter Noise (min $50k)
@@ -2184,54 +2508,22 @@ def handle_massive_ws_msg(msgs):
             
             # Timestamp (Massive is MS, convert to Sec)
             ts_sec = ts_ms / 1000.0
-            trade_dt = datetime.fromtimestamp(ts_sec, tz_eastern)
-            time_str = trade_dt.strftime('%H:%M:%S')
 
             # Detect Conditions (Sweeps) - Massive ID mapping (233, 30 usually sweep)
             is_sweep = conditions and (233 in conditions or 30 in conditions)
             is_block = size >= 500
             
-            # BID/ASK side logic using Massive Quotes API
+            # BID/ASK side logic: local NBBO book first, REST only on a miss
             bid, ask = 0, 0
             side = "NEUTRAL"
             
-            try:
-                # Fetch latest quote from Massive API for accurate side detection
-                quote_url = f"https://api.massive.com/v3/quotes/{symbol}"
-                quote_resp = requests.get(quote_url, params={"apiKey": MASSIVE_API_KEY, "limit": 1}, timeout=2)
-                
-                if quote_resp.ok:
-                    quote_data = quote_resp.json()
-                    quotes = quote_data.get("results", [])
-                    if quotes:
-                        latest = quotes[-1]
-                        # Massive API uses: bid_price, ask_price
-                        bid = float(latest.get("bid_price", 0) or 0)
-                        ask = float(latest.get("ask_price", 0) or 0)
-                        
-                        # Determine side based on where trade price falls vs bid/ask
-                        # Industry-standard logic matching Unusual Whales / Cheddar Flow
-                        if bid > 0 and ask > 0:
-                            spread = ask - bid
-                            TOLERANCE = 0.02  # 2 cent tolerance for edge cases
-                            
-                            if price >= ask - TOLERANCE:
-                                side = "BUY"  # At/above ask = aggressive buyer
-                            elif price <= bid + TOLERANCE:
-                                side = "SELL"  # At/below bid = aggressive seller
-                            else:
-                                # Calculate position in spread (0% = bid, 100% = ask)
-                                if spread > 0:
-                                    position_pct = (price - bid) / spread * 100
-                                    if position_pct >= 75:
-                                        side = "BUY"  # Upper quarter = leaning buyer
-                                    elif position_pct <= 25:
-                                        side = "SELL"  # Lower quarter = leaning seller
-                                    else:
-                                        side = "MID"  # Middle 50% = ambiguous
-                                else:
-                                    side = "MID"
-            except:
+            quote = NBBO_BOOK.lookup(symbol)
+            if quote is None:
+                quote = fetch_quote_rest(symbol)
+            if quote is not None:
+                bid, ask = quote[0], quote[1]
+                side = classify_trade_side(price, bid, ask)
+            else:
                 # Fallback: can't determine side without quote
                 side = "MID"
             
@@ -2240,27 +2532,24 @@ def handle_massive_ws_msg(msgs):
             if is_block: tags.append("BLOCK")
             if premium >= 1000000: tags.append("WHALE")
 
-            data = {
-                "ticker": ticker_name, 
-                "symbol": symbol,
-                "strike": strike,
-                "type": option_type,
-                "expiry": expiry_date,
-                "premium": f"${premium:,.0f}",
-                "size": size,
-                "price": price,
-                "timestamp": ts_sec,
-                "timeStr": time_str,
-                "side": side,
-                "bid": bid,
-                "ask": ask,
-                "spot": 0,
-                "details": f"{' '.join(tags)}", 
-                "tags": tags,
-                "is_sweep": is_sweep,
-                "is_block": is_block,
-                "exchange": exchange
-            }
+            data = SweepEvent(
+                ticker=ticker_name,
+                symbol=symbol,
+                strike=strike,
+                option_type=option_type,
+                expiry=expiry_date,
+                premium=premium,
+                size=size,
+                price=price,
+                timestamp=ts_sec,
+                side=side,
+                bid=bid,
+                ask=ask,
+                exchange=exchange,
+                is_sweep=is_sweep,
+                is_block=is_block,
+                tags=tags
+            )
             
             with SWEEP_LOCK:
                 SWEEP_CACHE.appendleft(data)
@@ -2268,17 +2557,32 @@ def handle_massive_ws_msg(msgs):
                 while len(SWEEP_CACHE) > 200:
                     SWEEP_CACHE.pop()
                     
-            # print(f"🌊 Massive Rx: {ticker_name} {strike}{type_char} {premium:,.0f} | {time_str}")
+            # print(f"🌊 Massive Rx: {ticker_name} {strike}{type_char} {premium:,.0f} | {data.time_str()}")
 
         except Exception as e:
             print(f"❌ Massive Row Parse Error: {e} | Msg: {msg}")
         
+# Socket -> ring buffer -> worker pool (trades can run in parallel, quotes must stay ordered)
+TRADE_INGEST = IngestQueue(
+    "massive_trades", handle_massive_ws_msg,
+    maxlen=int(os.environ.get("WS_TRADE_QUEUE_SIZE", "50000")),
+    workers=int(os.environ.get("WS_INGEST_WORKERS", "4"))
+)
+QUOTE_INGEST = IngestQueue(
+    "massive_quotes", NBBO_BOOK.ingest,
+    maxlen=int(os.environ.get("WS_QUOTE_QUEUE_SIZE", "200000")),
+    workers=1, batch_size=1000
+)
+
+# Raw per-message logging (very noisy at firehose volume)
+WS_DEBUG = os.environ.get("WS_DEBUG") == "1"
+
 # --- POLYGON WEBSOCKET WORKER ---
 def handle_polygon_ws_msg(msgs):
     """Callback for Polygon WebSocket messages (Trades)"""
-    print(f"DEBUG: WS Raw Rx: {type(msgs)} | Content: {msgs}")
+    if WS_DEBUG:
+        print(f"DEBUG: WS Raw Rx: {type(msgs)} | Content: {msgs}")
     global SWEEP_CACHE
-    tz_eastern = pytz.timezone('US/Eastern')
     
     for msg in msgs:
         try:
@@ -2302,7 +2606,8 @@ def handle_polygon_ws_msg(msgs):
                 conditions = getattr(msg, 'conditions', [])
                 exchange = getattr(msg, 'exchange', 0)
 
-            print(f"DEBUG: Trade Rx: {symbol} P:{price} S:{size}")
+            if WS_DEBUG:
+                print(f"DEBUG: Trade Rx: {symbol} P:{price} S:{size}")
             
             premium = price * size * 100
             
@@ -2336,8 +2641,6 @@ def handle_polygon_ws_msg(msgs):
             
             # Timestamp
             ts_sec = ts_ns / 1e9
-            trade_dt = datetime.fromtimestamp(ts_sec, tz_eastern)
-            time_str = trade_dt.strftime('%H:%M:%S')
             
             # Detect Conditions (Sweeps)
             is_sweep = conditions and (233 in conditions or 30 in conditions)
@@ -2359,61 +2662,44 @@ def handle_polygon_ws_msg(msgs):
             ask = 0
             side = "NEUTRAL"
             
-            try:
-                # Only enrich significant trades to save API calls/latency
-                snap_url = f"https://api.polygon.io/v3/snapshot/options/{msg.symbol}?apiKey={POLYGON_API_KEY}"
-                snap_resp = requests.get(snap_url, timeout=2)
-                if snap_resp.status_code == 200:
-                    snap_data = snap_resp.json().get("results", {})
-                    # Polygon Snapshot Quote keys: bP (bidPrice), aP (askPrice)
-                    quote = snap_data.get("quote", {}) 
-                    bid = float(quote.get("bP", 0) or 0)
-                    ask = float(quote.get("aP", 0) or 0)
-                    
-                    # Industry-standard MID logic
-                    if bid > 0 and ask > 0:
-                        spread = ask - bid
-                        TOLERANCE = 0.02
-                        
-                        if price >= ask - TOLERANCE:
-                            side = "BUY"
-                        elif price <= bid + TOLERANCE:
-                            side = "SELL"
-                        elif spread > 0:
-                            position_pct = (price - bid) / spread * 100
-                            if position_pct >= 75:
-                                side = "BUY"
-                            elif position_pct <= 25:
-                                side = "SELL"
-                            else:
-                                side = "MID"
-                        else:
-                            side = "MID"
-            except:
-                side = "MID"
+            quote = NBBO_BOOK.lookup(symbol)
+            if quote is not None:
+                bid, ask = quote[0], quote[1]
+                side = classify_trade_side(price, bid, ask)
+            else:
+                try:
+                    # Only enrich significant trades to save API calls/latency
+                    snap_url = f"https://api.polygon.io/v3/snapshot/options/{msg.symbol}?apiKey={POLYGON_API_KEY}"
+                    snap_resp = http_get(snap_url, timeout=2, retry=False)
+                    if snap_resp.status_code == 200:
+                        snap_data = snap_resp.json().get("results", {})
+                        # Polygon Snapshot Quote keys: bP (bidPrice), aP (askPrice)
+                        quote = snap_data.get("quote", {}) 
+                        bid = float(quote.get("bP", 0) or 0)
+                        ask = float(quote.get("aP", 0) or 0)
+                        side = classify_trade_side(price, bid, ask)
+                except:
+                    side = "MID"
 
             # Construct Data Object
-            data = {
-                "ticker": ticker_name, 
-                "symbol": symbol,
-                "strike": strike,
-                "type": option_type,
-                "expiry": expiry_date,
-                "premium": f"${premium:,.0f}",
-                "size": size,
-                "price": price,
-                "timestamp": ts_sec,
-                "timeStr": time_str,
-                "side": side,
-                "bid": bid,
-                "ask": ask,
-                "spot": 0,
-                "details": f"{' '.join(tags)}", 
-                "tags": tags,
-                "is_sweep": is_sweep,
-                "is_block": is_block,
-                "exchange": exchange
-            }
+            data = SweepEvent(
+                ticker=ticker_name,
+                symbol=symbol,
+                strike=strike,
+                option_type=option_type,
+                expiry=expiry_date,
+                premium=premium,
+                size=size,
+                price=price,
+                timestamp=ts_sec,
+                side=side,
+                bid=bid,
+                ask=ask,
+                exchange=exchange,
+                is_sweep=is_sweep,
+                is_block=is_block,
+                tags=tags
+            )
             
             with SWEEP_LOCK:
                 SWEEP_CACHE.append(data)
@@ -2485,7 +2771,7 @@ def fetch_daily_watchlist_activity():
         try:
             # 1. Find active contracts
             url = f"https://api.polygon.io/v3/snapshot/options/{ticker}?apiKey={POLYGON_API_KEY}&limit=50"
-            resp = requests.get(url, timeout=5)
+            resp = http_get(url, timeout=5)
             if resp.status_code != 200:
                 return []
                 
@@ -2506,7 +2792,7 @@ def fetch_daily_watchlist_activity():
                 
                 # 2. Fetch recent trades
                 t_url = f"https://api.polygon.io/v3/trades/{c_ticker}?apiKey={POLYGON_API_KEY}&limit=10&order=desc"
-                t_resp = requests.get(t_url, timeout=5)
+                t_resp = http_get(t_url, timeout=5)
                 
                 if t_resp.status_code == 200:
                     trades = t_resp.json().get("results", [])
@@ -2521,22 +2807,21 @@ def fetch_daily_watchlist_activity():
                             
                         # Enrich
                         ts_sec = ts_ns / 1e9
-                        dt = datetime.fromtimestamp(ts_sec)
                         
-                        trade_obj = {
-                            "ticker": ticker, # Show underlying ticker for readability
-                            "premium": f"${premium:,.0f}",
-                            "strike": str(strike),
-                            "expiry": expiry,
-                            "type": "CALL" if c_type == "call" else "PUT",
-                            "side": "NEUTRAL", # Hard to infer from REST without quotes
-                            "size": f"{size}",
-                            "score": 0, # Not calculated for historical
-                            "timestamp": ts_sec,
-                            "timeStr": dt.strftime('%H:%M:%S'),
-                            "is_sweep": True, # Assume significant trades are sweeps for demo
-                            "is_block": size >= 500
-                        }
+                        trade_obj = SweepEvent(
+                            ticker=ticker, # Show underlying ticker for readability
+                            symbol=c_ticker,
+                            strike=strike,
+                            option_type="CALL" if c_type == "call" else "PUT",
+                            expiry=expiry,
+                            premium=premium,
+                            size=size,
+                            price=price,
+                            timestamp=ts_sec,
+                            side="NEUTRAL", # Hard to infer from REST without quotes
+                            is_sweep=True, # Assume significant trades are sweeps for demo
+                            is_block=size >= 500
+                        )
                         ticker_trades.append(trade_obj)
             return ticker_trades
         except Exception as e:
@@ -2579,73 +2864,48 @@ def refresh_heatmap_logic():
     global CACHE
 
     
-    # Tickers mapped to their "Size" category and "Sector" for filtering
-    HEATMAP_TICKERS = {
-        # Indices
-        "SPY": {"size": "mega", "sector": "INDICES"},
-        "QQQ": {"size": "mega", "sector": "INDICES"},
-        "IWM": {"size": "large", "sector": "INDICES"},
-        "DIA": {"size": "large", "sector": "INDICES"},
-        
-        # Mag 7 (Tech)
-        "NVDA": {"size": "mega", "sector": "TECH"},
-        "AAPL": {"size": "mega", "sector": "TECH"},
-        "MSFT": {"size": "mega", "sector": "TECH"},
-        "GOOGL": {"size": "large", "sector": "TECH"},
-        "GOOG": {"size": "large", "sector": "TECH"},
-        "AMZN": {"size": "large", "sector": "CONSUMER"},
-        "META": {"size": "large", "sector": "TECH"},
-        "TSLA": {"size": "large", "sector": "CONSUMER"},
-        
-        # Others
-        "AMD": {"size": "medium", "sector": "TECH"},
-        "NFLX": {"size": "medium", "sector": "CONSUMER"},
-        "AVGO": {"size": "medium", "sector": "TECH"},
-        "PLTR": {"size": "small", "sector": "TECH"},
-        "COIN": {"size": "small", "sector": "CRYPTO"},
-        "MSTR": {"size": "small", "sector": "CRYPTO"},
-        "RIOT": {"size": "small", "sector": "CRYPTO"},
-        "BTC-USD": {"size": "mega", "sector": "CRYPTO"}
-    }
     
     try:
         heatmap_data = []
         
-        # Wrap yf.Tickers to prevent hanging
-        def fetch_tickers():
-            return yf.Tickers(" ".join(HEATMAP_TICKERS.keys()))
+        # Stocks come from the bulk snapshot (one call); yfinance only for the rest (BTC-USD)
+        quotes = {sym: (snap["price"], snap["prev_close"])
+                  for sym, snap in get_stock_snapshots(HEATMAP_TICKERS).items()}
+        missing = [sym for sym in HEATMAP_TICKERS if sym not in quotes]
         
-        tickers_obj = with_timeout(fetch_tickers, timeout_seconds=10)
-        if not tickers_obj:
-            print("⏰ Heatmap tickers fetch timed out")
-            return
+        if missing:
+            # Wrap yf.Tickers to prevent hanging
+            def fetch_tickers():
+                return yf.Tickers(" ".join(missing))
+            
+            tickers_obj = with_timeout(fetch_tickers, timeout_seconds=10)
+            if not tickers_obj:
+                print("⏰ Heatmap tickers fetch timed out")
+                if not quotes:
+                    return
+            else:
+                for symbol in missing:
+                    try:
+                        t = tickers_obj.tickers[symbol]
+                        # Use fast_info primarily for speed
+                        quotes[symbol] = (t.fast_info.last_price, t.fast_info.previous_close)
+                    except Exception as e:
+                        continue
+                    
+                    # Small jitter to be polite
+                    time.sleep(random.uniform(0.1, 0.3))
         
         for symbol, meta in HEATMAP_TICKERS.items():
-            try:
-                t = tickers_obj.tickers[symbol]
-                
-                # Try to get extended hours data from .info (slower but richer)
-                try:
-                    # Use fast_info primarily for speed
-                    price = t.fast_info.last_price
-                    prev_close = t.fast_info.previous_close
-                except:
-                    continue
-
-                if price and prev_close:
-                    change = ((price - prev_close) / prev_close) * 100
-                    heatmap_data.append({
-                        "symbol": symbol,
-                        "change": round(change, 2),
-                        "price": round(price, 2),
-                        "size": meta["size"],
-                        "sector": meta["sector"]
-                    })
-            except Exception as e:
-                continue
-            
-            # Small jitter to be polite
-            time.sleep(random.uniform(0.1, 0.3))
+            price, prev_close = quotes.get(symbol, (None, None))
+            if price and prev_close:
+                change = ((price - prev_close) / prev_close) * 100
+                heatmap_data.append({
+                    "symbol": symbol,
+                    "change": round(change, 2),
+                    "price": round(price, 2),
+                    "size": meta["size"],
+                    "sector": meta["sector"]
+                })
         
         # Update Cache
         if heatmap_data:
@@ -2714,7 +2974,7 @@ def subscription_status():
             
         id_token = auth_header.split('Bearer ')[1]
         try:
-            decoded_token = firebase_auth.verify_id_token(id_token)
+            decoded_token = VERIFIED_TOKENS.verify(id_token)
             user_email = decoded_token.get('email')
             user_uid = decoded_token.get('uid')
         except Exception as auth_error:
@@ -2739,12 +2999,11 @@ def subscription_status():
                 'is_vip': True
             })
 
-        # 3. CHECK FIRESTORE STATUS (Synced via Webhooks)
+        # 3. CHECK FIRESTORE STATUS (Synced via Webhooks, cached per user until one changes it)
         try:
-            user_ref = firestore_db.collection('users').document(user_uid)
-            # Add timeout to prevent hanging (Google Cloud defaults to infinite)
+            # fetch_user_doc has a timeout to prevent hanging (Google Cloud defaults to infinite)
             try:
-                user_doc = user_ref.get(timeout=5)
+                user_data = SUBSCRIPTIONS.get(user_uid, user_email)
             except Exception as fs_err:
                 print(f"⚠️ Firestore Timeout/Error for {user_email}: {fs_err}")
                 # Fail open or closed? Closed -> subscription required.
@@ -2754,7 +3013,7 @@ def subscription_status():
                     'reason': 'verification_timeout'
                 }), 504
             
-            if not user_doc.exists:
+            if user_data is None:
                 # New user - no subscription
                 return jsonify({
                     'status': 'none',
@@ -2762,7 +3021,6 @@ def subscription_status():
                     'reason': 'no_subscription'
                 })
             
-            user_data = user_doc.to_dict()
             sub_status = user_data.get('subscriptionStatus', 'none')
             
             # PAID ONLY: Only 'active' status grants access
@@ -2817,7 +3075,7 @@ def create_portal_session():
         else:
             id_token = auth_header.split('Bearer ')[1]
             try:
-                decoded_token = firebase_auth.verify_id_token(id_token)
+                decoded_token = VERIFIED_TOKENS.verify(id_token)
                 user_email = decoded_token.get('email')
                 user_uid = decoded_token.get('uid')
             except Exception as auth_error:
@@ -2833,9 +3091,9 @@ def create_portal_session():
         # Try Firestore first
         if firestore_db and user_uid:
             try:
-                user_doc = firestore_db.collection('users').document(user_uid).get()
-                if user_doc.exists:
-                    stripe_customer_id = user_doc.to_dict().get('stripeCustomerId')
+                user_data = SUBSCRIPTIONS.get(user_uid, user_email)
+                if user_data is not None:
+                    stripe_customer_id = user_data.get('stripeCustomerId')
             except Exception as e:
                 print(f"Firestore lookup failed: {e}")
 
@@ -2852,14 +3110,13 @@ def create_portal_session():
                 new_customer = stripe.Customer.create(email=user_email)
                 stripe_customer_id = new_customer.id
                 
-                # Save to Firestore if available
+                # Save to Firestore if available (write-behind)
                 if firestore_db and user_uid:
+                    FIRESTORE_WRITES.set('users', user_uid, {'stripeCustomerId': stripe_customer_id}, merge=True)
                     try:
-                        firestore_db.collection('users').document(user_uid).set(
-                            {'stripeCustomerId': stripe_customer_id}, merge=True
-                        )
-                    except Exception as db_err:
-                        print(f"Failed to save new customer ID to Firestore: {db_err}")
+                        SUBSCRIPTIONS.apply(user_email, {'stripeCustomerId': stripe_customer_id})
+                    except OSError as cache_err:
+                        print(f"⚠️ Subscription cache update failed for {user_email}: {cache_err}")
                         
             except Exception as stripe_err:
                  print(f"Failed to create new Stripe customer: {stripe_err}")
@@ -2880,6 +3137,20 @@ def create_portal_session():
         print(f"Portal Session Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def queue_subscription_update(customer_email, fields, defaults=None):
+    """
+    Queue the users (by email) update and publish the new fields to every worker's
+    subscription cache, so /api/subscription-status reflects the webhook right away.
+    """
+    FIRESTORE_WRITES.update_where(
+        'users', 'email', customer_email,
+        {**fields, 'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP}, defaults=defaults
+    )
+    try:
+        SUBSCRIPTIONS.apply(customer_email, fields)
+    except OSError as e:
+        print(f"⚠️ Subscription cache update failed for {customer_email}: {e}")
+
 @app.route('/api/stripe-webhook', methods=['POST'])
 def stripe_webhook():
     """Handle Stripe webhook events to update Firestore subscription status"""
@@ -2913,23 +3184,12 @@ def stripe_webhook():
         subscription_id = session.get('subscription')
         
         if customer_email and firestore_db:
-            try:
-                # Find user by email in Firestore
-                users_ref = firestore_db.collection('users')
-                query = users_ref.where('email', '==', customer_email).limit(1)
-                docs = query.stream()
-                
-                for doc in docs:
-                    # Update subscription status
-                    doc.reference.update({
-                        'subscriptionStatus': 'active',
-                        'stripeSubscriptionId': subscription_id,
-                        'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP
-                    })
-                    print(f"✅ Updated Firestore for {customer_email}: subscriptionStatus = active")
-                    break
-            except Exception as e:
-                print(f"❌ Firestore update failed: {e}")
+            # Find user by email in Firestore and update subscription status (write-behind)
+            queue_subscription_update(customer_email, {
+                'subscriptionStatus': 'active',
+                'stripeSubscriptionId': subscription_id
+            })
+            print(f"✅ Queued Firestore update for {customer_email}: subscriptionStatus = active")
         else:
             print(f"⚠️ Cannot update Firestore: email={customer_email}, db={firestore_db is not None}")
     
@@ -2943,17 +3203,10 @@ def stripe_webhook():
             customer_email = customer.get('email')
             
             if customer_email and firestore_db:
-                users_ref = firestore_db.collection('users')
-                query = users_ref.where('email', '==', customer_email).limit(1)
-                docs = query.stream()
-                
-                for doc in docs:
-                    doc.reference.update({
-                        'subscriptionStatus': 'expired',
-                        'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP
-                    })
-                    print(f"✅ Updated Firestore for {customer_email}: subscriptionStatus = expired")
-                    break
+                queue_subscription_update(customer_email, {
+                    'subscriptionStatus': 'expired'
+                })
+                print(f"✅ Queued Firestore update for {customer_email}: subscriptionStatus = expired")
         except Exception as e:
             print(f"❌ Subscription deletion handling failed: {e}")
     
@@ -2970,32 +3223,22 @@ def stripe_webhook():
                 # Map Stripe status to our status
                 firestore_status = status if status in ['active', 'trialing'] else 'expired'
                 
-                users_ref = firestore_db.collection('users')
-                query = users_ref.where('email', '==', customer_email).limit(1)
-                docs = query.stream()
+                update_data = {'subscriptionStatus': firestore_status}
                 
-                for doc in docs:
-                    update_data = {
-                        'subscriptionStatus': firestore_status,
-                        'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP
-                    }
-                    
-                    # BACKFILL TRIAL START DATE IF MISSING & TRIALING
-                    # This ensures the strict check doesn't lock out valid new trials
-                    if firestore_status == 'trialing':
-                        user_data = doc.to_dict()
-                        if not user_data.get('trialStartDate'):
-                            # Use Stripe's start date or current time
-                            trial_start_ts = subscription.get('trial_start') or subscription.get('start_date')
-                            if trial_start_ts:
-                                update_data['trialStartDate'] = datetime.fromtimestamp(trial_start_ts)
-                            else:
-                                update_data['trialStartDate'] = firestore.SERVER_TIMESTAMP
-                            print(f"⚠️ Backfilled trialStartDate for {customer_email}")
+                # BACKFILL TRIAL START DATE IF MISSING & TRIALING
+                # This ensures the strict check doesn't lock out valid new trials
+                # (defaults are only written if the user doc doesn't have them yet)
+                backfill = None
+                if firestore_status == 'trialing':
+                    # Use Stripe's start date or current time
+                    trial_start_ts = subscription.get('trial_start') or subscription.get('start_date')
+                    if trial_start_ts:
+                        backfill = {'trialStartDate': datetime.fromtimestamp(trial_start_ts)}
+                    else:
+                        backfill = {'trialStartDate': firestore.SERVER_TIMESTAMP}
 
-                    doc.reference.update(update_data)
-                    print(f"✅ Updated Firestore for {customer_email}: subscriptionStatus = {firestore_status}")
-                    break
+                queue_subscription_update(customer_email, update_data, defaults=backfill)
+                print(f"✅ Queued Firestore update for {customer_email}: subscriptionStatus = {firestore_status}")
         except Exception as e:
             print(f"❌ Subscription update handling failed: {e}")
 
@@ -3009,18 +3252,11 @@ def stripe_webhook():
             customer_email = customer.get('email')
             
             if customer_email and firestore_db:
-                users_ref = firestore_db.collection('users')
-                query = users_ref.where('email', '==', customer_email).limit(1)
-                docs = query.stream()
-                
-                for doc in docs:
-                    doc.reference.update({
-                        'subscriptionStatus': 'active',
-                        'stripeSubscriptionId': subscription_id,
-                        'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP
-                    })
-                    print(f"💰 Invoice Paid for {customer_email}: Status -> active")
-                    break
+                queue_subscription_update(customer_email, {
+                    'subscriptionStatus': 'active',
+                    'stripeSubscriptionId': subscription_id
+                })
+                print(f"💰 Invoice Paid for {customer_email}: Status -> active (queued)")
         except Exception as e:
             print(f"❌ Invoice paid handling failed: {e}")
 
@@ -3033,17 +3269,10 @@ def stripe_webhook():
             customer_email = customer.get('email')
             
             if customer_email and firestore_db:
-                users_ref = firestore_db.collection('users')
-                query = users_ref.where('email', '==', customer_email).limit(1)
-                docs = query.stream()
-                
-                for doc in docs:
-                    doc.reference.update({
-                        'subscriptionStatus': 'past_due',
-                        'subscriptionUpdatedAt': firestore.SERVER_TIMESTAMP
-                    })
-                    print(f"⚠️ Payment Failed for {customer_email}: Status -> past_due")
-                    break
+                queue_subscription_update(customer_email, {
+                    'subscriptionStatus': 'past_due'
+                })
+                print(f"⚠️ Payment Failed for {customer_email}: Status -> past_due (queued)")
         except Exception as e:
             print(f"❌ Invoice payment failed handling failed: {e}")
     
@@ -3071,9 +3300,9 @@ def api_save_whale():
         # Add saved timestamp
         trade['savedAt'] = time.time()
         
-        # Save to Firestore
-        doc_ref = firestore_db.collection('saved_whales').document(doc_id)
-        doc_ref.set(trade, merge=True)
+        # Save to Firestore (write-behind) - visible in /api/whales/saved right away
+        FIRESTORE_WRITES.set('saved_whales', doc_id, trade, merge=True)
+        SAVED_WHALES_CACHE.put(doc_id, trade)
         
         return jsonify({"success": True, "id": doc_id})
         
@@ -3091,13 +3320,10 @@ def api_get_saved_whales():
     
     try:
         start_time = time.time()
-        def fetch_saved():
-            saved_ref = firestore_db.collection('saved_whales')
-            query = saved_ref.order_by('savedAt', direction=firestore.Query.DESCENDING).limit(100)
-            return [doc.to_dict() for doc in query.stream()]
         
+        # Listener-fed local copy; only a cold / listener-less cache reads through to Firestore
         # Reduced timeout from 5s to 2s to prevent hanging
-        results = with_timeout(fetch_saved, timeout_seconds=2)
+        results = with_timeout(SAVED_WHALES_CACHE.get, timeout_seconds=2)
         
         duration = time.time() - start_time
         if duration > 1.0:
@@ -3107,7 +3333,7 @@ def api_get_saved_whales():
             print("❌ Firebase Fetch Timed Out (2s)")
             return jsonify({"data": []})
         
-        return jsonify({"data": results})
+        return jsonify({"data": results[:100]})
         
     except Exception as e:
         print(f"❌ Failed to fetch saved whales: {e}")
@@ -3128,7 +3354,8 @@ def api_delete_whale():
         if not doc_id:
             return jsonify({"error": "No trade ID provided"}), 400
         
-        firestore_db.collection('saved_whales').document(doc_id).delete()
+        FIRESTORE_WRITES.delete('saved_whales', doc_id)
+        SAVED_WHALES_CACHE.remove(doc_id)
         return jsonify({"success": True})
         
     except Exception as e:
@@ -3138,11 +3365,18 @@ def api_delete_whale():
 
 @app.route('/api/whales')
 def api_whales():
+    """
+    Whale feed. ?since=<version> (from a previous response) returns all whales
+    added after it (limit / offset don't apply) plus "removed" seqs; a cursor the server can't serve from
+    (previous trading day, trimmed removal log) gets the full feed with "reset": true.
+    Plain polls are conditional: If-None-Match with the last ETag -> 304.
+    """
     from datetime import timedelta
     global CACHE
     limit = int(request.args.get('limit', 25))
     offset = int(request.args.get('offset', 0))
     lotto_only = request.args.get('lotto') == 'true'
+    since = request.args.get('since', type=int)
     
     # Check if data has been hydrated
     if CACHE["whales"]["timestamp"] == 0:
@@ -3151,7 +3385,9 @@ def api_whales():
     # FILTER: Ensure we only show TODAY'S trades (Server-side safety)
     # The worker might be sleeping (Pre-market), holding yesterday's data.
     # We filter it here to ensure the frontend sees a clean slate.
-    raw_data = CACHE["whales"]["data"]
+    entry = CACHE["whales"]
+    index = whale_index("whales")
+    version = entry.get("version", 0)
     tz_eastern = pytz.timezone('US/Eastern')
     now_et = datetime.now(tz_eastern)
     today_date = now_et.date()
@@ -3165,25 +3401,45 @@ def api_whales():
     else:
         target_date = today_date
     
-    clean_data = []
-    for whale in raw_data:
-        # 'timestamp' is unix epoch
-        trade_dt = datetime.fromtimestamp(whale['timestamp'], tz_eastern)
-        if trade_dt.date() == target_date:
-            # Lotto Filter
-            if lotto_only:
-                if not whale.get('is_lotto', False):
-                    continue
-            clean_data.append(whale)
-            
+    # Lotto mode merges Firestore history, so it is neither versioned nor cacheable
+    etag = None
+    if not lotto_only:
+        etag = f"{version}-{target_date.isoformat()}-{since or 0}-{offset}-{limit}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+    
+    removed = None
+    try:
+        since_date = datetime.fromtimestamp(since / 1000, tz_eastern).date() if since is not None else None
+    except (ValueError, OverflowError, OSError):
+        since_date = None
+    # Versions are clock-seeded: a cursor from an earlier trading day can't be patched
+    if since_date and not lotto_only and since_date >= target_date:
+        if since >= version:
+            # Nothing newer (or this worker hasn't synced the leader's latest yet)
+            response = jsonify({"data": [], "removed": [], "since": since, "version": since,
+                                "stale": False, "timestamp": int(entry["timestamp"])})
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        removed = whale_feed_removed_since(entry, since)
+    
+    # Target day's partition, narrowed by the lotto bitset / cursor
+    mask = index.day(target_date)
+    if lotto_only:
+        mask &= index.lotto
+    if removed is not None:
+        mask &= index.newer_than(since)
+    
     # If Lotto Mode, merge with persisted history
+    clean_data = index.select(mask) if lotto_only else None
     if lotto_only and firestore_db:
         try:
-            # Fetch persisted lottos (limit 50 for speed)
-            lottos_ref = firestore_db.collection('lottos')
-            query = lottos_ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(50)
-            docs = query.stream()
-            saved_lottos = [doc.to_dict() for doc in docs]
+            # Persisted lottos (limit 50 for speed) from the listener-fed local copy
+            saved_lottos = LOTTOS_CACHE.get()
             
             # Merge and Deduplicate
             # Use a dictionary keyed by unique signature to dedupe
@@ -3206,13 +3462,25 @@ def api_whales():
         except Exception as e:
             print(f"❌ Failed to merge saved lottos: {e}")
 
-    sliced = clean_data[offset:offset+limit]
-    
-    return jsonify({
-        "data": sliced,
-        "stale": False,
-        "timestamp": int(CACHE["whales"]["timestamp"])
-    })
+    if removed is not None:
+        # Delta: every addition since the cursor - the returned version covers all of them, so
+        # capping at `limit` would skip whales for clients that fell behind (the feed itself is bounded)
+        payload = {"data": whale_feed_json(index.select(mask)), "removed": removed, "since": since}
+    elif lotto_only:
+        payload = {"data": whale_feed_json(clean_data[offset:offset+limit])}
+    else:
+        payload = {"data": whale_feed_json(index.select(mask, offset, limit))}
+        if since is not None and not lotto_only:
+            payload["reset"] = True
+    payload.update({"stale": False, "timestamp": int(entry["timestamp"])})
+    if not lotto_only:
+        payload["version"] = version
+    
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route('/api/whales/tickers')
 def api_whales_tickers():
@@ -3224,7 +3492,6 @@ def api_whales_tickers():
         return jsonify({"tickers": []})
     
     # Same date filtering logic as main feed
-    raw_data = CACHE["whales"]["data"]
     tz_eastern = pytz.timezone('US/Eastern')
     now_et = datetime.now(tz_eastern)
     today_date = now_et.date()
@@ -3236,130 +3503,58 @@ def api_whales_tickers():
         target_date = today_date - timedelta(days=2)
     else:
         target_date = today_date
-        
-    unique_tickers = set()
     
-    for whale in raw_data:
-        try:
-            trade_dt = datetime.fromtimestamp(whale['timestamp'], tz_eastern)
-            if trade_dt.date() == target_date:
-                # Extract underlying ticker (e.g. "NVDA" from "O:NVDA...")
-                # The 'ticker' field in processed trades usually has the option symbol "O:..."
-                # But let's check what we actually store. 
-                # In run.py, 'ticker' is set to the option symbol.
-                # We want the underlying.
-                # Usually we can parse it or maybe it's available.
-                # Let's just parse it from the option symbol string if needed, 
-                # or use the 'symbol' field if it's the underlying?
-                # Wait, in run.py scan_whales_alpaca:
-                # trade["ticker"] = symbol (which is the option symbol)
-                # But we want to filter by UNDERLYING (e.g. NVDA).
-                
-                full_ticker = whale.get('ticker', '')
-                # Format is usually O:SYMBOL... or just SYMBOL...
-                # Let's strip O: and take alpha characters
-                clean = full_ticker.replace('O:', '')
-                # Regex to get leading letters
-                match = re.match(r"([A-Z]+)", clean)
-                if match:
-                    unique_tickers.add(match.group(1))
-        except:
-            continue
-            
-    # Also include tickers from persisted history if lotto mode is common?
-    # The user asked for "all of the tickers we fetch in the main dashboard unusual whales".
-    # So the above logic covers the main cache.
-    
-    return jsonify({"tickers": sorted(list(unique_tickers))})
+    # Underlyings (e.g. "NVDA", not the "O:NVDA..." option symbol) with a whale that day
+    index = whale_index("whales")
+    return jsonify({"tickers": index.tickers_in(index.day(target_date))})
 
-@app.route('/api/whales/stream')
-def api_whales_stream():
-    def generate():
+# === WHALE STREAM HUBS ===
+# One filter + serialize pass per cache change, shared by every SSE subscriber
+# (see sse_hub.py). Clients get the full feed on connect, "delta" events with new
+# whales / removed seqs afterwards and a full resync every WHALE_STREAM_RESYNC seconds.
+WHALE_STREAM_RESYNC = int(os.environ.get("WHALE_STREAM_RESYNC", "60"))
 
-        # Initial Data
-        current_time = time.time()
-        # Just yield the cache periodically
-        while True:
-            # Send immediately on connect
-            # FILTER: Ensure we only show TODAY'S trades (Server-side safety)
-            raw_data = CACHE["whales"]["data"]
-            tz_eastern = pytz.timezone('US/Eastern')
-            now_et = datetime.now(tz_eastern)
-            today_date = now_et.date()
-            weekday = now_et.weekday()
-            
-            # On weekends, show Friday's trades; on weekdays show today's trades
-            # UPDATE: Main Dashboard should ALWAYS show empty state on weekends (Scanner Mode)
-            # So we strictly filter for TODAY's date.
-            target_date = today_date
-            
-            clean_data = []
-            for whale in raw_data:
-                # 'timestamp' is unix epoch
-                trade_dt = datetime.fromtimestamp(whale['timestamp'], tz_eastern)
-                if trade_dt.date() == target_date:
-                    clean_data.append(whale)
-
-            yield f"data: {json.dumps({'data': clean_data, 'stale': False, 'timestamp': int(CACHE['whales']['timestamp'])})}\n\n"
-            # Optimization: Slow down stream when market is closed
-            tz_eastern = pytz.timezone('US/Eastern')
-            now = datetime.now(tz_eastern)
-            # Options trade 9:30 AM - 4:15 PM ET
-            is_market_hours = (now.weekday() < 5) and (
-                (now.hour > 9 or (now.hour == 9 and now.minute >= 30)) and 
-                (now.hour < 16 or (now.hour == 16 and now.minute < 15))
-            )
-            
-            sleep_time = 5 if is_market_hours else 60
-            time.sleep(sleep_time)
+def whale_stream_date(friday_on_weekends):
+    """ET date whose trades a stream shows (weekends fall back to Friday if asked)."""
+    today_date = datetime.now(pytz.timezone('US/Eastern')).date()
+    weekday = today_date.weekday()
+    if friday_on_weekends and weekday >= 5:
+        return today_date - timedelta(days=weekday - 4)
+    return today_date
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+def whale_stream_key(whale):
+    return whale.get('seq')
 
-@app.route('/api/whales/30dte/stream')
-def api_whales_30dte_stream():
-    def generate():
+def make_whale_stream_hub(cache_key, friday_on_weekends):
+    def version():
+        return CACHE[cache_key].get("version", 0), whale_stream_date(friday_on_weekends)
 
-        # Initial Data
-        current_time = time.time()
-        # Just yield the cache periodically
-        while True:
-            # Send immediately on connect
-            # FILTER: Ensure we only show TODAY'S trades (Server-side safety)
-            raw_data = CACHE["whales_30dte"]["data"]
-            tz_eastern = pytz.timezone('US/Eastern')
-            now_et = datetime.now(tz_eastern)
-            today_date = now_et.date()
-            weekday = now_et.weekday()
-            
-            # On weekends, show Friday's trades; on weekdays show today's trades
-            if weekday == 5:  # Saturday
-                target_date = today_date - timedelta(days=1)  # Friday
-            elif weekday == 6:  # Sunday
-                target_date = today_date - timedelta(days=2)  # Friday
-            else:
-                target_date = today_date
-            
-            clean_data = []
-            for whale in raw_data:
-                # 'timestamp' is unix epoch
-                trade_dt = datetime.fromtimestamp(whale['timestamp'], tz_eastern)
-                if trade_dt.date() == target_date:
-                    clean_data.append(whale)
-
-            yield f"data: {json.dumps({'data': clean_data, 'stale': False, 'timestamp': int(CACHE['whales_30dte']['timestamp'])})}\n\n"
-            # Optimization: Slow down stream when market is closed
-            tz_eastern = pytz.timezone('US/Eastern')
-            now = datetime.now(tz_eastern)
-            # Options trade 9:30 AM - 4:15 PM ET
-            is_market_hours = (now.weekday() < 5) and (
-                (now.hour > 9 or (now.hour == 9 and now.minute >= 30)) and 
-                (now.hour < 16 or (now.hour == 16 and now.minute < 15))
-            )
-            
-            sleep_time = 5 if is_market_hours else 60
-            time.sleep(sleep_time)
+    def snapshot():
+        entry = CACHE[cache_key]
+        index = whale_index(cache_key)
+        clean_data = whale_feed_json(index.select(index.day(whale_stream_date(friday_on_weekends))))
+        return clean_data, {"stale": False, "timestamp": int(entry["timestamp"]), "version": entry.get("version", 0)}
+
+    return BroadcastHub(cache_key, version, snapshot, whale_stream_key, resync_every=WHALE_STREAM_RESYNC)
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+# Main Dashboard strictly shows TODAY (empty on weekends = Scanner Mode);
+# the 30 DTE page keeps showing Friday's trades over the weekend
+WHALE_STREAM_HUB = make_whale_stream_hub("whales", friday_on_weekends=False)
+WHALE_30DTE_STREAM_HUB = make_whale_stream_hub("whales_30dte", friday_on_weekends=True)
+
+def sse_response(hub):
+    response = Response(stream_with_context(hub.subscribe()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/whales/stream')
+def api_whales_stream():
+    return sse_response(WHALE_STREAM_HUB)
+
+@app.route('/api/whales/30dte/stream')
+def api_whales_30dte_stream():
+    return sse_response(WHALE_30DTE_STREAM_HUB)
 
 @app.route('/api/polymarket')
 def api_polymarket():
@@ -3394,7 +3589,7 @@ def refresh_polymarket_logic():
         if api_key:
             headers['Authorization'] = f"Bearer {api_key}"
 
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = http_get(url, headers=headers, timeout=10)
         
         if resp.status_code == 200:
             events = resp.json()
@@ -3409,7 +3604,7 @@ def refresh_polymarket_logic():
             ]
             for slug in important_slugs:
                 try:
-                    slug_resp = requests.get(f'https://gamma-api.polymarket.com/events?slug={slug}', headers=headers, timeout=5)
+                    slug_resp = http_get(f'https://gamma-api.polymarket.com/events?slug={slug}', headers=headers, timeout=5)
                     if slug_resp.status_code == 200:
                         slug_events = slug_resp.json()
                         for se in slug_events:
@@ -3792,48 +3987,48 @@ def background_movers_fetch():
     global CACHE
     print("🔄 Starting background movers fetch...")
     try:
-        MOVERS_TICKERS = [
-            "NVDA", "TSLA", "AAPL", "MSFT", "AMZN", "META", "GOOGL",
-            "AMD", "INTC", "AVGO", "MU", "ARM", "SMCI",
-            "PLTR", "CRWD",
-            "NFLX", "DIS", "UBER", "DASH", "ABNB", "PTON", "NKE", "SBUX"
-        ]
-        
-        def fetch_movers_tickers():
-           return yf.Tickers(" ".join(MOVERS_TICKERS))
+        def mover(symbol, last, prev):
+            if last and prev:
+                change = ((last - prev) / prev) * 100
+                return {
+                    "symbol": symbol,
+                    "change": round(change, 2),
+                    "type": "gain" if change >= 0 else "loss"
+                }
+            return None
         
-        # Use our timeout utility
-        tickers_obj = with_timeout(fetch_movers_tickers, timeout_seconds=20)
+        # Bulk snapshot first (one call for the whole list), yfinance for anything it missed
+        snapshots = get_stock_snapshots(MOVERS_TICKERS)
+        results = [mover(sym, snap["price"], snap["prev_close"]) for sym, snap in snapshots.items()]
+        missing = [sym for sym in MOVERS_TICKERS if sym not in snapshots]
         
-        if not tickers_obj:
-            print("⏰ Movers tickers fetch timed out")
-            CACHE["movers"]["refreshing"] = False
-            return
+        if missing:
+            def fetch_movers_tickers():
+               return yf.Tickers(" ".join(missing))
             
-        def fetch_ticker_data(symbol):
-            try:
-                time.sleep(random.uniform(0.01, 0.05))
-                t = tickers_obj.tickers[symbol]
-                # Accessing fast_info triggers the fetch
-                last = t.fast_info.last_price
-                prev = t.fast_info.previous_close
-                if last and prev:
-                    change = ((last - prev) / prev) * 100
-                    return {
-                        "symbol": symbol,
-                        "change": round(change, 2),
-                        "type": "gain" if change >= 0 else "loss"
-                    }
-            except Exception as e:
-                # print(f"❌ ({symbol})", end=" ") 
-                return None
-            return None
-        
-        # Using a smaller pool for background work to not starve main threads
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            # Add timeout to iterator? No, just let it run in background
-            results = list(executor.map(fetch_ticker_data, MOVERS_TICKERS))
+            # Use our timeout utility
+            tickers_obj = with_timeout(fetch_movers_tickers, timeout_seconds=20)
+            
+            if not tickers_obj:
+                print("⏰ Movers tickers fetch timed out")
+                if not snapshots:
+                    CACHE["movers"]["refreshing"] = False
+                    return
+                
+            def fetch_ticker_data(symbol):
+                try:
+                    time.sleep(random.uniform(0.01, 0.05))
+                    t = tickers_obj.tickers[symbol]
+                    # Accessing fast_info triggers the fetch
+                    return mover(symbol, t.fast_info.last_price, t.fast_info.previous_close)
+                except Exception as e:
+                    # print(f"❌ ({symbol})", end=" ") 
+                    return None
+            
+            if tickers_obj:
+                # Using a smaller pool for background work to not starve main threads
+                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                    results += list(executor.map(fetch_ticker_data, missing))
         
         movers = [r for r in results if r is not None]
         movers.sort(key=lambda x: x['change'], reverse=True)
@@ -3901,7 +4096,7 @@ def refresh_news_logic():
     def fetch_single_feed(url):
         try:
             # Individual timeout of 3s (reduced from 10s for faster page loads)
-            response = requests.get(url, headers=headers, verify=False, timeout=3)
+            response = http_get(url, headers=headers, verify=False, timeout=3)
             
             if response.status_code != 200:
                 print(f"⚠️ Feed Error {url}: Status {response.status_code}", flush=True)
@@ -3965,7 +4160,7 @@ def refresh_news_logic():
         if FINNHUB_API_KEY:
             try:
                 finnhub_url = f"https://finnhub.io/api/v1/news?category=general&token={FINNHUB_API_KEY}"
-                resp = requests.get(finnhub_url, timeout=10)
+                resp = http_get(finnhub_url, timeout=10)
                 if resp.status_code == 200:
                     finnhub_data = resp.json()
                     
@@ -4099,7 +4294,7 @@ def debug_force_whales():
             "symbol": symbol,
             "cache_count": len(CACHE["whales"]["data"]),
             "cache_timestamp": CACHE["whales"]["timestamp"],
-            "cache_data": CACHE["whales"]["data"][:5],  # First 5
+            "cache_data": whale_feed_json(CACHE["whales"]["data"][:5]),  # First 5
             "logs": logs
         })
     except Exception as e:
@@ -4139,7 +4334,7 @@ def debug_sources():
     for name, url in rss_feeds.items():
         start = time.time()
         try:
-            resp = requests.get(url, headers=headers, verify=False, timeout=3)
+            resp = http_get(url, headers=headers, verify=False, timeout=3)
             duration = time.time() - start
             feed = feedparser.parse(resp.content)
             results["sources"][f"rss_{name}"] = {
@@ -4182,7 +4377,7 @@ def debug_sources():
         start = time.time()
         try:
             url = f"https://api.polygon.io/v2/aggs/ticker/SPY/prev?apiKey={POLYGON_API_KEY}"
-            resp = requests.get(url, timeout=5)
+            resp = http_get(url, timeout=5)
             duration = time.time() - start
             data = resp.json()
             results["sources"]["polygon"] = {
@@ -4208,8 +4403,12 @@ def debug_sources():
     return jsonify(results)
 
 
-def refresh_gamma_logic(symbol="SPY"):
-
+def refresh_gamma_logic(symbol="SPY", expiry=None):
+    """
+    Fetch + compute the Gamma Wall for one symbol/expiry into CACHE.
+    expiry=None uses the default expiry (cached as gamma_{symbol}, and also under
+    its explicit-date key). Returns True on success.
+    """
     global CACHE
     
     from datetime import timedelta
@@ -4238,7 +4437,7 @@ def refresh_gamma_logic(symbol="SPY"):
         time_period = "after_hours"
         
     # === PRIORITY 1: Polygon.io (Unlimited API calls, 15-min delayed) ===
-    polygon_data = fetch_options_chain_polygon(symbol, strike_limit=40)
+    polygon_data = fetch_options_chain_polygon(symbol, strike_limit=40, expiry=expiry)
     
     if polygon_data and polygon_data.get("results"):
         try:
@@ -4247,9 +4446,9 @@ def refresh_gamma_logic(symbol="SPY"):
             # Parse Polygon response to gamma format
             # Get current price from fetch response (already queried)
             fetched_price = polygon_data.get("_current_price")
-            gamma_data, current_price = parse_polygon_to_gamma_format(polygon_data, fetched_price)
+            gamma_table, current_price, gamma_levels = parse_polygon_to_gamma_format(polygon_data, fetched_price)
             
-            if not current_price or not gamma_data:
+            if not current_price or not len(gamma_table):
                 raise ValueError("Failed to parse Polygon response")
             
             # Polygon API already filters strikes to ±10% of ATM
@@ -4263,39 +4462,17 @@ def refresh_gamma_logic(symbol="SPY"):
             # Dynamic OI threshold: 200 for low-liquidity, 500 for normal
             MIN_OI = 200 if symbol in LOW_LIQUIDITY_TICKERS else 500
             
-            final_data = []
-            for strike, data in gamma_data.items():
-                # Calculate totals
-                total_vol = data["call_vol"] + data["put_vol"]
-                total_oi = data["call_oi"] + data["put_oi"]
-                
-                # Skip strikes with low OI (no meaningful gamma impact)
-                # This is the key filter - MMs only hedge significant OI
-                if total_oi < MIN_OI:
-                    continue
-                    
-                # Relax volume filter for Indices:
-                # For SPY/QQQ, we want to see the structure regardless of today's volume
-                # For single stocks, we still require some volume to prove activity
-                is_index = symbol in INDEX_ETFS
-                
-                # If it's NOT an index, enforce volume filter
-                if not is_index and total_vol < MIN_VOLUME:
-                    continue
-                final_data.append({
-                    "strike": strike,
-                    "call_vol": data["call_vol"],
-                    "put_vol": data["put_vol"],
-                    "call_oi": data["call_oi"],
-                    "put_oi": data["put_oi"],
-                    "call_premium": data.get("call_premium", 0),
-                    "put_premium": data.get("put_premium", 0),
-                    "call_gex": data.get("call_gex", 0),
-                    "put_gex": data.get("put_gex", 0),
-                    "net_gex": data.get("net_gex", 0)  # Industry-standard net GEX
-                })
+            # Skip strikes with low OI (no meaningful gamma impact)
+            # This is the key filter - MMs only hedge significant OI
+            keep = (gamma_table.call_oi + gamma_table.put_oi) >= MIN_OI
+            
+            # Relax volume filter for Indices:
+            # For SPY/QQQ, we want to see the structure regardless of today's volume
+            # For single stocks, we still require some volume to prove activity
+            if symbol not in INDEX_ETFS:
+                keep &= (gamma_table.call_vol + gamma_table.put_vol) >= MIN_VOLUME
             
-            final_data.sort(key=lambda x: x['strike'], reverse=True)  # High → Low (pre-sorted for client)
+            final_data = gamma_table.mask(keep).to_rows(descending=True)  # High → Low (pre-sorted for client)
             
             result = {
                 "symbol": symbol,
@@ -4306,13 +4483,20 @@ def refresh_gamma_logic(symbol="SPY"):
                 "source": "polygon.io",
                 "_expiry_date": polygon_data.get("_expiry_date"),  # Pass through for TOMORROW badge
                 "_is_next_trading_day": polygon_data.get("_is_next_trading_day", False),
-                "_date_label": polygon_data.get("_date_label", "TODAY")
+                "_date_label": polygon_data.get("_date_label", "TODAY"),
+                # Key levels from the full (unfiltered) chain
+                "zero_gamma": gamma_levels["zero_gamma"],
+                "call_wall": gamma_levels["call_wall"],
+                "put_wall": gamma_levels["put_wall"]
             }
             
-            cache_key = f"gamma_{symbol}"
-            CACHE[cache_key] = {"data": result, "timestamp": time.time()}
+            entry = {"data": result, "timestamp": time.time()}
+            CACHE[gamma_cache_key(symbol, expiry)] = entry
+            if expiry is None and result["_expiry_date"]:
+                # Same data is also the answer for ?expiry=<default date>
+                CACHE[gamma_cache_key(symbol, result["_expiry_date"])] = entry
             SERVICE_STATUS["GAMMA"] = {"status": "ONLINE", "last_updated": time.time()}
-            return
+            return True
             
         except Exception as e:
             print(f"Gamma Polygon Parse Error ({symbol}): {e}")
@@ -4320,29 +4504,101 @@ def refresh_gamma_logic(symbol="SPY"):
     # No fallbacks - if Polygon fails, mark as OFFLINE
     print(f"Gamma: No data available for {symbol} (Polygon failed)")
     SERVICE_STATUS["GAMMA"] = {"status": "OFFLINE", "last_updated": time.time()}
+    return False
+
+
+# === GAMMA PRECOMPUTE ===
+# Background worker keeps these symbols warm across the next N expiries so
+# /api/gamma never waits on Polygon; stale entries are served while refreshing.
+GAMMA_PRECOMPUTE_SYMBOLS = list(dict.fromkeys(
+    [t.strip().upper() for t in os.environ.get("GAMMA_PRECOMPUTE_SYMBOLS", "SPY,QQQ,IWM").split(",") if t.strip()]
+    + WHALE_WATCHLIST
+))
+GAMMA_PRECOMPUTE_EXPIRIES = int(os.environ.get("GAMMA_PRECOMPUTE_EXPIRIES", "3"))
+GAMMA_PRECOMPUTE_CONCURRENCY = 8
+GAMMA_STALE_AFTER = 300  # seconds before a served entry triggers a background refresh
+GAMMA_FAILURE_TTL = 60  # don't re-hit Polygon for a key that just failed
+GAMMA_REFRESH_FLIGHT = SingleFlight("gamma")
+GAMMA_PRECOMPUTE_STATS = ScanStats("gamma")
+GAMMA_FAILURES = {}  # {cache_key: timestamp of last failed refresh}
+
+
+def gamma_cache_key(symbol, expiry=None):
+    return f"gamma_{symbol}" if not expiry else f"gamma_{symbol}_{expiry}"
+
+
+def _refresh_gamma_job(symbol, expiry=None):
+    ok = refresh_gamma_logic(symbol, expiry)
+    key = gamma_cache_key(symbol, expiry)
+    if ok:
+        GAMMA_FAILURES.pop(key, None)
+    else:
+        GAMMA_FAILURES[key] = time.time()
+    return ok
+
+
+def refresh_gamma_coalesced(symbol, expiry=None):
+    """Refresh one key; concurrent callers for the same key share a single Polygon fetch."""
+    return GAMMA_REFRESH_FLIGHT.do(gamma_cache_key(symbol, expiry), _refresh_gamma_job, symbol, expiry)
+
+
+def precompute_gamma():
+    """Refresh every GAMMA_PRECOMPUTE_SYMBOLS x next GAMMA_PRECOMPUTE_EXPIRIES key concurrently."""
+    now_et = datetime.now(pytz.timezone('US/Eastern'))
+    jobs = []
+    for symbol in GAMMA_PRECOMPUTE_SYMBOLS:
+        jobs.append(symbol)  # Default expiry (what the dashboard shows)
+        if GAMMA_PRECOMPUTE_EXPIRIES > 1:
+            for expiry_date, _, _ in upcoming_gamma_expiries(symbol, GAMMA_PRECOMPUTE_EXPIRIES, now_et)[1:]:
+                jobs.append(f"{symbol}@{expiry_date}")
+    
+    def run_job(job):
+        symbol, _, expiry = job.partition("@")
+        return refresh_gamma_coalesced(symbol, expiry or None)
+    
+    refreshed = 0
+    for job, ok, error in fan_out(jobs, run_job, GAMMA_PRECOMPUTE_CONCURRENCY, GAMMA_PRECOMPUTE_STATS):
+        if error is not None:
+            print(f"Gamma Precompute Error ({job}): {error}")
+        elif ok:
+            refreshed += 1
+    
+    # One illiquid symbol failing shouldn't flip the whole service light
+    SERVICE_STATUS["GAMMA"] = {"status": "ONLINE" if refreshed else "OFFLINE", "last_updated": time.time()}
+    print(f"⚡ Gamma precompute: {refreshed}/{len(jobs)} keys refreshed")
+    return refreshed
 
 @app.route('/api/gamma')
 def api_gamma():
+    """
+    Serve Gamma Wall from cache only - never blocks on Polygon.
+    Stale (> GAMMA_STALE_AFTER) entries are returned immediately and refreshed in
+    the background; a cold key returns {"loading": true} while it is computed.
+    Optional ?expiry=YYYY-MM-DD for a specific expiration.
+    """
     global CACHE
     symbol = request.args.get('symbol', 'SPY').upper()
-    cache_key = f"gamma_{symbol}"
-    
-    # Serve directly from cache if fresh (< 5 mins)
-    if cache_key in CACHE and CACHE[cache_key]["data"]:
-        age = time.time() - CACHE[cache_key]["timestamp"]
-        if age < 300:
-            return jsonify(CACHE[cache_key]["data"])
-            
-    # If missing or stale, fetch immediately (On-Demand)
-    # Note: This might block for 1-2s, but ensures data availability
-    try:
-        refresh_gamma_logic(symbol)
-        if cache_key in CACHE and CACHE[cache_key]["data"]:
-            return jsonify(CACHE[cache_key]["data"])
-    except Exception as e:
-        print(f"On-Demand Gamma Fetch Error: {e}")
-        
-    return jsonify({"error": "Loading or Failed..."})
+    expiry = request.args.get('expiry') or None
+    if expiry:
+        try:
+            datetime.strptime(expiry, "%Y-%m-%d")
+        except ValueError:
+            return jsonify({"error": "expiry must be YYYY-MM-DD"}), 400
+    cache_key = gamma_cache_key(symbol, expiry)
+    
+    entry = CACHE.get(cache_key)
+    if entry and entry.get("data"):
+        age = time.time() - entry["timestamp"]
+        if age >= GAMMA_STALE_AFTER:
+            # Stale-while-revalidate: answer now, refresh once in the background
+            GAMMA_REFRESH_FLIGHT.start(cache_key, _refresh_gamma_job, symbol, expiry)
+        return jsonify(entry["data"])
+    
+    # Cold miss: kick off (or join) the background fetch, let the client poll
+    if time.time() - GAMMA_FAILURES.get(cache_key, 0) < GAMMA_FAILURE_TTL:
+        return jsonify({"error": "Loading or Failed..."})
+    GAMMA_REFRESH_FLIGHT.start(cache_key, _refresh_gamma_job, symbol, expiry)
+    return jsonify({"error": "Loading...", "loading": True, "retry_after": 2})
 
 @app.route('/api/price')
 def api_price():
@@ -4391,6 +4647,109 @@ def api_price():
 def api_ping():
     return jsonify({"status": "ok", "timestamp": time.time()})
 
+@app.route('/api/debug/http')
+def api_debug_http():
+    """Pooled HTTP client counters: requests, connection reuse rate, latency histogram per endpoint."""
+    return jsonify({"vendors": get_http_stats(), "server_time": time.time()})
+
+@app.route('/api/debug/prices')
+def api_debug_prices():
+    """Price service counters: hit/miss/coalesced/negative hits per source."""
+    return jsonify({
+        "yfinance": YFINANCE_PRICES.stats(),
+        "polygon": POLYGON_PRICES.stats(),
+        "bulk_snapshot": {**BULK_PRICE_STATS, "interval": BULK_PRICE_INTERVAL, "cached_symbols": len(STOCK_SNAPSHOT_CACHE)}
+    })
+
+@app.route('/api/debug/library')
+def api_debug_library():
+    """Fish Finder quote matching: windows streamed, pages/quotes pulled, per-trade fallbacks."""
+    return jsonify(LIBRARY_QUOTE_STATS)
+
+@app.route('/api/debug/firestore')
+def api_debug_firestore():
+    """Firestore write-behind queue (depth, commits, retries, failures), listener caches, token / subscription caches."""
+    return jsonify({
+        "enabled": firestore_db is not None,
+        "writes": FIRESTORE_WRITES.stats(),
+        "lottos": LOTTOS_CACHE.stats(),
+        "saved_whales": SAVED_WHALES_CACHE.stats(),
+        "tokens": VERIFIED_TOKENS.stats(),
+        "subscriptions": SUBSCRIPTIONS.stats()
+    })
+
+@app.route('/api/debug/whale_log')
+def api_debug_whale_log():
+    """Whale event log: session, records / bytes, appends, replays, torn tails, compactions."""
+    return jsonify(WHALE_LOG.stats())
+
+@app.route('/api/debug/dedupe')
+def api_debug_dedupe():
+    """Whale dedupe store: session, seen ids / volume watermarks, evictions, snapshots."""
+    return jsonify(WHALE_DEDUPE.stats())
+
+@app.route('/api/debug/sse')
+def api_debug_sse():
+    """Whale stream hubs: subscribers, snapshots built, deltas / resyncs, fan-out latency."""
+    return jsonify({
+        "whales": WHALE_STREAM_HUB.stats(),
+        "whales_30dte": WHALE_30DTE_STREAM_HUB.stats()
+    })
+
+@app.route('/api/debug/vwap')
+def api_debug_vwap():
+    """VWAP aggregator: watched contracts, trades folded in, serialize cache hits."""
+    return jsonify(VWAP_AGGREGATOR.stats())
+
+@app.route('/api/debug/bars')
+def api_debug_bars():
+    """Bar store: partitions served from disk vs fetched, upstream calls, today's live series."""
+    return jsonify(BAR_STORE.stats())
+
+@app.route('/api/debug/library-trades')
+def api_debug_library_trades():
+    """Trade log / cursor counters: full vs delta fetches, trades appended, compactions."""
+    return jsonify({**LIBRARY_TRADE_STATS, "log": LIBRARY_TRADE_LOG.stats()})
+
+@app.route('/api/debug/library-cache')
+def api_debug_library_cache():
+    """Fish Finder result cache: entries, bytes, hit/derived/eviction counters."""
+    return jsonify(LIBRARY_CACHE.stats())
+
+@app.route('/api/debug/gamma')
+def api_debug_gamma():
+    """Gamma precompute coverage, per-key latency and single-flight counters."""
+    now = time.time()
+    with CACHE_LOCK:
+        ages = {k[len("gamma_"):]: round(now - v.get("timestamp", 0), 1) for k, v in CACHE.items() if k.startswith("gamma_") and v.get("data")}
+    return jsonify({
+        "symbols": GAMMA_PRECOMPUTE_SYMBOLS,
+        "expiries_per_symbol": GAMMA_PRECOMPUTE_EXPIRIES,
+        "cached_ages_s": ages,
+        "recent_failures": sorted(GAMMA_FAILURES),
+        "precompute": GAMMA_PRECOMPUTE_STATS.snapshot(),
+        "single_flight": GAMMA_REFRESH_FLIGHT.stats()
+    })
+
+@app.route('/api/debug/ingest')
+def api_debug_ingest():
+    """WebSocket ingest queues: depth, drops, end-to-end latency."""
+    return jsonify({"trades": TRADE_INGEST.stats(), "quotes": QUOTE_INGEST.stats()})
+
+@app.route('/api/debug/nbbo')
+def api_debug_nbbo():
+    """NBBO book hit rate, REST fallbacks and quote ingest lag."""
+    return jsonify(NBBO_BOOK.stats())
+
+@app.route('/api/debug/whale-scan')
+def api_debug_whale_scan():
+    """Per-symbol latency of the concurrent whale scan (slowest first) + last pass wall time."""
+    stats = WHALE_SCAN_STATS.snapshot()
+    stats["watchlist_size"] = len(WHALE_WATCHLIST)
+    stats["snapshot_pagination"] = dict(SNAPSHOT_PAGINATION_STATS)
+    stats["snapshot_truncated"] = sorted(sym for sym, p in SNAPSHOT_PAGINATION_STATS.items() if p.get("truncated"))
+    return jsonify(stats)
+
 # === FINNHUB MARKET STATUS ===
 # Cache for market status (refresh every 60 seconds)
 MARKET_STATUS_CACHE = {"data": None, "timestamp": 0}
@@ -4415,7 +4774,7 @@ def api_market_status():
     try:
         if FINNHUB_API_KEY:
             url = f"https://finnhub.io/api/v1/stock/market-status?exchange=US&token={FINNHUB_API_KEY}"
-            resp = requests.get(url, timeout=5)
+            resp = http_get(url, timeout=5)
             
             if resp.status_code == 200:
                 data = resp.json()
@@ -4569,6 +4928,135 @@ def api_heatmap():
 
 
 
+# === SHARED CACHE (CROSS-WORKER) ===
+# Gunicorn runs 4 workers. Only the leader runs the refresh loop and publishes
+# CACHE / price caches / SERVICE_STATUS; followers mirror the published copy.
+SHARED_STORE = SharedStore()
+LEADER_LOCK = LeaderLock(SHARED_STORE.directory)
+SHARED_CACHE_SYNC_INTERVAL = 1  # seconds (leader publish + follower sync cadence)
+_SHARED_FINGERPRINTS = {}  # {store_key: fingerprint of last published version}
+
+
+def _shared_fingerprint(value):
+    """Cheap change detector - entries are replaced (not mutated) on refresh."""
+    if isinstance(value, dict) and "timestamp" in value:
+        data = value.get("data")
+        return (value.get("timestamp"), id(data), len(data) if hasattr(data, "__len__") else None)
+    if isinstance(value, dict):
+        # Price caches: {symbol: {"price", "timestamp"}}
+        return (len(value), max((v.get("timestamp", 0) for v in value.values() if isinstance(v, dict)), default=0))
+    return id(value)
+
+
+def publish_shared_cache():
+    """Leader: write every CACHE entry (and price caches) that changed since the last publish."""
+    with CACHE_LOCK:
+        items = [(f"cache__{key}", entry) for key, entry in CACHE.items()]
+    items.append(("prices__yfinance", dict(PRICE_CACHE)))
+    items.append(("prices__polygon", dict(POLYGON_PRICE_CACHE)))
+    items.append(("prices__snapshot", dict(STOCK_SNAPSHOT_CACHE)))
+    items.append(("status__services", dict(SERVICE_STATUS)))
+    
+    for store_key, value in items:
+        fingerprint = _shared_fingerprint(value)
+        if _SHARED_FINGERPRINTS.get(store_key) == fingerprint:
+            continue
+        if SHARED_STORE.publish(store_key, value):
+            _SHARED_FINGERPRINTS[store_key] = fingerprint
+
+
+def _merge_price_cache(local, shared):
+    for symbol, entry in shared.items():
+        current = local.get(symbol)
+        if current is None or entry.get("timestamp", 0) > current.get("timestamp", 0):
+            local[symbol] = entry
+
+
+def sync_shared_cache():
+    """Follower: pull entries the leader published since our last sync."""
+    changed = SHARED_STORE.load_changed()
+    if not changed:
+        return 0
+    
+    with CACHE_LOCK:
+        for store_key, value in changed.items():
+            if store_key.startswith("cache__"):
+                CACHE[store_key[len("cache__"):]] = value
+    
+    if "prices__yfinance" in changed:
+        _merge_price_cache(PRICE_CACHE, changed["prices__yfinance"])
+    if "prices__polygon" in changed:
+        _merge_price_cache(POLYGON_PRICE_CACHE, changed["prices__polygon"])
+    if "prices__snapshot" in changed:
+        _merge_price_cache(STOCK_SNAPSHOT_CACHE, changed["prices__snapshot"])
+    if "status__services" in changed:
+        SERVICE_STATUS.update(changed["status__services"])
+    return len(changed)
+
+
+def try_become_leader():
+    """
+    Grab the leader lock if it is free. On promotion: rebuild the whale dedupe
+    history from the mirrored feed and start publishing.
+    """
+    if LEADER_LOCK.is_leader:
+        return True
+    if not LEADER_LOCK.try_acquire():
+        return False
+    
+    print(f"👑 Worker {os.getpid()} is now the cache leader (refresh loop active)", flush=True)
+    
+    # Resume the previous leader's dedupe snapshot, then cover anything it didn't
+    # flush from the mirrored feed - avoid re-adding the same prints
+    restored = WHALE_DEDUPE.load(whale_session())
+    if restored:
+        print(f"📂 Restored {restored} whale dedupe entries", flush=True)
+    with CACHE_LOCK:
+        known_whales = list(CACHE.get("whales_30dte", {}).get("data", []))
+    for w in known_whales:
+        if w.get("source") == "polygon":
+            WHALE_DEDUPE.seed(f"{w.get('symbol')}_{w.get('volume')}_{w.get('lastPrice')}", w.get("timestamp", time.time()))
+    
+    def publisher():
+        while True:
+            try:
+                publish_shared_cache()
+            except Exception as e:
+                print(f"⚠️ Shared cache publisher error: {e}")
+            time.sleep(SHARED_CACHE_SYNC_INTERVAL)
+    
+    threading.Thread(target=publisher, daemon=True).start()
+    return True
+
+
+@app.route('/api/debug/shared-cache')
+def api_debug_shared_cache():
+    """Which worker is leading and how much this worker has published/loaded."""
+    return jsonify({
+        "pid": os.getpid(),
+        "role": "leader" if LEADER_LOCK.is_leader else "follower",
+        "leader_pid": LEADER_LOCK.holder_pid(),
+        "store": SHARED_STORE.stats()
+    })
+
+
+def _job_thread_init():
+    """Scheduler threads get their own asyncio loop (the worker thread used to set one up)."""
+    import asyncio
+    try:
+        asyncio.get_event_loop()
+    except RuntimeError:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+# Background refresh jobs (see scheduler.py) - registered by start_background_worker
+BACKGROUND_SCHEDULER = Scheduler(market_session, workers=int(os.environ.get("SCHEDULER_WORKERS", "4")),
+                                 thread_init=_job_thread_init)
+
+@app.route('/api/debug/scheduler')
+def api_debug_scheduler():
+    """Background jobs: state, interval for the current session, run durations, start lag, misses."""
+    return jsonify(BACKGROUND_SCHEDULER.stats())
+
 def start_background_worker():
     def hydrate_on_startup():
 
@@ -4590,13 +5078,11 @@ def start_background_worker():
         else:
             # Market hours - warm price cache, whale scan runs via main worker loop
             print("📈 Market hours - warming price cache...")
-            import gevent
-            for symbol in WHALE_WATCHLIST[:5]:
-                try:
-                    get_cached_price(symbol)
-                    gevent.sleep(1)  # Prevent 429 Too Many Requests
-                except Exception as e:
-                    print(f"Startup Price Cache Error ({symbol}): {e}")
+            try:
+                # One batched yfinance call instead of 5 sequential lookups
+                YFINANCE_PRICES.get_many(WHALE_WATCHLIST[:5])
+            except Exception as e:
+                print(f"Startup Price Cache Error: {e}")
         
         # 2. Fetch Gamma & Heatmap (lightweight on weekends) - WITH TIMEOUT
         # 2. Fetch Gamma & Heatmap & News - WITH RETRY & ROBUST TIMEOUT
@@ -4624,6 +5110,95 @@ def start_background_worker():
         # retry_fetch(refresh_news_logic, "News")
         
 
+    def news_job():
+        # DIRECT CALL - Has internal ThreadPool
+        refresh_news_logic()
+        # Check if we actually got news
+        if not CACHE.get("news", {}).get("data"):
+            print("⚠️ News Fetch Empty - Retrying in 60s", flush=True)
+            raise RetryAfter(60, "news fetch empty")
+
+    def whales_job():
+        start_time = time.time()
+        
+        # Use Polygon scanning (Simplified to Polygon-only per user request)
+        try:
+            # Each symbol's whales are merged into CACHE as soon as that symbol finishes
+            new_whales = scan_whales_polygon(on_symbol=lambda symbol, whales: merge_new_whales(whales))
+            
+            if new_whales:
+                print(f"✅ Added {len(new_whales)} new whales to feed (Polygon Only).")
+                save_whale_cache(new_whales)
+                
+        except Exception as e:
+            print(f"⚠️ Polygon Whale Scan Error: {e}")
+        
+        try:
+            WHALE_DEDUPE.snapshot()
+        except Exception as e:
+            print(f"⚠️ Whale dedupe snapshot error: {e}")
+
+        duration = time.time() - start_time
+        if duration > 1:
+            slowest = list(WHALE_SCAN_STATS.snapshot()["symbols"].items())[:3]
+            slowest_str = ", ".join(f"{sym} {entry['last_ms']:.0f}ms" for sym, entry in slowest)
+            print(f"🐢 Whale Scan took {duration:.2f}s for {len(WHALE_WATCHLIST)} symbols (slowest: {slowest_str})", flush=True)
+
+    def follower_sync_job():
+        # FOLLOWER: mirror the leader's cache, retake leadership if it died
+        try:
+            sync_shared_cache()
+        except Exception as e:
+            print(f"⚠️ Shared cache sync error: {e}")
+        try_become_leader()
+
+    def register_jobs(scheduler):
+        import gc
+        is_leader = lambda: LEADER_LOCK.is_leader
+        
+        # MEMORY SAFEGUARD: Explicit GC every 30 mins
+        scheduler.add("gc", gc.collect, 1800, jitter=0, misfire="skip")
+        scheduler.add("follower_sync", follower_sync_job, SHARED_CACHE_SYNC_INTERVAL,
+                      when=lambda: not LEADER_LOCK.is_leader, jitter=0, anchor="finish")
+        
+        # Polymarket (Runs 24/7, but slower at night / weekends): 5 mins | 15 mins
+        # Force hydration if cache is empty
+        scheduler.add("polymarket", refresh_polymarket_logic,
+                      {"regular": 300, "extended": 300, "overnight": 900, "weekend": 900},
+                      hydrate=lambda: not CACHE.get("polymarket", {}).get("data"),
+                      when=is_leader, deadline=120)
+        
+        # Bulk prices: one stock snapshot call for every watchlist/heatmap/movers symbol
+        # (keeps PRICE_CACHE / POLYGON_PRICE_CACHE warm for heatmap/gamma/whales)
+        scheduler.add("bulk_prices", refresh_bulk_prices,
+                      {"regular": BULK_PRICE_INTERVAL, "extended": BULK_PRICE_INTERVAL},
+                      hydrate=lambda: not STOCK_SNAPSHOT_CACHE,
+                      when=is_leader, deadline=30, retry=BULK_PRICE_INTERVAL)
+        
+        # Heatmap (Extended Hours, or if cache is empty e.g. server restart at night/weekend): 30 mins
+        # Internal with_timeout handles yfinance hanging
+        scheduler.add("heatmap", refresh_heatmap_logic, {"regular": 1800, "extended": 1800},
+                      hydrate=lambda: not CACHE.get("heatmap", {}).get("data"),
+                      when=is_leader, deadline=120)
+        
+        # News (Always Runs, but slower at night): 5 mins | 15 mins
+        scheduler.add("news", news_job,
+                      {"regular": 300, "extended": 300, "overnight": 900, "weekend": 900},
+                      hydrate=lambda: not CACHE.get("news", {}).get("data"),
+                      when=is_leader, deadline=120)
+        
+        # Gamma (Market Hours OR Empty Cache) - 2 mins
+        # Symbol set x next N expiries, concurrently (see GAMMA PRECOMPUTE)
+        scheduler.add("gamma", precompute_gamma, {"regular": 120},
+                      hydrate=lambda: not CACHE.get("gamma_SPY", {}).get("data"),
+                      when=is_leader, deadline=90)
+        
+        # Whales: market + extended hours (late prints), or to show Friday's data if the
+        # cache is empty on a weekend. 30s between scans (Alpaca rate limit sustainability)
+        scheduler.add("whales", whales_job, {"regular": 30, "extended": 30},
+                      hydrate=lambda: market_session() == "weekend" and not CACHE.get("whales", {}).get("data"),
+                      when=is_leader, deadline=60, anchor="finish", jitter=0, retry=30)
+
     def worker():
         import asyncio
         try:
@@ -4636,185 +5211,26 @@ def start_background_worker():
         load_whale_cache()
         mark_whale_cache_cleared()
         
-        # Run Hydration ONCE on startup (Background)
-        try:
-            hydrate_on_startup()
-        except Exception as e:
-            print(f"⚠️ Hydration Failed: {e}", flush=True)
-        
-
-        
-        import gc
-        last_gc_time = 0
-        
-        last_gamma_update = 0
-        last_heatmap_update = 0
-        last_news_update = 0
-        last_polymarket_update = 0
+        # Run Hydration ONCE on startup (Background) - leader only, followers mirror it
+        if try_become_leader():
+            try:
+                pruned = LIBRARY_TRADE_LOG.prune()
+                if pruned:
+                    print(f"🧹 Pruned {pruned} expired library trade log files", flush=True)
+                pruned = BAR_STORE.prune()
+                if pruned:
+                    print(f"🧹 Pruned {pruned} bar store partitions", flush=True)
+            except Exception as e:
+                print(f"⚠️ Trade log / bar store prune failed: {e}", flush=True)
+            try:
+                hydrate_on_startup()
+            except Exception as e:
+                print(f"⚠️ Hydration Failed: {e}", flush=True)
+        else:
+            print(f"📡 Worker {os.getpid()} following cache leader (pid {LEADER_LOCK.holder_pid()})", flush=True)
         
-        while True:
-            # MEMORY SAFEGUARD: Explicit GC every 30 mins
-            if time.time() - last_gc_time > 1800:
-                gc.collect()
-                last_gc_time = time.time()
-                
-            # === MARKET HOURS CHECK ===
-            tz_eastern = pytz.timezone('US/Eastern')
-            now = datetime.now(tz_eastern)
-            
-            # Market Hours: 9:30 AM - 4:00 PM ET, Mon-Fri
-            is_weekday = now.weekday() < 5
-            is_weekend = not is_weekday
-            # Extended Hours for Heatmap/News: 4:00 AM - 8:00 PM ET (Weekdays)
-            is_extended_hours = (is_weekday and (
-                (now.hour > 4 or (now.hour == 4 and now.minute >= 0)) and 
-                (now.hour < 20)
-            ))
-            # Core Market Hours for Options (Whales/Gamma): 9:30 AM - 4:15 PM ET (ETFs trade til 4:15)
-            is_market_open = is_weekday and (
-                (now.hour > 9 or (now.hour == 9 and now.minute >= 30)) and 
-                (now.hour < 16 or (now.hour == 16 and now.minute < 15))
-            )
-            
-            # News Slowdown: After 9 PM ET or Weekends
-            is_late_night = now.hour >= 21 or now.hour < 4
-            is_slow_news_time = (not is_weekday) or is_late_night
-
-            # 0. Polymarket (Runs 24/7, but slower at night)
-            # Normal: 5 mins (300s) | Slow: 15 mins (900s)
-            poly_interval = 900 if is_slow_news_time else 300
-            
-            # Force hydration if cache is empty
-            poly_needs_hydration = not CACHE.get("polymarket", {}).get("data")
-            should_run_poly = poly_needs_hydration or (time.time() - last_polymarket_update > poly_interval)
-            
-            if should_run_poly:
-                try:
-                    # DIRECT CALL - Optimized to yield
-                    refresh_polymarket_logic()
-                    last_polymarket_update = time.time()
-                except Exception as e:
-                    print(f"Worker Error (Polymarket): {e}")
-                    last_polymarket_update = time.time() - (poly_interval - 60)
-                time.sleep(0.2)
-
-            # 1. Heatmap (Runs in Extended Hours OR if cache is empty)
-            # Core Hours: 30 mins (1800s) | Extended Hours: 30 mins (1800s)
-            heatmap_interval = 1800
-            
-            # Force hydration if cache is empty (e.g. server restart at night/weekend)
-            heatmap_needs_hydration = not CACHE.get("heatmap", {}).get("data")
-            
-            # LOGIC FIX: If we need hydration, run it regardless of hours!
-            should_run_heatmap = is_extended_hours or heatmap_needs_hydration
-            
-            if should_run_heatmap and (time.time() - last_heatmap_update > heatmap_interval):
-                try: 
-                    # DIRECT CALL - Internal with_timeout handles yfinance hanging
-                    refresh_heatmap_logic()
-                    last_heatmap_update = time.time()
-                except Exception as e: print(f"Worker Error (Heatmap): {e}")
-                time.sleep(0.2)  # Polygon: unlimited API - faster polling
-            
-            # 2. News (Always Runs, but slower at night)
-            # Normal: 5 mins (300s) | Slow: 15 mins (900s)
-            news_interval = 900 if is_slow_news_time else 300
-            
-            # Force hydration if cache is empty
-            news_needs_hydration = not CACHE.get("news", {}).get("data")
-            should_run_news = news_needs_hydration or (time.time() - last_news_update > news_interval)
-            
-            if should_run_news:
-                    try: 
-                        # DIRECT CALL - Has internal ThreadPool
-                        refresh_news_logic()
-                        # Check if we actually got news
-                        news_data = CACHE.get("news", {}).get("data", [])
-                        if news_data:
-                            last_news_update = time.time()
-                        else:
-                            print("⚠️ News Fetch Empty - Retrying in 60s", flush=True)
-                            last_news_update = time.time() - (news_interval - 60)
-                    except Exception as e: 
-                        print(f"Worker Error (News): {e}")
-                        last_news_update = time.time() - (news_interval - 60)
-                
-            # 3. Gamma (Market Hours OR Empty Cache) - THROTTLED TO 2 MINS (was 5)
-            # If cache is empty (server restart), we MUST fetch data even if closed
-            gamma_needs_hydration = not CACHE.get("gamma_SPY", {}).get("data")
-            
-            if (is_market_open or gamma_needs_hydration) and (time.time() - last_gamma_update > 120):
-                try: 
-                    # DIRECT CALL - Requests have timeouts
-                    refresh_gamma_logic()
-                    last_gamma_update = time.time()
-                except Exception as e: print(f"Worker Error (Gamma): {e}")
-                time.sleep(0.2)  # Polygon: unlimited API - faster polling
-            
-            # 4. Whales (Market Hours Only - No hydration after hours, Finnhub won't return data)
-            # Hydration only during extended hours (4 AM - 8 PM) when there's actual trading activity
-            # UPDATE: Allow hydration if cache is empty, even on weekends (to show Friday's data)
-            # BYPASS: Always scan during extended hours (until 8 PM) to show late prints
-            whales_needs_hydration = not CACHE.get("whales", {}).get("data")
-            can_hydrate_whales = is_extended_hours or (whales_needs_hydration and is_weekend)
-            
-            if is_market_open or can_hydrate_whales:
-                start_time = time.time()
-                
-                # Use Polygon scanning (Simplified to Polygon-only per user request)
-                try:
-                    new_whales = scan_whales_polygon()
-                    
-                    if new_whales:
-                        # UPDATE CACHE (Atomic)
-                        with CACHE_LOCK:
-                            current_data = CACHE["whales"]["data"]
-                            updated_data = current_data + new_whales
-                            updated_data.sort(key=lambda x: x['timestamp'], reverse=True)
-                            
-                            # Apply 30 DTE Filter Globally
-                            tz_eastern = pytz.timezone('US/Eastern')
-                            now_et = datetime.now(tz_eastern)
-                            filtered_whales = []
-                            for w in updated_data:
-                                try:
-                                    expiry = w.get("expirationDate")
-                                    if expiry:
-                                        expiry_date = datetime.strptime(expiry, "%Y-%m-%d").date()
-                                        days_to_expiry = (expiry_date - now_et.date()).days
-                                        if days_to_expiry <= 30:
-                                            filtered_whales.append(w)
-                                except:
-                                    pass
-                            
-                            CACHE["whales"]["data"] = filtered_whales[:50]
-                            CACHE["whales"]["timestamp"] = time.time()
-                            
-                            # Update 30 DTE Cache (Same data)
-                            CACHE["whales_30dte"]["data"] = filtered_whales[:200]
-                            CACHE["whales_30dte"]["timestamp"] = time.time()
-                        
-                        print(f"✅ Added {len(new_whales)} new whales to feed (Polygon Only).")
-                        save_whale_cache()
-                        
-                except Exception as e:
-                    print(f"⚠️ Polygon Whale Scan Error: {e}")
-
-                duration = time.time() - start_time
-                if duration > 1:
-                    print(f"🐢 Whale Scan took {duration:.2f}s for {len(WHALE_WATCHLIST)} symbols", flush=True)
-                
-                # CRITICAL: Sleep to prevent hammering APIs (30s for Alpaca rate limit sustainability)
-                time.sleep(30)
-            else:
-                # If market closed AND cache populated, stop polling whales/gamma
-                # Just sleep and check News/Heatmap occasionally
-                
-                # PRE-MARKET WAKEUP: If it's 9:25-9:30 AM, sleep only 1s to catch the open
-                is_pre_market_wakeup = is_weekday and (now.hour == 9 and now.minute >= 25)
-
-                sleep_time = 1 if is_pre_market_wakeup else 60
-                time.sleep(sleep_time)
+        register_jobs(BACKGROUND_SCHEDULER)
+        BACKGROUND_SCHEDULER.run()
 
     t = threading.Thread(target=worker, daemon=True)
     t.start()
@@ -4843,6 +5259,232 @@ def calculate_moneyness(strike, current_price, contract_type):
     return "OTM"
 
 
+# === LIBRARY QUOTE MATCHING ===
+# Fish Finder side labels need the NBBO in force at each historical trade. Instead of
+# one /v3/quotes call per trade, a contract's trade times are merged into windows and
+# each window's quotes are streamed once (ascending, paginated) and as-of joined.
+LIBRARY_QUOTE_LOOKBACK_NS = 900_000_000_000  # 15 min: older quotes don't count as the trade's NBBO
+LIBRARY_QUOTE_PAGE_LIMIT = int(os.environ.get("LIBRARY_QUOTE_PAGE_LIMIT", "10000"))
+LIBRARY_QUOTE_MAX_PAGES = 20  # per window; dense windows fall back to per-trade lookups
+LIBRARY_QUOTE_STATS = {
+    "contracts": 0, "trades": 0, "windows": 0, "pages": 0, "quotes": 0,
+    "truncated_windows": 0, "single_lookups": 0, "errors": 0
+}
+
+def iter_massive_quotes(massive_ticker, start_ns, end_ns, max_pages, page_stats):
+    """
+    Yield quotes for one contract in [start_ns, end_ns], oldest first, following next_url.
+    Sets page_stats["truncated"] if it stopped early (page budget or upstream error).
+    """
+    url = f"https://api.massive.com/v3/quotes/{massive_ticker}"
+    params = {
+        "apiKey": MASSIVE_API_KEY,
+        "timestamp.gte": start_ns,
+        "timestamp.lte": end_ns,
+        "order": "asc",
+        "sort": "timestamp",
+        "limit": LIBRARY_QUOTE_PAGE_LIMIT
+    }
+    pages = 0
+    
+    while url:
+        if pages >= max_pages:
+            page_stats["truncated"] = True
+            return
+        try:
+            resp = http_get(url, params=params, timeout=10)
+            if not resp.ok:
+                raise Exception(f"Status {resp.status_code}")
+            data = resp.json()
+        except Exception as e:
+            print(f"🐟 Quote stream error ({massive_ticker}): {e}")
+            LIBRARY_QUOTE_STATS["errors"] += 1
+            page_stats["truncated"] = True
+            return
+        
+        results = data.get("results") or []
+        pages += 1
+        LIBRARY_QUOTE_STATS["pages"] += 1
+        LIBRARY_QUOTE_STATS["quotes"] += len(results)
+        
+        for quote in results:
+            yield quote
+        
+        # next_url carries the cursor + filters, only the key needs re-adding
+        url = data.get("next_url")
+        params = {"apiKey": MASSIVE_API_KEY}
+
+def fetch_quote_before(massive_ticker, sip_ts):
+    """Most recent quote at or before sip_ts (15 min lookback) - one REST call."""
+    LIBRARY_QUOTE_STATS["single_lookups"] += 1
+    try:
+        quote_resp = http_get(f"https://api.massive.com/v3/quotes/{massive_ticker}", params={
+            "apiKey": MASSIVE_API_KEY,
+            "timestamp.gte": sip_ts - LIBRARY_QUOTE_LOOKBACK_NS,
+            "timestamp.lte": sip_ts,
+            "limit": 1,
+            "order": "desc"  # GET THE MOST RECENT QUOTE BEFORE THE TRADE
+        }, timeout=5)
+        if quote_resp.ok:
+            qs = quote_resp.json().get("results", [])
+            if qs:
+                return qs[0]
+    except Exception as e:
+        LIBRARY_QUOTE_STATS["errors"] += 1
+    return None
+
+def match_trade_quotes(massive_ticker, timestamps):
+    """
+    {sip_ts: quote or None} - the quote in force at each trade timestamp (ns).
+    
+    Overlapping 15 min lookbacks are merged into windows; each window is one
+    paginated quote stream joined against its trades in a single pass, holding
+    one page at a time. A window never gets more pages than it has trades, so it
+    never costs more calls than per-trade lookups; trades past a cut-off stream
+    fall back to fetch_quote_before().
+    """
+    ordered = sorted({ts for ts in timestamps if ts})
+    matches = {}
+    LIBRARY_QUOTE_STATS["contracts"] += 1
+    LIBRARY_QUOTE_STATS["trades"] += len(ordered)
+    
+    for start_ns, end_ns, indexes in quote_windows(ordered, LIBRARY_QUOTE_LOOKBACK_NS):
+        window_ts = [ordered[i] for i in indexes]
+        page_stats = {"truncated": False}
+        max_pages = min(len(window_ts), LIBRARY_QUOTE_MAX_PAGES)
+        quotes = iter_massive_quotes(massive_ticker, start_ns, end_ns, max_pages, page_stats)
+        LIBRARY_QUOTE_STATS["windows"] += 1
+        
+        unresolved = []
+        for i, quote, complete in asof_match(window_ts, quotes, LIBRARY_QUOTE_LOOKBACK_NS):
+            if complete or not page_stats["truncated"]:
+                matches[window_ts[i]] = quote
+            else:
+                unresolved.append(window_ts[i])
+        
+        if unresolved:
+            LIBRARY_QUOTE_STATS["truncated_windows"] += 1
+            for ts in unresolved:
+                matches[ts] = fetch_quote_before(massive_ticker, ts)
+    
+    return matches
+
+# === LIBRARY TRADE LOG ===
+# Per-contract trade log + cursor (see trade_log.py): a repeat scan of a contract
+# fetches only trades newer than the cursor instead of 30 days of history.
+LIBRARY_TRADE_LIMIT = 1000  # Newest trades per contract the library serves (one Massive page)
+LIBRARY_TRADE_LOG = ContractTradeLog(keep=LIBRARY_TRADE_LIMIT)
+LIBRARY_TRADE_STATS = {"full_fetches": 0, "delta_fetches": 0, "delta_trades": 0, "fetch_errors": 0, "unlogged": 0}
+
+def _fetch_massive_trades(massive_ticker, params):
+    """One /v3/trades page, newest first. None on failure."""
+    try:
+        resp = http_get(f"https://api.massive.com/v3/trades/{massive_ticker}", params={
+            "apiKey": MASSIVE_API_KEY,
+            "limit": LIBRARY_TRADE_LIMIT,
+            "order": "desc",
+            **params
+        }, timeout=10)
+        if resp.ok:
+            return resp.json().get("results", [])
+    except Exception as e:
+        print(f"🐟 Trades fetch error ({massive_ticker}): {e}")
+    LIBRARY_TRADE_STATS["fetch_errors"] += 1
+    return None
+
+def fetch_library_trades(massive_ticker, start_ns):
+    """
+    Newest LIBRARY_TRADE_LIMIT trades at/after start_ns, newest first - the same
+    list one /v3/trades?timestamp.gte=start&order=desc&limit=1000 call returns.
+    
+    The log holds every trade in [since, cursor]. If that covers start_ns (or
+    already has a full page of trades) only trades after the cursor are fetched
+    and appended; a full delta page means more arrived than we can serve, so the
+    log restarts from it. Otherwise it's one full fetch that seeds the log.
+    """
+    with LIBRARY_TRADE_LOG.locked(massive_ticker) as owner:
+        if not owner:
+            # Another worker is updating this contract right now - plain fetch
+            LIBRARY_TRADE_STATS["unlogged"] += 1
+            return _fetch_massive_trades(massive_ticker, {"timestamp.gte": start_ns}) or []
+        
+        meta = LIBRARY_TRADE_LOG.meta(massive_ticker)
+        if meta and (meta["since"] <= start_ns or meta["count"] >= LIBRARY_TRADE_LIMIT):
+            delta = _fetch_massive_trades(massive_ticker, {"timestamp.gt": meta["cursor"]})
+            if delta is not None:
+                LIBRARY_TRADE_STATS["delta_fetches"] += 1
+                LIBRARY_TRADE_STATS["delta_trades"] += len(delta)
+                if len(delta) >= LIBRARY_TRADE_LIMIT:
+                    LIBRARY_TRADE_LOG.replace(massive_ticker, delta, since=meta["cursor"])
+                else:
+                    LIBRARY_TRADE_LOG.append(massive_ticker, delta)
+            # On a failed delta the log is still correct up to its cursor - serve it
+            trades = LIBRARY_TRADE_LOG.read(massive_ticker)
+        else:
+            trades = _fetch_massive_trades(massive_ticker, {"timestamp.gte": start_ns})
+            if trades is None:
+                return []
+            LIBRARY_TRADE_STATS["full_fetches"] += 1
+            LIBRARY_TRADE_LOG.replace(massive_ticker, trades, since=start_ns)
+            return trades
+    
+    newest_first = [t for t in reversed(trades) if (t.get("sip_timestamp") or 0) >= start_ns]
+    return newest_first[:LIBRARY_TRADE_LIMIT]
+
+# === LIBRARY RESULT CACHE ===
+# One entry per filter combination, bounded per worker (LRU + 5 min TTL + byte cap).
+# A narrower query (type, expiry bucket, ATM, higher min size/premium) is answered by
+# filtering a cached wider result when that result saw the whole chain.
+LIBRARY_CACHE = BoundedCache(
+    "library",
+    max_entries=int(os.environ.get("LIBRARY_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(os.environ.get("LIBRARY_CACHE_MAX_MB", "48")) * 1024 * 1024,
+    ttl=300
+)
+LIBRARY_CHAIN_LIMIT = 250  # snapshot page size; a full page means the chain may be cut off
+
+def library_query_covers(wide, narrow):
+    """True if every trade the narrow query returns is in the wide query's result."""
+    if not wide.get("complete") or wide["symbol"] != narrow["symbol"] or wide["today"] != narrow["today"]:
+        return False
+    if wide["today_only"] != narrow["today_only"]:
+        return False
+    if wide["type"] not in ("all", narrow["type"]) or wide["expiry"] not in ("all", narrow["expiry"]):
+        return False
+    if wide["moneyness"] != narrow["moneyness"] and not (
+            wide["moneyness"] == "all" and narrow["moneyness"] == "atm" and wide["current_price"]):
+        return False
+    return wide["min_size"] <= narrow["min_size"] and wide["min_premium"] <= narrow["min_premium"]
+
+def derive_library_result(data, wide, narrow):
+    """Filter a cached wide result down to the narrow query's filters."""
+    today = date.fromisoformat(narrow["today"])
+    expiry_bounds = {
+        "near": (None, today + timedelta(days=7)),
+        "mid": (today + timedelta(days=7), today + timedelta(days=45)),
+        "far": (today + timedelta(days=45), None)
+    }
+    lo, hi = expiry_bounds.get(narrow["expiry"], (None, None)) if narrow["expiry"] != wide["expiry"] else (None, None)
+    lo, hi = lo and lo.strftime("%Y-%m-%d"), hi and hi.strftime("%Y-%m-%d")
+    
+    strike_lo = strike_hi = None
+    if narrow["moneyness"] != wide["moneyness"]:  # all -> atm
+        strike_lo = round(wide["current_price"] * 0.99, 2)
+        strike_hi = round(wide["current_price"] * 1.01, 2)
+    
+    trades = []
+    for t in data["data"]:
+        if narrow["type"] != "all" and t["type"] != narrow["type"].upper():
+            continue
+        if (lo and t["expiry"] < lo) or (hi and t["expiry"] > hi):
+            continue
+        if strike_lo is not None and not (strike_lo <= t["strike"] <= strike_hi):
+            continue
+        if t["size"] < narrow["min_size"] or t["premium"] < narrow["min_premium"]:
+            continue
+        trades.append(t)
+    return {"data": trades, "current_price": data["current_price"]}
+
 @app.route('/api/library/options')
 def api_library_options():
     """
@@ -4869,78 +5511,36 @@ def api_library_options():
     min_premium_filter = request.args.get('minPremium', '50000') # Default to 50k Global Rule
     today_only = request.args.get('today_only') == 'true'
     
-    # Cache Key - Include all filter params to ensure filtered results aren't cached together
-    current_time = time.time()
+    # Parsed once here - cache key, query and both scan paths use the ints
+    try:
+        min_size = int(min_size_filter)
+        min_premium = int(min_premium_filter)
+    except ValueError:
+        return jsonify({"error": "minSize and minPremium must be whole numbers"}), 400
+    if min_size < 0 or min_premium < 0:
+        return jsonify({"error": "minSize and minPremium must not be negative"}), 400
     
     # === SPECIAL HANDLING FOR "ALL" (Global Feed from Cache) ===
     if symbol.upper() == "ALL":
         try:
-            # 1. Get Base Data from Whales Cache
-            base_data = CACHE.get("whales", {}).get("data", [])
+            # 1. Get Base Data from Whales Cache (indexed)
+            index = whale_index("whales")
             
             # 2. Exclude ETFs (stocks only)
             ETF_EXCLUDE = ['SPY', 'QQQ', 'IWM', 'DIA', 'EWZ', 'PBR', 'FXI', 'XLF', 'XLE', 'XLK', 'SMH', 'ARKK', 'VXX', 'UVXY', 'TQQQ', 'SQQQ']
-            
-            filtered_data = []
-            for trade in base_data:
-                # Whale cache uses 'baseSymbol' for underlying ticker
-                underlying = trade.get('baseSymbol') or trade.get('ticker', '')
-                
-                # Ticker Filter (No ETFs)
-                if underlying in ETF_EXCLUDE:
-                    continue
-                
-                # Get raw premium (notional_value is the raw number)
-                raw_premium = trade.get('notional_value', 0) or 0
-                raw_size = trade.get('volume', 0) or trade.get('size', 0) or 0
-                    
-                # Apply User Filters
-                
-                # Minimum Premium
-                if raw_premium < int(min_premium_filter):
-                    continue
-                    
-                # Minimum Size
-                if raw_size < int(min_size_filter):
-                    continue
-                    
-                # Map putCall (C/P) to type (CALL/PUT)
-                put_call = trade.get('putCall', '')
-                trade_type = 'CALL' if put_call == 'C' else 'PUT' if put_call == 'P' else trade.get('type', '')
-                    
-                # Type Filter
-                if type_filter != 'all':
-                    if trade_type.lower() != type_filter.lower():
-                        continue
-                        
-                # Moneyness Filter
-                if money_filter != 'all':
-                    if trade.get('moneyness', '').lower() != money_filter.lower():
-                        continue
-
-                # Transform whale cache format → Fish Finder format
-                fish_trade = {
-                    "ticker": underlying,
-                    "strike": trade.get('strikePrice', 0) or trade.get('strike', 0),
-                    "type": trade_type,
-                    "expiry": trade.get('expirationDate', '') or trade.get('expiry', ''),
-                    "premium": raw_premium,
-                    "size": raw_size,
-                    "price": trade.get('lastPrice', 0) or trade.get('price', 0),
-                    "timestamp": trade.get('timestamp', 0),
-                    "timeStr": trade.get('tradeTime', '') or trade.get('timeStr', 'N/A'),
-                    "moneyness": trade.get('moneyness', ''),
-                    "side": trade.get('side', 'NEUTRAL'),
-                    "bid": trade.get('bid', 0),
-                    "ask": trade.get('ask', 0),
-                    "delta": trade.get('delta', 0),
-                    "is_sweep": trade.get('is_sweep', False),
-                    "is_mega_whale": trade.get('is_mega_whale', False),
-                    "is_lotto": abs(float(trade.get('delta', 0) or 0)) < 0.20,
-                    "notional_value": raw_premium,
-                }
-
-                filtered_data.append(fish_trade)
+            mask = index.all & ~index.ticker_mask(ETF_EXCLUDE)
+            
+            # Type / Moneyness Filters are bitset lookups
+            if type_filter != 'all':
+                mask &= index.types.get(type_filter.lower(), 0)
+            if money_filter != 'all':
+                mask &= index.moneyness.get(money_filter.lower(), 0)
+            
+            # Premium / Size thresholds on the records, then one transform to the Fish Finder shape
+            filtered_data = [
+                trade.to_fish() for trade in index.select(mask)
+                if (trade.notional or 0) >= min_premium and (trade.volume or 0) >= min_size
+            ]
             
             return jsonify({"data": filtered_data, "current_price": 0})
             
@@ -4950,16 +5550,27 @@ def api_library_options():
             traceback.print_exc()
             return jsonify({"data": []})
 
-    cache_key = f"library_massive_{symbol}_type{type_filter}_exp{expiry_filter}_mon{money_filter}_size{min_size_filter}_prem{min_premium_filter}_today{today_only}_v3"
+    # Cache Key - Include all filter params to ensure filtered results aren't cached together
+    cache_key = f"library_massive_{symbol}_type{type_filter}_exp{expiry_filter}_mon{money_filter}_size{min_size}_prem{min_premium}_today{today_only}_v3"
+    
+    query = {
+        "symbol": symbol,
+        "type": type_filter,
+        "expiry": expiry_filter,
+        "moneyness": money_filter,
+        "min_size": min_size,
+        "min_premium": min_premium,
+        "today_only": today_only,
+        "today": datetime.now().date().isoformat()
+    }
     
-    global LIBRARY_CACHE
-    if 'LIBRARY_CACHE' not in globals():
-        LIBRARY_CACHE = {}
-        
-    if cache_key in LIBRARY_CACHE:
-        cached = LIBRARY_CACHE[cache_key]
-        if current_time - cached['timestamp'] < 300:  # 5 min cache
-            return jsonify(cached['data'])
+    cached = LIBRARY_CACHE.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+    
+    wider = LIBRARY_CACHE.find(lambda meta: library_query_covers(meta, query))
+    if wider is not None:
+        return jsonify(derive_library_result(wider[0], wider[1], query))
 
     try:
         tz_eastern = pytz.timezone('US/Eastern')
@@ -4969,7 +5580,7 @@ def api_library_options():
         current_price = 0
         try:
             price_url = f"https://api.massive.com/v2/last/trade/{symbol}"
-            price_resp = requests.get(price_url, params={"apiKey": MASSIVE_API_KEY}, timeout=5)
+            price_resp = http_get(price_url, params={"apiKey": MASSIVE_API_KEY}, timeout=5)
             if price_resp.ok:
                 price_data = price_resp.json()
                 current_price = float(price_data.get("results", {}).get("price", 0) or 
@@ -4985,10 +5596,10 @@ def api_library_options():
         chain_url = f"https://api.massive.com/v3/snapshot/options/{symbol}"
         
         # Base Params (filter vars defined above for cache key)
-        params = {"apiKey": MASSIVE_API_KEY, "limit": 250}
+        params = {"apiKey": MASSIVE_API_KEY, "limit": LIBRARY_CHAIN_LIMIT}
         
         # User-selected MIN QTY filter (50, 100, or 250)
-        params["size.gte"] = int(min_size_filter)
+        params["size.gte"] = min_size
         
         # 1. EXPIRY FILTER
         if expiry_filter != 'all':
@@ -5034,10 +5645,10 @@ def api_library_options():
                     if ctype == 'call': p["strike_price.lte"] = current_price
                     if ctype == 'put':  p["strike_price.gte"] = current_price
                     
-                r = requests.get(chain_url, params=p, timeout=15)
+                r = http_get(chain_url, params=p, timeout=15)
                 if r.ok: return r.json().get("results", [])
             except: pass
-            return []
+            return None  # Failed (vs [] = no contracts) - result can't be reused for narrower queries
 
         import concurrent.futures
         # Execute Fetch based on Type Filter
@@ -5049,8 +5660,12 @@ def api_library_options():
              if type_filter in ['all', 'put']:
                  futures.append(executor.submit(fetch_chain_type, "put"))
              
+             chain_complete = True
              for f in concurrent.futures.as_completed(futures):
-                 results.extend(f.result() or [])
+                 chunk = f.result()
+                 if chunk is None or len(chunk) >= LIBRARY_CHAIN_LIMIT:
+                     chain_complete = False
+                 results.extend(chunk or [])
         
         if not results:
             return jsonify({"error": f"No options found for {symbol}"}), 404
@@ -5102,8 +5717,8 @@ def api_library_options():
         print(f"🐟 Massive: Found {len(valid_contracts)} contracts for {symbol} (0-30 DTE)")
         
         # 4. Fetch trades for contracts (batch in parallel)
-        MIN_PREMIUM = int(min_premium_filter) 
-        MIN_SIZE = int(min_size_filter)  # User-selected min contracts (50, 100, or 250)
+        MIN_PREMIUM = min_premium
+        MIN_SIZE = min_size  # User-selected min contracts (50, 100, or 250)
         print(f"🐟 MIN_SIZE filter set to: {MIN_SIZE} (from min_size_filter={min_size_filter})")
         
         if today_only:
@@ -5113,6 +5728,8 @@ def api_library_options():
         else:
              # Standard: 30 days history
              start_date = (now_et - timedelta(days=30)).strftime("%Y-%m-%d")
+        # Midnight ET of start_date in ns (trade log cursors are sip_timestamps)
+        start_ns = int(tz_eastern.localize(datetime.strptime(start_date, "%Y-%m-%d")).timestamp()) * 1_000_000_000
         
         def fetch_contract_trades(contract_info):
             """Fetch trades for a single contract from Massive"""
@@ -5126,19 +5743,8 @@ def api_library_options():
                 # Ensure O: prefix for Massive
                 massive_ticker = ticker if ticker.startswith("O:") else f"O:{ticker}"
                 
-                trades_url = f"https://api.massive.com/v3/trades/{massive_ticker}"
-                trades_resp = requests.get(trades_url, params={
-                    "apiKey": MASSIVE_API_KEY,
-                    "timestamp.gte": start_date,
-                    "limit": 1000,
-                    "order": "desc"
-                }, timeout=10)
-                
-                if not trades_resp.ok:
-                    return []
-                
-                trades_data = trades_resp.json()
-                raw_trades = trades_data.get("results", [])
+                # Newest 1000 trades since start - only the delta past the log cursor hits Massive
+                raw_trades = fetch_library_trades(massive_ticker, start_ns)
                 
                 if not raw_trades:
                     return []
@@ -5160,11 +5766,9 @@ def api_library_options():
                     return []
                 # --- OPTIMIZATION END ---
 
-                # --- OPTIMIZATION START ---
-                # Get historical quotes bounded by ACTUAL trade timestamps
-                # INSTEAD of pulling 1.5 million quotes into RAM, we loop over the trades and pull ONE quote per trade.
-                # This drops memory usage per contract from ~150MB down to <1MB.
-                quote_cache = {} # Cache in case multiple trades hit the exact same nanosecond
+                # NBBO at each trade: one as-of joined quote stream per window of trades
+                # (see LIBRARY QUOTE MATCHING) instead of one /v3/quotes call per trade
+                quote_at = match_trade_quotes(massive_ticker, [t.get("sip_timestamp", 0) for t in relevant_trades])
 
                 contract_delta = float(greeks.get("delta", 0) or 0)
                 
@@ -5184,33 +5788,7 @@ def api_library_options():
                         timestamp = 0
                         trade_time_display = "N/A"
                         
-                    # Fetch ONE quote immediately preceding the trade timestamp
-                    matched_quote = None
-                    if sip_ts:
-                        if sip_ts in quote_cache:
-                            matched_quote = quote_cache[sip_ts]
-                        else:
-                            try:
-                                quote_url = f"https://api.massive.com/v3/quotes/{massive_ticker}"
-                                start_window = sip_ts - 900_000_000_000 # Look back up to 15 mins
-                                quote_resp = requests.get(quote_url, params={
-                                    "apiKey": MASSIVE_API_KEY,
-                                    "timestamp.gte": start_window,
-                                    "timestamp.lte": sip_ts,
-                                    "limit": 1, 
-                                    "order": "desc" # GET THE MOST RECENT QUOTE BEFORE THE TRADE
-                                }, timeout=5)
-                                
-                                if quote_resp.ok:
-                                    qs = quote_resp.json().get("results", [])
-                                    if qs:
-                                        matched_quote = qs[0]
-                                        quote_cache[sip_ts] = matched_quote
-                            except Exception as e:
-                                pass
-                    
-                    # Find the quote at the time of this trade
-                    # matched_quote populated above
+                    matched_quote = quote_at.get(sip_ts) if sip_ts else None
                     
                     bid, ask = 0, 0
                     quote_matched = False
@@ -5360,11 +5938,9 @@ def api_library_options():
         
         print(f"🐟 Massive: Returning {len(all_trades)} trades for {symbol}")
         
-        # Cache result
-        LIBRARY_CACHE[cache_key] = {
-            "timestamp": current_time,
-            "data": {"data": all_trades, "current_price": current_price}
-        }
+        # Cache result (meta lets narrower queries filter it instead of refetching)
+        LIBRARY_CACHE.set(cache_key, {"data": all_trades, "current_price": current_price},
+                          meta=dict(query, complete=chain_complete, current_price=current_price))
         
         return jsonify({"data": all_trades, "current_price": current_price})
 
@@ -5403,9 +5979,9 @@ def demo_stream():
                 current_sweeps = list(SWEEP_CACHE)
             
             # Sort valid trades
-            current_sweeps.sort(key=lambda x: x['timestamp'], reverse=True)
+            current_sweeps.sort(key=lambda x: x.timestamp, reverse=True)
             
-            yield f"data: {json.dumps({'data': current_sweeps})}\n\n"
+            yield f"data: {json.dumps({'data': [sweep.to_dict() for sweep in current_sweeps]})}\n\n"
             
             time.sleep(1) # Fast update for demo
 
@@ -5434,7 +6010,7 @@ def get_fish_history(optionsTicker):
         
         # print(f"🐟 Fetching Fish: {url} | Params: {params}")
 
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_get(url, params=params, timeout=10)
         
         if resp.ok:
             return jsonify(resp.json())
@@ -5463,7 +6039,7 @@ def get_fish_quotes(optionsTicker):
         params = request.args.to_dict()
         params['apiKey'] = MASSIVE_API_KEY 
         
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_get(url, params=params, timeout=10)
         
         if resp.ok:
             return jsonify(resp.json())
@@ -5490,7 +6066,7 @@ def get_fish_trades_enriched(optionsTicker):
         params = request.args.to_dict()
         params['apiKey'] = MASSIVE_API_KEY
         
-        trades_resp = requests.get(trades_url, params=params, timeout=10)
+        trades_resp = http_get(trades_url, params=params, timeout=10)
         if not trades_resp.ok:
             return jsonify({"error": "Failed to fetch trades"}), trades_resp.status_code
         
@@ -5512,7 +6088,7 @@ def get_fish_trades_enriched(optionsTicker):
                 quotes_params["timestamp.gte"] = min(first_ts, last_ts) - 60000  # 1 min before
                 quotes_params["timestamp.lte"] = max(first_ts, last_ts) + 60000  # 1 min after
         
-        quotes_resp = requests.get(quotes_url, params=quotes_params, timeout=10)
+        quotes_resp = http_get(quotes_url, params=quotes_params, timeout=10)
         quotes = quotes_resp.json().get("results", []) if quotes_resp.ok else []
         
         # 3. Build quote lookup (by timestamp)
@@ -0,0 +1,134 @@
+"""
+Scan Engine - Bounded-concurrency fan-out for per-symbol scans
+
+Replaces serial "for symbol in WATCHLIST: fetch(); sleep()" loops:
+1. Runs one task per symbol on a gevent pool (bounded by `concurrency`)
+2. Yields each result as soon as its symbol finishes (caller streams into CACHE)
+3. Records per-symbol latency + errors for the debug endpoints
+4. merge_streams() drains several page generators concurrently (e.g. call/put chains)
+
+Upstream rate limits are enforced by http_client's per-vendor budget,
+so concurrency here only bounds in-flight sockets/greenlets.
+"""
+
+import threading
+import time
+
+from gevent.pool import Pool
+from gevent.queue import Queue
+
+
+class ScanStats:
+    """Latency/error bookkeeping for one named scan (e.g. 'whales')."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.passes = 0
+        self.last_pass = {}
+        self.symbols = {}  # {symbol: {"last_ms", "max_ms", "runs", "errors", "last_error"}}
+
+    def record_symbol(self, symbol, elapsed_ms, error=None):
+        with self.lock:
+            entry = self.symbols.setdefault(symbol, {"last_ms": 0, "max_ms": 0, "runs": 0, "errors": 0, "last_error": None})
+            entry["runs"] += 1
+            entry["last_ms"] = round(elapsed_ms, 1)
+            entry["max_ms"] = round(max(entry["max_ms"], elapsed_ms), 1)
+            if error is not None:
+                entry["errors"] += 1
+                entry["last_error"] = str(error)[:200]
+
+    def record_pass(self, symbol_count, wall_ms, concurrency):
+        with self.lock:
+            self.passes += 1
+            self.last_pass = {
+                "symbols": symbol_count,
+                "wall_ms": round(wall_ms, 1),
+                "concurrency": concurrency,
+                "finished_at": time.time()
+            }
+
+    def snapshot(self):
+        with self.lock:
+            slowest = sorted(self.symbols.items(), key=lambda kv: kv[1]["last_ms"], reverse=True)
+            return {
+                "name": self.name,
+                "passes": self.passes,
+                "last_pass": dict(self.last_pass),
+                "symbols": {sym: dict(entry) for sym, entry in slowest}
+            }
+
+
+def fan_out(items, task, concurrency=16, stats=None):
+    """
+    Run task(item) for every item with at most `concurrency` in flight.
+    Yields (item, result, error) in completion order, not input order.
+    A task that raises yields (item, None, exc) instead of killing the pass.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            result, error = task(item), None
+        except Exception as e:
+            result, error = None, e
+        if stats is not None:
+            stats.record_symbol(item, (time.perf_counter() - start) * 1000, error)
+        return item, result, error
+
+    pass_start = time.perf_counter()
+    pool = Pool(max(1, min(concurrency, len(items))))
+    try:
+        for outcome in pool.imap_unordered(timed, items):
+            yield outcome
+    finally:
+        # Consumer stopped early (or raised) - don't leave greenlets running
+        pool.kill(block=False)
+        if stats is not None:
+            stats.record_pass(len(items), (time.perf_counter() - pass_start) * 1000, concurrency)
+
+
+def merge_streams(generators, buffer_size=500):
+    """
+    Drain several generators concurrently, yielding items as they arrive.
+    The bounded queue gives each producer read-ahead (it fetches its next page
+    while the consumer filters the current one) without buffering whole chains.
+    Re-raises the first producer error once every stream has finished.
+    """
+    generators = list(generators)
+    if not generators:
+        return
+
+    queue = Queue(maxsize=buffer_size)
+    end = object()
+    errors = []
+
+    def drain(gen):
+        try:
+            for item in gen:
+                queue.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            queue.put(end)
+
+    pool = Pool(len(generators))
+    for gen in generators:
+        pool.spawn(drain, gen)
+
+    try:
+        remaining = len(generators)
+        while remaining:
+            item = queue.get()
+            if item is end:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        pool.kill(block=False)
+
+    if errors:
+        raise errors[0]
@@ -0,0 +1,277 @@
+"""
+Scheduler - Cooperative job scheduler for the background refresh jobs
+
+The background worker ran Polymarket, bulk prices, heatmap, news, gamma and
+whales one after another in a single loop with ad hoc last_*_update stamps and
+sleeps, so one slow call (or the 30s whale sleep) delayed everything else:
+1. Independent jobs on a small pool of worker threads (the pool size is the
+   concurrency limit); a dispatcher ticks every `tick` seconds and queues jobs
+   that are due
+2. Per-session intervals: intervals={"regular": 120} runs every 120s in the
+   regular session and pauses in every other one; hydrate() forces a run (every
+   `retry` seconds) while the job's cache is still empty
+3. Jitter (fraction of the interval) so jobs sharing an interval don't line up,
+   soft deadlines (a run going past it is logged and counted as an overrun)
+4. A job never overlaps itself: a queued job isn't queued again (time spent
+   waiting for a free worker is start lag), and a run coming due while it is
+   still running is counted as an overlap. Slots that passed before the job
+   could be queued are missed runs, handled per job by `misfire`: "coalesce"
+   runs once right away, "skip" waits for the next slot
+5. anchor="start" keeps a fixed rate, anchor="finish" a fixed gap after each run
+6. A failing job is retried after `retry` seconds; a job can also raise
+   RetryAfter(seconds) to ask for its next run sooner / later
+7. stats(): per job state, run durations, start lag behind schedule (and the
+   part of it spent queued), misses
+"""
+
+import queue
+import random
+import threading
+import time
+
+
+class RetryAfter(Exception):
+    """Raised by a job to be run again after `seconds` (not counted as a failure)."""
+
+    def __init__(self, seconds, reason=""):
+        super().__init__(reason or f"retry in {seconds}s")
+        self.seconds = seconds
+
+
+class Job:
+
+    def __init__(self, name, func, intervals, hydrate=None, when=None, jitter=0.1, deadline=None,
+                 misfire="coalesce", anchor="start", retry=60):
+        self.name = name
+        self.func = func  # Return value is ignored
+        self.intervals = intervals  # seconds, or {session: seconds} (sessions not listed = paused)
+        self.hydrate = hydrate  # hydrate() -> True while the job's data is missing
+        self.when = when  # when() -> False to hold the job (e.g. leader-only jobs on followers)
+        self.jitter = jitter
+        self.deadline = deadline
+        self.misfire = misfire
+        self.anchor_mode = anchor
+        self.retry = retry
+
+        self.queued = False  # Waiting for a worker
+        self.queued_at = 0
+        self.running = False
+        self.paused = True  # Until the first tick finds it schedulable
+        self.resumed_at = 0
+        self.overdue = False
+        self.overlapped = False
+        self.anchor = 0  # Next slot = anchor + wait
+        self.override = None  # One-off wait (retry after a failure / requested by the job)
+        self.jitter_draw = random.random()
+        self.due_at = 0
+        self.slot = 0
+        self.last_start = 0
+        self.last_finish = 0
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.last_error = None
+        self.counters = {"runs": 0, "failures": 0, "overruns": 0, "missed": 0, "skipped": 0, "overlaps": 0}
+
+    def interval(self, session):
+        if isinstance(self.intervals, dict):
+            return self.intervals.get(session)
+        return self.intervals
+
+    def next_due(self, session):
+        """(slot, due_at, interval, hydrating) - due_at is the slot plus jitter - or None while paused / held."""
+        if self.when is not None and not self.when():
+            return None
+        base = self.interval(session)
+        hydrating = self.hydrate is not None and self.hydrate()
+        if base is None and not hydrating:
+            return None
+        if self.override is not None:
+            return self.anchor + self.override, self.anchor + self.override, base, hydrating
+        if hydrating:
+            slot = self.anchor + (min(base, self.retry) if base else self.retry)
+            return slot, slot, base, hydrating
+        slot = self.anchor + base
+        return slot, slot + base * self.jitter * self.jitter_draw, base, hydrating
+
+
+class Scheduler:
+
+    def __init__(self, session, workers=4, tick=0.5, thread_init=None):
+        self.session = session  # session() -> name of the current market session
+        self.workers = workers
+        self.tick_interval = tick
+        self.thread_init = thread_init  # Called once in each worker thread
+        self.jobs = {}
+        self.ready = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.current_session = None
+        self.ticks = 0
+
+    def add(self, name, func, intervals, **options):
+        job = Job(name, func, intervals, **options)
+        self.jobs[name] = job
+        return job
+
+    def _start_workers(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True, name=f"scheduler-{i}").start()
+
+    def run(self):
+        """Dispatch forever in the calling thread."""
+        self._start_workers()
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Scheduler tick error: {e}")
+            time.sleep(self.tick_interval)
+
+    def tick(self):
+        """Queue every job that is due."""
+        now = time.time()
+        session = self.session()
+        self.current_session = session
+        self.ticks += 1
+        for job in list(self.jobs.values()):
+            try:
+                due = job.next_due(session)
+            except Exception as e:
+                job.last_error = f"schedule: {e}"
+                continue
+            if job.running:
+                if job.deadline and not job.overdue and now - job.last_start > job.deadline:
+                    job.overdue = True
+                    print(f"⏰ Job {job.name} past its {job.deadline}s deadline ({now - job.last_start:.0f}s)", flush=True)
+                if due is not None and not job.overlapped and now >= due[1]:
+                    # Next run came due mid-run - never started twice
+                    job.overlapped = True
+                    job.counters["overlaps"] += 1
+                continue
+            if job.queued:
+                continue  # Already waiting for a worker - the wait shows up as start lag
+            if due is None:
+                job.paused = True
+                continue
+            if job.paused:
+                # Time spent paused / held isn't lag (and no runs were missed)
+                job.paused = False
+                job.resumed_at = now
+            slot, due_at, base, hydrating = due
+            if now < due_at:
+                continue
+            due_at = max(due_at, job.resumed_at)
+            lag = now - due_at
+            if base and job.last_start and job.override is None and not hydrating and lag >= base:
+                job.counters["missed"] += int(lag // base)
+                if job.misfire == "skip":
+                    # Wait for the next slot on the original grid
+                    job.counters["skipped"] += 1
+                    job.anchor = slot + int(lag // base) * base
+                    continue
+            job.queued, job.queued_at = True, now
+            job.slot, job.due_at = slot, due_at
+            self.ready.put(job)
+
+    def _worker(self):
+        if self.thread_init is not None:
+            try:
+                self.thread_init()
+            except Exception as e:
+                print(f"⚠️ Scheduler thread init error: {e}")
+        while True:
+            self._run_job(self.ready.get())
+
+    def _run_job(self, job):
+        start = time.time()
+        job.running = True  # Before clearing queued, so tick never sees the job as idle
+        job.queued = False
+        lag = max(0.0, start - job.due_at)  # Includes the queue wait
+        wait = start - job.queued_at
+        base = job.interval(self.current_session)
+        # Fixed rate: next slot follows this one, unless it's so late the grid moves to now
+        # (anchor="finish" re-anchors when the run ends)
+        on_grid = job.anchor_mode == "start" and base and job.override is None and start - job.slot < base
+        job.anchor = job.slot if on_grid else start
+        job.override = None
+        job.last_start = start
+        job.last_lag = lag
+        job.max_lag = max(job.max_lag, lag)
+        job.last_wait = wait
+        job.max_wait = max(job.max_wait, wait)
+        requested = None
+        try:
+            job.func()
+            job.last_error = None
+        except RetryAfter as retry:
+            requested = retry.seconds
+        except Exception as e:
+            job.counters["failures"] += 1
+            job.last_error = str(e)
+            print(f"Worker Error ({job.name}): {e}")
+            requested = job.retry
+        finish = time.time()
+        duration = finish - start
+        job.counters["runs"] += 1
+        job.last_finish = finish
+        job.last_duration = duration
+        job.total_duration += duration
+        job.max_duration = max(job.max_duration, duration)
+        if job.deadline and duration > job.deadline:
+            job.counters["overruns"] += 1
+        if requested is not None:
+            job.anchor, job.override = finish, requested
+        elif job.anchor_mode == "finish":
+            job.anchor = finish
+        job.jitter_draw = random.random()
+        job.overdue = False
+        job.overlapped = False
+        job.running = False
+
+    def stats(self):
+        now = time.time()
+        session = self.current_session
+        jobs = {}
+        for name, job in self.jobs.items():
+            try:
+                due = None if job.running or job.queued else job.next_due(session)
+            except Exception:
+                due = None
+            state = "running" if job.running else "queued" if job.queued else "paused" if due is None else "waiting"
+            runs = job.counters["runs"]
+            jobs[name] = {
+                **job.counters,
+                "state": state,
+                "interval_s": job.interval(session),
+                "next_in_s": round(max(0.0, due[1] - now), 1) if due else None,
+                "last_run_ago_s": round(now - job.last_start, 1) if job.last_start else None,
+                "running_for_s": round(now - job.last_start, 1) if job.running else None,
+                "queued_for_s": round(now - job.queued_at, 1) if job.queued else None,
+                "duration_ms": {
+                    "last": round(job.last_duration * 1000, 1),
+                    "avg": round(job.total_duration / runs * 1000, 1) if runs else 0,
+                    "max": round(job.max_duration * 1000, 1)
+                },
+                "lag_ms": {"last": round(job.last_lag * 1000, 1), "max": round(job.max_lag * 1000, 1)},
+                "queue_wait_ms": {"last": round(job.last_wait * 1000, 1), "max": round(job.max_wait * 1000, 1)},
+                "deadline_s": job.deadline,
+                "misfire": job.misfire,
+                "last_error": job.last_error
+            }
+        return {
+            "session": session,
+            "workers": self.workers,
+            "queued": self.ready.qsize(),
+            "running": sum(1 for job in self.jobs.values() if job.running),
+            "ticks": self.ticks,
+            "jobs": jobs
+        }
@@ -0,0 +1,222 @@
+"""
+Session Cache - Verified Firebase tokens + per-user subscription state
+
+/api/subscription-status ran firebase_auth.verify_id_token and a users/{uid}
+Firestore get (5s timeout) on every page load:
+1. TokenCache: sha256(token) -> decoded claims until the token's own exp (minus
+   skew). Raw tokens are never stored and failed verifications aren't cached
+2. SubscriptionCache: uid -> user doc fields, fetched once and kept until a
+   Stripe webhook changes that user (ttl is only a safety net)
+3. Webhooks call apply(email, fields): the fields go to a small per-email marker
+   file in the shared cache dir, so every gunicorn worker overlays them on its
+   cached entry (one stat per lookup) - also before the write-behind Firestore
+   update has landed. A marker only matters until `grace` past the next refetch,
+   so markers older than ttl + grace are deleted (on lookup, and by a sweep in
+   apply() at most once per ttl) and each worker keeps at most max_entries parsed
+4. If a refresh fails while a cached entry exists, the stale entry is served
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class TokenCache:
+
+    def __init__(self, verify, max_entries=10000, skew=30):
+        self.verify_token = verify  # verify(token) -> decoded claims (raises if invalid)
+        self.max_entries = max_entries
+        self.skew = skew
+        self.entries = OrderedDict()  # {sha256(token): (claims, expires)}, least recently used first
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "failures": 0}
+
+    def verify(self, token):
+        """Decoded claims for token (cached until it expires); raises like verify()."""
+        key = _digest(token)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return entry[0]
+                del self.entries[key]
+                self.counters["expired"] += 1
+            self.counters["misses"] += 1
+        try:
+            claims = self.verify_token(token)
+        except Exception:
+            self.counters["failures"] += 1
+            raise
+        expires = claims.get("exp", 0) - self.skew
+        if expires > now:
+            with self.lock:
+                self.entries[key] = (claims, expires)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.counters["evicted"] += 1
+        return claims
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self.entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0
+        return counters
+
+
+class SubscriptionCache:
+
+    def __init__(self, fetch, directory, ttl=600, grace=60, max_entries=10000):
+        self.fetch = fetch  # fetch(uid) -> user doc dict, or None if there is no doc (raises on errors)
+        self.directory = directory  # Shared by all workers (marker files)
+        self.ttl = ttl
+        self.grace = grace  # A marker up to this old still wins over a fetch (write-behind lag)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {uid: (doc, fetched_at)}, least recently used first
+        self.markers = OrderedDict()  # {marker path: (mtime, fields)} parsed marker files, least recently used first
+        self.swept_at = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0, "fetches": 0, "stale_served": 0, "overlays": 0, "applied": 0, "evicted": 0,
+            "markers_expired": 0
+        }
+
+    def _marker_max_age(self):
+        return self.ttl + self.grace
+
+    def _marker_path(self, email):
+        return os.path.join(self.directory, f"subscription_{_digest(email.lower().strip())}.json")
+
+    def apply(self, email, fields):
+        """Record a webhook-driven change for email so every worker serves it right away."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_subscription_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(fields, f)
+            os.replace(tmp_path, self._marker_path(email))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.counters["applied"] += 1
+        if time.time() - self.swept_at > self.ttl:
+            self.sweep()
+
+    def _expire_marker(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            return  # Already gone (another worker's sweep)
+        self.counters["markers_expired"] += 1
+
+    def sweep(self):
+        """Delete marker files older than ttl + grace; returns how many were removed."""
+        self.swept_at = now = time.time()
+        before = self.counters["markers_expired"]
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            if not (entry.name.startswith("subscription_") and entry.name.endswith(".json")):
+                continue
+            try:
+                expired = now - entry.stat().st_mtime > self._marker_max_age()
+            except OSError:
+                continue
+            if expired:
+                self._expire_marker(entry.path)
+        with self.lock:
+            for path in [path for path, (mtime, _) in self.markers.items() if now - mtime > self._marker_max_age()]:
+                del self.markers[path]
+        return self.counters["markers_expired"] - before
+
+    def _marker(self, email):
+        """(mtime, fields) of email's marker, or None."""
+        if not email:
+            return None
+        path = self._marker_path(email)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            with self.lock:
+                self.markers.pop(path, None)
+            return None
+        if time.time() - mtime > self._marker_max_age():
+            # Entries refetch within ttl, so none can still be within grace of it
+            with self.lock:
+                self.markers.pop(path, None)
+            self._expire_marker(path)
+            return None
+        with self.lock:
+            cached = self.markers.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.markers.move_to_end(path)
+                return cached
+        try:
+            with open(path) as f:
+                marker = (mtime, json.load(f))
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.markers[path] = marker
+            self.markers.move_to_end(path)
+            while len(self.markers) > self.max_entries:
+                self.markers.popitem(last=False)
+        return marker
+
+    def get(self, uid, email=None):
+        """User doc fields for uid (None if the user has no doc), webhook changes applied."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(uid)
+            if entry is not None:
+                self.entries.move_to_end(uid)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.counters["hits"] += 1
+            doc, fetched_at = entry
+        else:
+            try:
+                doc = self.fetch(uid)
+                fetched_at = now
+                self.counters["fetches"] += 1
+            except Exception:
+                if entry is None:
+                    raise
+                self.counters["stale_served"] += 1
+                doc, fetched_at = entry
+            else:
+                with self.lock:
+                    self.entries[uid] = (doc, fetched_at)
+                    self.entries.move_to_end(uid)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                        self.counters["evicted"] += 1
+
+        marker = self._marker(email)
+        if doc is not None and marker is not None and marker[0] > fetched_at - self.grace:
+            self.counters["overlays"] += 1
+            doc = {**doc, **marker[1]}
+        return doc
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self.entries)
+            counters["markers"] = len(self.markers)
+        counters["ttl"] = self.ttl
+        return counters
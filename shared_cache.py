@@ -0,0 +1,146 @@
+"""
+Shared Cache - Cross-worker cache tier + leader election
+
+Gunicorn runs several workers, each with its own CACHE dict. Instead of every
+worker polling Polygon/Polymarket/RSS/yfinance on its own:
+1. LeaderLock: one worker holds an exclusive flock and runs the refresh loop
+2. SharedStore.publish(): the leader writes each cache entry to a file in
+   /dev/shm (tmpfs, falls back to /tmp) via write-temp + atomic rename
+3. SharedStore.load_changed(): followers stat the files and only unpickle the
+   entries whose mtime moved since their last sync
+
+If the leader dies its flock is released by the kernel and the next follower
+to call try_acquire() takes over.
+"""
+
+import fcntl
+import os
+import pickle
+import tempfile
+import threading
+
+ENTRY_SUFFIX = ".pkl"
+
+
+def default_shared_dir():
+    """Per-port directory so two local servers don't read each other's data."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.environ.get("SHARED_CACHE_DIR") or os.path.join(base, f"pigmentos_{os.environ.get('PORT', 'dev')}")
+
+
+class SharedStore:
+    """Key -> pickled value files, written atomically, read with mtime memoization."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_shared_dir()
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self.lock = threading.Lock()
+        self.seen = {}  # {key: mtime_ns} last version loaded by this process
+        self.published = 0
+        self.loaded = 0
+        self.errors = 0
+
+    def _path(self, key):
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+        return os.path.join(self.directory, safe + ENTRY_SUFFIX)
+
+    def publish(self, key, value):
+        """Write value under key. Readers never see a half-written file."""
+        path = self._path(key)
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except Exception:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            with self.lock:
+                self.published += 1
+                # Our own write shouldn't bounce back as a change
+                self.seen[key] = os.stat(path).st_mtime_ns
+            return True
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            print(f"⚠️ Shared cache publish failed ({key}): {e}")
+            return False
+
+    def load_changed(self):
+        """Return {key: value} for every entry written since this process last loaded it."""
+        changed = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return changed
+
+        for entry in entries:
+            if not entry.name.endswith(ENTRY_SUFFIX) or entry.name.startswith("."):
+                continue
+            key = entry.name[:-len(ENTRY_SUFFIX)]
+            try:
+                mtime = entry.stat().st_mtime_ns
+                if self.seen.get(key) == mtime:
+                    continue
+                with open(entry.path, "rb") as f:
+                    changed[key] = pickle.load(f)
+                with self.lock:
+                    self.seen[key] = mtime
+                    self.loaded += 1
+            except FileNotFoundError:
+                continue  # Replaced between scandir and open, next sync picks it up
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                print(f"⚠️ Shared cache load failed ({key}): {e}")
+        return changed
+
+    def stats(self):
+        with self.lock:
+            return {
+                "directory": self.directory,
+                "keys": len(self.seen),
+                "published": self.published,
+                "loaded": self.loaded,
+                "errors": self.errors
+            }
+
+
+class LeaderLock:
+    """Non-blocking exclusive flock. Held for the life of the process once acquired."""
+
+    def __init__(self, directory=None, name="leader.lock"):
+        directory = directory or default_shared_dir()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.path = os.path.join(directory, name)
+        self.fd = None
+
+    @property
+    def is_leader(self):
+        return self.fd is not None
+
+    def try_acquire(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    def holder_pid(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
@@ -0,0 +1,91 @@
+"""
+Single-Flight - Coalesce concurrent calls for the same key into one execution
+
+When N requests miss the same cache key at once, only the first runs the
+upstream fetch; the rest wait for (do) or skip (start) that one call:
+1. do(key, fn): run fn once per key, concurrent callers share its result
+2. start(key, fn): fire-and-forget background refresh, no-op if one is already running
+3. Counters (calls, coalesced, background starts) for the debug endpoints
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}  # {key: _Call} currently in flight
+        self.executed = 0
+        self.coalesced = 0
+        self.background = 0
+
+    def _begin(self, key):
+        """Return (call, is_owner)."""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self.calls[key] = call
+            self.executed += 1
+            return call, True
+
+    def _run(self, key, call, fn, args, kwargs):
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call for key is already in flight, in
+        which case wait for it. Re-raises the owner's exception to every waiter.
+        Returns None if timeout expires first (the call keeps running).
+        """
+        call, owner = self._begin(key)
+        if owner:
+            self._run(key, call, fn, args, kwargs)
+        elif not call.done.wait(timeout):
+            return None
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def start(self, key, fn, *args, **kwargs):
+        """Run fn in a background thread unless key is already in flight. Returns True if started."""
+        call, owner = self._begin(key)
+        if not owner:
+            return False
+        with self.lock:
+            self.background += 1
+        threading.Thread(target=self._run, args=(key, call, fn, args, kwargs), daemon=True).start()
+        return True
+
+    def in_flight(self, key):
+        return key in self.calls
+
+    def stats(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "in_flight": sorted(str(k) for k in self.calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "background": self.background
+            }
@@ -0,0 +1,167 @@
+"""
+SSE Hub - One producer, many subscribers for server-sent event feeds
+
+Each /api/whales/*stream client used to run its own loop: re-filter the whole
+cache, json.dumps it, sleep 5s. The hub does that work once per change:
+1. A single watcher polls a cheap version() (cache timestamp) and only when it
+   changes calls snapshot() and serializes the frames - once for all clients
+2. Clients get the same pre-encoded bytes: a full snapshot on connect, then
+   "delta" events with just the new items and the keys that left, and a full
+   resync every resync_every seconds
+3. Per-subscriber bounded queues: a slow client that falls behind has its
+   backlog dropped and is sent a full resync instead of blocking the others
+4. Subscriber count, frames / bytes sent and fan-out latency for the debug endpoint
+"""
+
+import json
+import queue
+import threading
+import time
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def sse_frame(payload, event=None):
+    """Encode one SSE message (payload serialized once, shared by every subscriber)."""
+    data = json.dumps(payload, separators=(",", ":"))
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {data}\n\n".encode()
+
+
+class BroadcastHub:
+
+    def __init__(self, name, version, snapshot, key, interval=1.0, resync_every=60, keepalive=15, max_queue=32):
+        self.name = name
+        self.version = version  # version() -> hashable, changes whenever snapshot() would
+        self.snapshot = snapshot  # snapshot() -> (items, extra): extra is merged into every payload
+        self.key = key  # key(item) -> JSON-able identity used for added / removed in deltas
+        self.interval = interval
+        self.resync_every = resync_every
+        self.keepalive = keepalive
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.started = False
+        self.current_version = None
+        self.current_keys = set()
+        self.full_frame = None
+        self.last_resync = 0
+        self.counters = {
+            "snapshots": 0, "deltas": 0, "resyncs": 0, "frames_sent": 0, "bytes_sent": 0,
+            "slow_resets": 0, "connects": 0, "peak_subscribers": 0, "errors": 0
+        }
+        self.fanout_ms = {"last": 0, "max": 0, "total": 0, "count": 0}
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._run, daemon=True, name=f"sse-hub-{self.name}").start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"⚠️ SSE hub {self.name} error: {e}")
+            time.sleep(self.interval)
+
+    def _build(self):
+        """Rebuild the full frame; returns the new items and the keys that left (for the delta)."""
+        items, extra = self.snapshot()
+        keys = [self.key(item) for item in items]
+        added = [item for item, k in zip(items, keys) if k not in self.current_keys]
+        removed = list(self.current_keys.difference(keys))
+        self.current_keys = set(keys)
+        self.full_frame = sse_frame({"data": items, **extra})
+        self.counters["snapshots"] += 1
+        return added, removed, extra
+
+    def poll(self):
+        """Publish a delta if the source changed, or a full resync when one is due."""
+        version = self.version()
+        now = time.time()
+        if version != self.current_version:
+            first = self.current_version is None
+            self.current_version = version
+            added, removed, extra = self._build()
+            if first or now - self.last_resync >= self.resync_every:
+                self._resync(now)
+            elif added or removed:
+                self.counters["deltas"] += 1
+                self._publish(sse_frame({"added": added, "removed": removed, **extra}, event="delta"))
+        elif now - self.last_resync >= self.resync_every and self.full_frame is not None:
+            self._resync(now)
+
+    def _resync(self, now):
+        self.last_resync = now
+        self.counters["resyncs"] += 1
+        self._publish(self.full_frame)
+
+    def _publish(self, frame):
+        start = time.perf_counter()
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(frame)
+            except queue.Full:
+                # Fell behind: drop the backlog, a full snapshot supersedes it
+                self.counters["slow_resets"] += 1
+                self._drain(q)
+                q.put_nowait(self.full_frame)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.fanout_ms["last"] = round(elapsed, 3)
+        self.fanout_ms["max"] = round(max(self.fanout_ms["max"], elapsed), 3)
+        self.fanout_ms["total"] += elapsed
+        self.fanout_ms["count"] += 1
+
+    @staticmethod
+    def _drain(q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+
+    def subscribe(self):
+        """Generator of encoded SSE frames for one client (full snapshot first)."""
+        self._start()
+        q = queue.Queue(self.max_queue)
+        with self.lock:
+            if self.full_frame is None:
+                self.current_version = self.version()
+                self._build()
+                self.last_resync = time.time()
+            q.put_nowait(self.full_frame)
+            self.subscribers.add(q)
+            self.counters["connects"] += 1
+            self.counters["peak_subscribers"] = max(self.counters["peak_subscribers"], len(self.subscribers))
+        try:
+            while True:
+                try:
+                    frame = q.get(timeout=self.keepalive)
+                except queue.Empty:
+                    frame = KEEPALIVE
+                self.counters["frames_sent"] += 1
+                self.counters["bytes_sent"] += len(frame)
+                yield frame
+        finally:
+            with self.lock:
+                self.subscribers.discard(q)
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["subscribers"] = len(self.subscribers)
+        fanout = self.fanout_ms
+        counters["fanout_ms"] = {
+            "last": fanout["last"], "max": fanout["max"],
+            "avg": round(fanout["total"] / fanout["count"], 3) if fanout["count"] else 0
+        }
+        counters["snapshot_items"] = len(self.current_keys)
+        counters["snapshot_bytes"] = len(self.full_frame) if self.full_frame else 0
+        counters["resync_every"] = self.resync_every
+        return counters
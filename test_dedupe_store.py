@@ -0,0 +1,76 @@
+from dedupe_store import DedupeStore
+
+
+def test_add_is_check_and_insert(tmp_path):
+    store = DedupeStore(str(tmp_path / "dedupe.json"))
+    store.roll("2026-10-16")
+    assert store.add("trade-1")
+    assert not store.add("trade-1")
+    assert store.counters["added"] == 1
+    assert store.counters["duplicates"] == 1
+
+
+def test_oldest_entries_are_evicted(tmp_path):
+    store = DedupeStore(str(tmp_path / "dedupe.json"), max_entries=3)
+    store.roll("2026-10-16")
+    for n in range(5):
+        store.add(f"trade-{n}")
+    assert list(store.seen) == ["trade-2", "trade-3", "trade-4"]
+    assert store.counters["evicted"] == 2
+    # An evicted id counts as new again
+    assert store.add("trade-0")
+
+
+def test_volume_watermarks_evict_least_recently_updated(tmp_path):
+    store = DedupeStore(str(tmp_path / "dedupe.json"), max_entries=2)
+    store.roll("2026-10-16")
+    store.set_volume("A", 10)
+    store.set_volume("B", 20)
+    store.set_volume("A", 15)
+    store.set_volume("C", 30)
+    assert store.last_volume("A") == 15
+    assert store.last_volume("B") == 0
+    assert store.last_volume("C") == 30
+
+
+def test_session_roll_clears(tmp_path):
+    store = DedupeStore(str(tmp_path / "dedupe.json"))
+    assert not store.roll("2026-10-15")
+    store.add("trade-1")
+    store.set_volume("A", 10)
+
+    assert not store.roll("2026-10-15")
+    assert len(store) == 2
+
+    assert store.roll("2026-10-16")
+    assert len(store) == 0
+    assert store.add("trade-1")
+    assert store.counters["resets"] == 1
+
+
+def test_snapshot_and_load(tmp_path):
+    path = str(tmp_path / "dedupe.json")
+    store = DedupeStore(path)
+    store.roll("2026-10-16")
+    store.add("trade-1")
+    store.set_volume("A", 10)
+    assert store.snapshot()
+    assert not store.snapshot()  # Nothing changed since
+
+    restarted = DedupeStore(path)
+    assert restarted.load("2026-10-16") == 2
+    assert not restarted.add("trade-1")
+    assert restarted.last_volume("A") == 10
+
+
+def test_load_ignores_older_session(tmp_path):
+    path = str(tmp_path / "dedupe.json")
+    store = DedupeStore(path)
+    store.roll("2026-10-15")
+    store.add("trade-1")
+    store.snapshot()
+
+    restarted = DedupeStore(path)
+    assert restarted.load("2026-10-16") == 0
+    restarted.roll("2026-10-16")
+    assert restarted.add("trade-1")
@@ -0,0 +1,157 @@
+import pytest
+
+import scheduler
+from scheduler import RetryAfter, Scheduler
+
+
+class FakeTime:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(scheduler, "time", fake)
+    return fake
+
+
+def run_queued(sched):
+    """Run every queued job in this thread (no worker pool)."""
+    ran = []
+    while not sched.ready.empty():
+        job = sched.ready.get()
+        sched._run_job(job)
+        ran.append(job.name)
+    return ran
+
+
+def make_scheduler(clock, **options):
+    sched = Scheduler(lambda: "regular")
+    job = sched.add("refresh", lambda: None, {"regular": 10}, jitter=0, **options)
+    sched.tick()  # Schedulable from now on
+    clock.now += 10
+    sched.tick()
+    assert run_queued(sched) == ["refresh"]
+    return sched, job
+
+
+def test_runs_on_a_fixed_grid(clock):
+    sched, job = make_scheduler(clock)
+    clock.now += 10
+    sched.tick()
+    assert run_queued(sched) == ["refresh"]
+    assert job.counters["runs"] == 2
+    assert job.counters["missed"] == 0
+
+
+def test_misfire_coalesce_runs_once(clock):
+    sched, job = make_scheduler(clock)
+    clock.now += 35  # Slot +10 runs late, +20 and +30 are missed
+    sched.tick()
+    sched.tick()
+    assert run_queued(sched) == ["refresh"]
+    assert job.counters["missed"] == 2
+    assert job.counters["runs"] == 2
+    # Re-anchored on the late run
+    clock.now += 9
+    sched.tick()
+    assert run_queued(sched) == []
+
+
+def test_misfire_skip_waits_for_the_next_slot(clock):
+    sched, job = make_scheduler(clock, misfire="skip")
+    start = clock.now
+    clock.now += 35
+    sched.tick()
+    assert run_queued(sched) == []
+    assert job.counters["missed"] == 2
+    assert job.counters["skipped"] == 1
+
+    clock.now = start + 40  # Next slot on the original grid
+    sched.tick()
+    assert run_queued(sched) == ["refresh"]
+
+
+def test_queued_job_is_not_an_overlap(clock):
+    sched, job = make_scheduler(clock)
+    clock.now += 10
+    sched.tick()
+    clock.now += 15  # Still waiting for a worker past its next slot
+    sched.tick()
+    assert sched.ready.qsize() == 1
+    assert job.counters["overlaps"] == 0
+    assert sched.stats()["jobs"]["refresh"]["state"] == "queued"
+
+    run_queued(sched)
+    assert job.last_lag == 15
+    assert job.last_wait == 15
+
+
+def test_due_mid_run_is_an_overlap(clock):
+    sched = Scheduler(lambda: "regular")
+
+    def slow():
+        clock.now += 15
+        sched.tick()
+
+    job = sched.add("slow", slow, {"regular": 10}, jitter=0)
+    sched.tick()
+    clock.now += 10
+    sched.tick()
+    run_queued(sched)
+    assert job.counters["overlaps"] == 1
+    assert sched.ready.empty()
+
+
+def test_retry_after_and_failures(clock):
+    sched = Scheduler(lambda: "regular")
+    outcomes = [RetryAfter(3), ValueError("boom")]
+
+    def flaky():
+        raise outcomes.pop(0)
+
+    job = sched.add("flaky", flaky, {"regular": 100}, jitter=0, retry=7)
+    sched.tick()
+    clock.now += 100
+    sched.tick()
+    run_queued(sched)
+    assert job.counters["failures"] == 0
+
+    clock.now += 3
+    sched.tick()
+    run_queued(sched)
+    assert job.counters["failures"] == 1
+    assert job.last_error == "boom"
+
+    clock.now += 6
+    sched.tick()
+    assert sched.ready.empty()
+    clock.now += 1
+    sched.tick()
+    assert sched.ready.qsize() == 1
+
+
+def test_paused_outside_its_sessions(clock):
+    session = {"name": "weekend"}
+    sched = Scheduler(lambda: session["name"])
+    job = sched.add("regular_only", lambda: None, {"regular": 10}, jitter=0)
+    sched.tick()
+    clock.now += 100
+    sched.tick()
+    assert sched.ready.empty()
+    assert sched.stats()["jobs"]["regular_only"]["state"] == "paused"
+
+    session["name"] = "regular"
+    sched.tick()
+    assert run_queued(sched) == ["regular_only"]
+    # Time spent paused is neither lag nor missed runs
+    assert job.counters["missed"] == 0
+    assert job.last_lag == 0
@@ -0,0 +1,52 @@
+import os
+
+os.environ.setdefault("GUNICORN_WORKER", "1")
+
+import run
+
+
+class FakeResponse:
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+
+def test_stream_survives_failure_on_second_page(monkeypatch):
+    calls = []
+
+    def fake_http_get(url, params=None, timeout=None):
+        calls.append(url)
+        if "cursor" in url:
+            raise ConnectionError("connection reset")
+        side = params["contract_type"]
+        return FakeResponse({
+            "results": [{"details": {"ticker": f"O:SPY-{side}-{i}"}} for i in range(3)],
+            "next_url": f"https://api.polygon.io/v3/snapshot/options/SPY?cursor={side}"
+        })
+
+    monkeypatch.setattr(run, "POLYGON_API_KEY", "test")
+    monkeypatch.setattr(run, "http_get", fake_http_get)
+    monkeypatch.setattr(run, "get_polygon_price", lambda symbol: 500.0)
+
+    snapshot = run.fetch_unusual_options_polygon("SPY")
+    tickers = [contract["details"]["ticker"] for contract in snapshot["results"]]
+
+    # Both first pages are delivered, the failed second pages end their cursors
+    assert sorted(tickers) == sorted(f"O:SPY-{side}-{i}" for side in ("call", "put") for i in range(3))
+    assert len(calls) == 4
+    assert snapshot["_pagination"]["pages"] == 2
+    assert snapshot["_pagination"]["errors"] == 2
+    assert not snapshot["_pagination"]["truncated"]
+
+
+def test_stream_counts_non_200_page(monkeypatch):
+    # Non-200 on the first page: nothing yielded, one error counted
+    stats = {"pages": 0, "contracts": 0, "truncated": False, "errors": 0}
+    monkeypatch.setattr(run, "http_get", lambda url, params=None, timeout=None: FakeResponse({}, status_code=429))
+    assert list(run.iter_polygon_snapshot("SPY", {}, page_stats=stats)) == []
+    assert stats["errors"] == 1
+    assert stats["pages"] == 0
@@ -0,0 +1,77 @@
+from trade_log import ContractTradeLog
+
+TICKER = "O:SPY261218C00500000"
+
+
+def trade(ts, price=1.0, size=1):
+    return {"sip_timestamp": ts, "price": price, "size": size, "sequence_number": ts, "exchange": 300,
+            "conditions": [209], "participant_timestamp": ts}
+
+
+def test_append_needs_a_log(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=10)
+    assert log.meta(TICKER) is None
+    assert not log.append(TICKER, [trade(1)])
+
+
+def test_replace_then_append(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=10)
+    log.replace(TICKER, [trade(3), trade(1), trade(2)], since=0)
+    assert log.meta(TICKER)["cursor"] == 3
+
+    assert log.append(TICKER, [trade(5), trade(4)])
+    meta = log.meta(TICKER)
+    assert meta["cursor"] == 5
+    assert meta["count"] == 5
+    assert meta["since"] == 0
+
+    trades = log.read(TICKER)
+    assert [t["sip_timestamp"] for t in trades] == [1, 2, 3, 4, 5]
+    # Only TRADE_FIELDS are persisted
+    assert "participant_timestamp" not in trades[0]
+
+
+def test_replace_keeps_the_newest(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=3)
+    log.replace(TICKER, [trade(ts) for ts in range(1, 6)], since=0)
+    assert [t["sip_timestamp"] for t in log.read(TICKER)] == [3, 4, 5]
+    # The log no longer holds everything since 0
+    assert log.meta(TICKER)["since"] == 3
+
+
+def test_compacts_once_the_log_doubles(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=3)
+    log.replace(TICKER, [trade(1), trade(2), trade(3)], since=0)
+    log.append(TICKER, [trade(4), trade(5), trade(6)])
+    assert log.counters["compactions"] == 0
+
+    log.append(TICKER, [trade(7)])
+    assert log.counters["compactions"] == 1
+    assert [t["sip_timestamp"] for t in log.read(TICKER)] == [5, 6, 7]
+    meta = log.meta(TICKER)
+    assert meta["count"] == 3
+    assert meta["since"] == 5
+    assert meta["cursor"] == 7
+
+
+def test_read_drops_duplicates_and_torn_lines(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=10)
+    log.replace(TICKER, [trade(1), trade(2)], since=0)
+    # Interrupted append retried: same trade twice, then a torn line
+    log.append(TICKER, [trade(3)])
+    log.append(TICKER, [trade(3)])
+    with open(log._path(TICKER, ".jsonl"), "a") as f:
+        f.write('{"sip_timestamp": 4, "pri')
+
+    assert [t["sip_timestamp"] for t in log.read(TICKER)] == [1, 2, 3]
+
+
+def test_locked_is_exclusive(tmp_path):
+    log = ContractTradeLog(str(tmp_path), keep=10)
+    with log.locked(TICKER) as owner:
+        assert owner
+        with log.locked(TICKER) as other:
+            assert not other
+    assert log.counters["busy"] == 1
+    with log.locked(TICKER) as owner:
+        assert owner
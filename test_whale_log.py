@@ -0,0 +1,115 @@
+import json
+import os
+
+from whale_log import WhaleEventLog, _encode
+
+
+def whale(n):
+    return {"symbol": f"O:SPY261218C00{500 + n}000", "premium": 100000 + n, "seq": n}
+
+
+def test_append_and_replay(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    log = WhaleEventLog(path)
+    log.append("2026-10-16", [whale(1), whale(2)], 100)
+    log.append("2026-10-16", [whale(3)], 200)
+
+    whales, timestamp = WhaleEventLog(path).replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [1, 2, 3]
+    assert timestamp == 200
+
+
+def test_replay_other_session_is_empty(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    log = WhaleEventLog(path)
+    log.append("2026-10-15", [whale(1)], 100)
+    log.append("2026-10-16", [whale(2)], 200)
+
+    assert WhaleEventLog(path).replay("2026-10-15") == ([], 0)
+    whales, _ = WhaleEventLog(path).replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [2]
+
+
+def test_uncommitted_batch_is_dropped(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    WhaleEventLog(path).append("2026-10-16", [whale(1)], 100)
+    # Crash after the whale records, before the commit record
+    with open(path, "ab") as f:
+        f.write(_encode({"kind": "whale", "whale": whale(2)}))
+
+    whales, timestamp = WhaleEventLog(path).replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [1]
+    assert timestamp == 100
+
+
+def test_torn_tail_is_truncated_on_next_append(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    WhaleEventLog(path).append("2026-10-16", [whale(1)], 100)
+    good_size = os.path.getsize(path)
+    # Crash halfway through a record
+    with open(path, "ab") as f:
+        f.write(_encode({"kind": "whale", "whale": whale(2)})[:7])
+
+    log = WhaleEventLog(path)
+    whales, _ = log.replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [1]
+
+    log = WhaleEventLog(path)
+    log.append("2026-10-16", [whale(3)], 300)
+    assert log.counters["torn_tails"] == 1
+    assert log.counters["truncated_bytes"] == 7
+    assert os.path.getsize(path) > good_size
+
+    whales, timestamp = WhaleEventLog(path).replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [1, 3]
+    assert timestamp == 300
+
+
+def test_checkpoint_mismatch_walks_from_the_top(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    log = WhaleEventLog(path)
+    log.append("2026-10-15", [whale(1)], 100)
+    log.append("2026-10-16", [whale(2)], 200)
+
+    with open(path + ".ckpt") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["session"] == "2026-10-16" and checkpoint["offset"] > 0
+
+    # Offset no longer points at a session record (e.g. stale after a compaction)
+    checkpoint["offset"] += 1
+    with open(path + ".ckpt", "w") as f:
+        json.dump(checkpoint, f)
+
+    log = WhaleEventLog(path)
+    whales, _ = log.replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [2]
+    assert log.counters["checkpoint_misses"] == 1
+
+
+def test_checkpoint_seeks_to_the_session(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    log = WhaleEventLog(path)
+    log.append("2026-10-15", [whale(1), whale(2)], 100)
+    log.append("2026-10-16", [whale(3)], 200)
+
+    log = WhaleEventLog(path)
+    log.replay("2026-10-16")
+    stats = log.stats()
+    assert stats["checkpoint_misses"] == 0
+    assert stats["records"] == 7
+    assert stats["session_records"] == 3
+
+
+def test_compact(tmp_path):
+    path = str(tmp_path / "whales.bin")
+    log = WhaleEventLog(path, compact_after=5)
+    for n in range(4):
+        log.append("2026-10-16", [whale(n)], 100 + n)
+    assert log.needs_compaction()
+
+    log.compact("2026-10-16", [whale(2), whale(3)], 103)
+    assert not log.needs_compaction()
+
+    whales, timestamp = WhaleEventLog(path).replay("2026-10-16")
+    assert [w["seq"] for w in whales] == [2, 3]
+    assert timestamp == 103
@@ -0,0 +1,185 @@
+"""
+Trade Log - Persisted per-contract trade history with a fetch cursor
+
+Repeat Fish Finder scans re-downloaded up to 30 days of trades per contract.
+The log keeps what was already fetched so a refresh only asks for the delta:
+1. <contract>.jsonl: append-only trades (oldest first), one compact JSON per line
+2. <contract>.meta.json: cursor (newest sip_timestamp seen) + since (the log
+   holds EVERY trade in [since, cursor])
+3. Only the newest `keep` trades can ever be served, so the log is compacted
+   back down to them once it doubles
+4. Per-contract flock (non-blocking) so two workers never append the same delta;
+   the loser just fetches without the log
+
+Files live under /tmp (override with LIBRARY_TRADE_LOG_DIR) next to the whale cache.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Only the fields the library endpoint reads are persisted
+TRADE_FIELDS = ("sip_timestamp", "price", "size", "conditions", "exchange", "sequence_number")
+
+
+def default_log_dir():
+    return os.environ.get("LIBRARY_TRADE_LOG_DIR") or os.path.join(tempfile.gettempdir(), "pigmentos_trades")
+
+
+def _trade_key(trade):
+    return trade.get("sip_timestamp"), trade.get("sequence_number"), trade.get("price"), trade.get("size")
+
+
+class ContractTradeLog:
+
+    def __init__(self, directory=None, keep=1000):
+        self.directory = directory or default_log_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.counters = {
+            "reads": 0, "appends": 0, "appended_trades": 0, "resets": 0,
+            "compactions": 0, "busy": 0
+        }
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counters[key] += n
+
+    def _path(self, ticker, suffix):
+        safe = "".join(c if c.isalnum() else "_" for c in ticker)
+        return os.path.join(self.directory, safe + suffix)
+
+    @contextmanager
+    def locked(self, ticker):
+        """Yield True if this process owns the contract's log, False if another worker is updating it."""
+        fd = os.open(self._path(ticker, ".lock"), os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._count("busy")
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def meta(self, ticker):
+        """{"since": ns, "cursor": ns, "count": n} or None if the contract has no log."""
+        try:
+            with open(self._path(ticker, ".meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, ticker, meta):
+        self._atomic_write(self._path(ticker, ".meta.json"), json.dumps(meta))
+
+    def _atomic_write(self, path, text):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def read(self, ticker):
+        """All logged trades, oldest first (duplicates from an interrupted append are dropped)."""
+        self._count("reads")
+        trades = []
+        seen = set()
+        try:
+            with open(self._path(ticker, ".jsonl")) as f:
+                for line in f:
+                    try:
+                        trade = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    key = _trade_key(trade)
+                    if key not in seen:
+                        seen.add(key)
+                        trades.append(trade)
+        except OSError:
+            return []
+        trades.sort(key=lambda t: t.get("sip_timestamp") or 0)
+        return trades
+
+    def replace(self, ticker, trades, since):
+        """Start the log over with trades (any order) covering [since, newest]."""
+        trades = sorted(trades, key=lambda t: t.get("sip_timestamp") or 0)[-self.keep:] if trades else []
+        if len(trades) >= self.keep:
+            since = max(since, trades[0]["sip_timestamp"])
+        self._rewrite(ticker, trades, since)
+        self._count("resets")
+
+    def append(self, ticker, trades):
+        """Add trades newer than the cursor (any order); compacts once the log doubles."""
+        meta = self.meta(ticker)
+        if meta is None:
+            return False
+        trades = sorted(trades, key=lambda t: t.get("sip_timestamp") or 0)
+        if not trades:
+            meta["checked_at"] = time.time()
+            self._write_meta(ticker, meta)
+            return True
+
+        with open(self._path(ticker, ".jsonl"), "a") as f:
+            f.write("".join(self._line(t) for t in trades))
+        meta["cursor"] = max(meta["cursor"], trades[-1]["sip_timestamp"])
+        meta["count"] += len(trades)
+        meta["checked_at"] = time.time()
+        self._count("appends")
+        self._count("appended_trades", len(trades))
+
+        if meta["count"] > 2 * self.keep:
+            kept = self.read(ticker)[-self.keep:]
+            self._rewrite(ticker, kept, max(meta["since"], kept[0]["sip_timestamp"]))
+            self._count("compactions")
+        else:
+            self._write_meta(ticker, meta)
+        return True
+
+    def _line(self, trade):
+        return json.dumps({k: trade[k] for k in TRADE_FIELDS if k in trade}, separators=(",", ":")) + "\n"
+
+    def _rewrite(self, ticker, trades, since):
+        self._atomic_write(self._path(ticker, ".jsonl"), "".join(self._line(t) for t in trades))
+        cursor = trades[-1]["sip_timestamp"] if trades else since
+        self._write_meta(ticker, {"since": since, "cursor": cursor, "count": len(trades), "checked_at": time.time()})
+
+    def prune(self, max_age_days=31):
+        """Delete logs not touched for max_age_days (expired contracts)."""
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        counters["directory"] = self.directory
+        counters["keep"] = self.keep
+        return counters
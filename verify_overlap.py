@@ -19,7 +19,8 @@ def test_overlap():
     print("🧪 Testing Data Overlap between Polygon and Alpaca...")
     
     # Reset History
-    run.WHALE_HISTORY = {}
+    run.WHALE_DEDUPE.seen.clear()
+    run.WHALE_DEDUPE.volumes.clear()
     
     # Common Trade Details
     symbol = "SPY"
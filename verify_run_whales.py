@@ -38,8 +38,8 @@ def verify_whales():
     # Ideally, if volumes haven't changed much, the output should be stable
     # We can't easily mock yfinance here without more complex patching,
     # but we can verify the code runs without error and history is populated.
-    from run import WHALE_HISTORY
-    print(f"📜 History contains {len(WHALE_HISTORY)} tracked contracts")
+    from run import WHALE_DEDUPE
+    print(f"📜 History contains {len(WHALE_DEDUPE.seen)} seen trades, {len(WHALE_DEDUPE.volumes)} tracked contracts")
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ from datetime import datetime, date
 from unittest.mock import patch, MagicMock
 
 sys.path.append(os.getcwd())
-from run import refresh_single_whale_polygon, CACHE, WHALE_HISTORY
+from run import refresh_single_whale_polygon, CACHE, WHALE_DEDUPE
 
 def test_whale_date_filter():
     print("🧪 Testing Whale Stream Date Filtering (Today vs Yesterday)...")
@@ -53,7 +53,8 @@ def test_whale_date_filter():
         with patch('run.fetch_unusual_options_polygon', return_value=mock_data):
             # Clear Cache first
             CACHE["whales"]["data"] = []
-            WHALE_HISTORY.clear()
+            WHALE_DEDUPE.seen.clear()
+            WHALE_DEDUPE.volumes.clear()
             
             # Run Logic
             refresh_single_whale_polygon("SPY")
@@ -0,0 +1,228 @@
+"""
+VWAP Aggregator - Rolling per-contract VWAP buckets, O(1) per trade
+
+Replaces the VWAP trade buffer (last 1000 raw trades, re-bucketed on every request):
+1. Each watched contract gets a fixed-size ring of 1-minute slots (price x volume,
+   volume, call / put volume) - a trade is one slot update, no list copies
+2. A slot is reset when the ring wraps onto a new minute, so the ring always holds
+   the last ring_minutes (default: the full 4 AM - 8 PM extended session)
+3. buckets(): any bucket width is folded from the 1-minute slots of the current
+   session (vectorized) and cached until the contract's next trade
+4. At most max_contracts rings; the least recently updated one is evicted
+5. seed(): a newly watched contract's session so far is folded in once from its
+   stored 1-minute bars, so live trades extend the history instead of replacing it
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+EASTERN = pytz.timezone("US/Eastern")
+
+
+def _to_ms(ts):
+    """Trade timestamp (ms, seconds or ISO string) -> epoch ms, None if unparseable."""
+    if isinstance(ts, (int, float)):
+        return int(ts if ts > 1e10 else ts * 1000)
+    try:
+        return int(datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+class _Ring:
+    __slots__ = ("minute", "pv", "volume", "call_volume", "put_volume", "trades", "last_minute", "version",
+                 "seeded", "seeded_bars")
+
+    def __init__(self, size):
+        self.minute = np.full(size, -1, dtype=np.int64)  # epoch minute each slot currently holds
+        self.pv = np.zeros(size, dtype=np.float64)
+        self.volume = np.zeros(size, dtype=np.float64)
+        self.call_volume = np.zeros(size, dtype=np.float64)
+        self.put_volume = np.zeros(size, dtype=np.float64)
+        self.trades = 0
+        self.last_minute = -1
+        self.version = 0
+        self.seeded = False
+        self.seeded_bars = 0
+
+
+class VWAPAggregator:
+
+    def __init__(self, ring_minutes=960, max_contracts=256):
+        self.ring_minutes = ring_minutes
+        self.max_contracts = max_contracts
+        self.rings = OrderedDict()  # {contract: _Ring}, least recently updated first
+        self.serialized = {}  # {(contract, bucket_minutes): (version, buckets)}
+        self.lock = threading.Lock()
+        self.trades_added = 0
+        self.evicted = 0
+        self.cache_hits = 0
+        self.bars_seeded = 0
+
+    def __contains__(self, contract):
+        return contract in self.rings
+
+    def watch(self, contract):
+        """Start a ring for contract (no-op if it has one) so its trades get aggregated."""
+        with self.lock:
+            self._ring(contract)
+
+    def _ring(self, contract):
+        ring = self.rings.get(contract)
+        if ring is None:
+            ring = self.rings[contract] = _Ring(self.ring_minutes)
+            while len(self.rings) > self.max_contracts:
+                evicted, _ = self.rings.popitem(last=False)
+                for key in [k for k in self.serialized if k[0] == evicted]:
+                    del self.serialized[key]
+                self.evicted += 1
+        else:
+            self.rings.move_to_end(contract)
+        return ring
+
+    def add(self, contract, price, size, timestamp, is_call=True):
+        """Fold one trade into its minute slot."""
+        if not (price > 0 and size > 0):
+            return
+        ts_ms = _to_ms(timestamp)
+        if not ts_ms:
+            return
+        minute = ts_ms // 60000
+        with self.lock:
+            ring = self._ring(contract)
+            slot = minute % self.ring_minutes
+            if ring.minute[slot] != minute:
+                if ring.minute[slot] > minute:
+                    return  # Older than the ring covers
+                ring.minute[slot] = minute
+                ring.pv[slot] = ring.volume[slot] = ring.call_volume[slot] = ring.put_volume[slot] = 0
+            ring.pv[slot] += price * size
+            ring.volume[slot] += size
+            if is_call:
+                ring.call_volume[slot] += size
+            else:
+                ring.put_volume[slot] += size
+            ring.trades += 1
+            ring.last_minute = max(ring.last_minute, minute)
+            ring.version += 1
+            self.trades_added += 1
+
+    def needs_seed(self, contract):
+        ring = self.rings.get(contract)
+        return ring is not None and not ring.seeded
+
+    def seed(self, contract, bars, is_call=True):
+        """
+        Fold 1-minute bars (Polygon dicts: t, v, vw / c) into contract's ring, once.
+        Minutes that already hold live trades keep them; returns the bars used.
+        """
+        minutes = []
+        for bar in bars:
+            ts_ms = _to_ms(bar.get("t"))
+            price, size = bar.get("vw") or bar.get("c") or 0, bar.get("v") or 0
+            if ts_ms and price > 0 and size > 0:
+                minutes.append((ts_ms // 60000, price, size))
+        if not minutes:
+            return 0
+        oldest = max(m[0] for m in minutes) - self.ring_minutes + 1
+        with self.lock:
+            ring = self.rings.get(contract)
+            if ring is None or ring.seeded:
+                return 0
+            used = 0
+            for minute, price, size in minutes:
+                slot = minute % self.ring_minutes
+                if minute < oldest or ring.minute[slot] >= minute:
+                    continue  # Outside the ring / live trades (or a newer minute) already there
+                ring.minute[slot] = minute
+                ring.pv[slot] = price * size
+                ring.volume[slot] = size
+                ring.call_volume[slot] = size if is_call else 0
+                ring.put_volume[slot] = 0 if is_call else size
+                ring.last_minute = max(ring.last_minute, minute)
+                used += 1
+            ring.seeded = True
+            ring.seeded_bars = used
+            ring.version += 1
+            self.bars_seeded += used
+            return used
+
+    def clear(self, contract=None):
+        with self.lock:
+            if contract:
+                self.rings.pop(contract, None)
+                for key in [k for k in self.serialized if k[0] == contract]:
+                    del self.serialized[key]
+            else:
+                self.rings.clear()
+                self.serialized.clear()
+
+    def trade_count(self, contract):
+        """Live trades + seeded bars in contract's ring."""
+        ring = self.rings.get(contract)
+        return ring.trades + ring.seeded_bars if ring else 0
+
+    def buckets(self, contract, bucket_minutes=5):
+        """
+        [{time: "HH:MM", vwap, call_volume, put_volume, total_volume}] for the
+        contract's latest ET session (bucket keys rounded down within the hour).
+        """
+        with self.lock:
+            ring = self.rings.get(contract)
+            if ring is None or ring.last_minute < 0:
+                return []
+            cached = self.serialized.get((contract, bucket_minutes))
+            if cached and cached[0] == ring.version:
+                self.cache_hits += 1
+                return cached[1]
+            version = ring.version
+            minute, pv = ring.minute.copy(), ring.pv.copy()
+            volume, call_volume, put_volume = ring.volume.copy(), ring.call_volume.copy(), ring.put_volume.copy()
+            last_minute = ring.last_minute
+
+        # Session = ET calendar day of the newest trade
+        last_et = datetime.fromtimestamp(last_minute * 60, EASTERN)
+        session_start = EASTERN.localize(datetime(last_et.year, last_et.month, last_et.day))
+        offset_min = int(last_et.utcoffset().total_seconds() // 60)
+        start_minute = int(session_start.timestamp() // 60)
+        end_minute = int((session_start + timedelta(days=1)).timestamp() // 60)
+
+        keep = (minute >= start_minute) & (minute < end_minute) & (volume > 0)
+        if not keep.any():
+            return []
+        et_minute = (minute[keep] + offset_min) % 1440
+        # Round down within the hour, same keys as dt.replace(minute=minute // n * n)
+        bucket = et_minute // 60 * 60 + (et_minute % 60) // bucket_minutes * bucket_minutes
+        keys, idx = np.unique(bucket, return_inverse=True)
+        sums = [np.bincount(idx, weights=col[keep], minlength=len(keys)) for col in (pv, volume, call_volume, put_volume)]
+
+        result = [
+            {
+                "time": f"{key // 60:02d}:{key % 60:02d}",
+                "vwap": round(b_pv / b_vol, 4),
+                "call_volume": int(b_call),
+                "put_volume": int(b_put),
+                "total_volume": int(b_vol)
+            }
+            for key, b_pv, b_vol, b_call, b_put in zip(keys.tolist(), *(s.tolist() for s in sums))
+        ]
+        with self.lock:
+            self.serialized[(contract, bucket_minutes)] = (version, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                "contracts": len(self.rings),
+                "max_contracts": self.max_contracts,
+                "ring_minutes": self.ring_minutes,
+                "trades_added": self.trades_added,
+                "bars_seeded": self.bars_seeded,
+                "evicted": self.evicted,
+                "serialize_cache_hits": self.cache_hits,
+                "cached_series": len(self.serialized)
+            }
@@ -0,0 +1,109 @@
+"""
+Whale Index - Bitset indexes over one whale feed snapshot
+
+The whale endpoints each scanned the whole feed per request, converting every
+timestamp to an ET date and re-parsing tickers. The index is built once per
+feed change (the feed only changes on a scan merge / leader sync):
+1. Per-trading-day partitions: ET date -> bitset of feed positions
+2. Underlying ticker -> bitset, so the unique-ticker list for a day is a few ANDs
+3. Flag bitsets: lotto, call / put, moneyness (itm / atm / otm)
+4. Seqs in sorted order -> "newer than cursor" bitset by bisection
+Bit i is feed position i, so selecting by ascending bit keeps the feed's
+newest-first order and pagination just skips the first `offset` hits.
+"""
+
+import bisect
+import re
+from datetime import datetime
+
+_UNDERLYING = re.compile(r"([A-Z]+)")
+
+
+def underlying_of(whale):
+    """Underlying ticker of a whale ("NVDA" for baseSymbol NVDA or symbol O:NVDA...)."""
+    base = whale.get("baseSymbol")
+    if base:
+        return base
+    match = _UNDERLYING.match((whale.get("symbol") or whale.get("ticker") or "").replace("O:", ""))
+    return match.group(1) if match else ""
+
+
+def iter_bits(mask):
+    """Positions of the set bits, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class WhaleIndex:
+
+    def __init__(self, whales, tz, source=None):
+        self.items = list(whales)
+        self.source = source  # The CACHE entry this was built from (identity = freshness check)
+        self.all = (1 << len(self.items)) - 1
+        self.days = {}  # {ET date: mask}
+        self.tickers = {}  # {underlying: mask}
+        self.lotto = 0
+        self.types = {"call": 0, "put": 0}
+        self.moneyness = {}  # {"itm" / "atm" / "otm": mask}
+        seqs = []
+
+        for i, whale in enumerate(self.items):
+            bit = 1 << i
+            try:
+                day = datetime.fromtimestamp(whale["timestamp"], tz).date()
+                self.days[day] = self.days.get(day, 0) | bit
+            except (KeyError, TypeError, ValueError, OverflowError, OSError):
+                pass
+            ticker = underlying_of(whale)
+            self.tickers[ticker] = self.tickers.get(ticker, 0) | bit
+            if whale.get("is_lotto", False):
+                self.lotto |= bit
+            put_call = whale.get("putCall", "")
+            trade_type = "call" if put_call == "C" else "put" if put_call == "P" else str(whale.get("type", "")).lower()
+            if trade_type in self.types:
+                self.types[trade_type] |= bit
+            moneyness = str(whale.get("moneyness", "")).lower()
+            self.moneyness[moneyness] = self.moneyness.get(moneyness, 0) | bit
+            if "seq" in whale:
+                seqs.append((whale["seq"], i))
+
+        seqs.sort()
+        self.seq_keys = [seq for seq, _ in seqs]
+        self.seq_positions = [i for _, i in seqs]
+
+    def __len__(self):
+        return len(self.items)
+
+    def day(self, date):
+        return self.days.get(date, 0)
+
+    def ticker_mask(self, tickers):
+        mask = 0
+        for ticker in tickers:
+            mask |= self.tickers.get(ticker, 0)
+        return mask
+
+    def newer_than(self, seq):
+        """Mask of whales with seq > seq."""
+        mask = 0
+        for i in self.seq_positions[bisect.bisect_right(self.seq_keys, seq):]:
+            mask |= 1 << i
+        return mask
+
+    def select(self, mask, offset=0, limit=None):
+        """Whales in mask, feed order, paginated."""
+        result = []
+        for i in iter_bits(mask):
+            if offset:
+                offset -= 1
+                continue
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(self.items[i])
+        return result
+
+    def tickers_in(self, mask):
+        """Sorted unique underlyings with at least one whale in mask."""
+        return sorted(ticker for ticker, bits in self.tickers.items() if ticker and bits & mask)
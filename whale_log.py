@@ -0,0 +1,210 @@
+"""
+Whale Log - Append-only whale event log with a checkpoint index
+
+save_whale_cache re-serialized the whole feed to one JSON file after every scan
+that found anything (building it under CACHE_LOCK), and startup re-parsed all of it:
+1. Records are length-prefixed and CRC-checked: [length u32][crc32 u32][JSON payload]
+2. A scan appends only its new whales followed by a commit record. Replay drops
+   whales after the last commit, and the next append truncates a torn tail, so a
+   crash mid-write loses at most that batch and never the records before it
+3. A session record opens every trading day; the checkpoint (small JSON sidecar,
+   replaced atomically) holds the byte offset of the current session record, so
+   startup seeks straight to it and replays only that day
+4. Past compact_after records the log is rewritten (temp file + os.replace) to a
+   session record + the whales still in the live feed
+"""
+
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct(">II")  # payload length, crc32(payload)
+MAX_RECORD = 1 << 20  # Anything bigger is a garbled length prefix
+
+
+def _encode(payload):
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def _records(f, offset):
+    """Yield (start, end, payload) for each valid record from offset; stops at the first torn / corrupt one."""
+    f.seek(offset)
+    while True:
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            return
+        length, crc = HEADER.unpack(head)
+        if length > MAX_RECORD:
+            return
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            return
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return
+        end = offset + HEADER.size + length
+        yield offset, end, payload
+        offset = end
+
+
+class WhaleEventLog:
+
+    def __init__(self, path, compact_after=2000):
+        self.path = path
+        self.checkpoint_path = path + ".ckpt"
+        self.compact_after = compact_after
+        self.lock = threading.Lock()
+        # Tail state (as of the last walk / write by this process)
+        self.session = None
+        self.session_offset = 0  # Byte offset of the current session record
+        self.before = 0  # Records before session_offset (older sessions)
+        self.records = 0  # Committed records in the file
+        self.end = None  # Byte offset after the last commit (None = not walked yet)
+        self.counters = {
+            "appends": 0, "appended_whales": 0, "replays": 0, "replayed_whales": 0,
+            "torn_tails": 0, "truncated_bytes": 0, "compactions": 0, "checkpoint_misses": 0
+        }
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_checkpoint(self):
+        checkpoint = {
+            "session": self.session, "offset": self.session_offset, "before": self.before,
+            "records": self.records, "end": self.end, "updated": time.time()
+        }
+        self._atomic_write(self.checkpoint_path, json.dumps(checkpoint).encode())
+
+    def _atomic_write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_whale_log_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _start(self, f, size):
+        """(offset, records before it) to walk from: the checkpointed session record if it checks out, else the top."""
+        checkpoint = self._read_checkpoint()
+        if checkpoint and 0 < checkpoint.get("offset", 0) < size:
+            for _, _, payload in _records(f, checkpoint["offset"]):
+                if payload.get("kind") == "session" and payload.get("session") == checkpoint.get("session"):
+                    return checkpoint["offset"], checkpoint.get("before", 0)
+                break
+            self.counters["checkpoint_misses"] += 1  # Stale after a compaction / crash - walk everything
+        return 0, 0
+
+    def _walk(self, f, size):
+        """Read the latest session up to its last commit; updates the tail state, returns (whales, commit timestamp)."""
+        offset, records = self._start(f, size)
+        self.session, self.session_offset, self.before = None, offset, records
+        self.records, self.end = records, offset
+        committed, pending, timestamp = [], [], 0
+        for start, end, payload in _records(f, offset):
+            records += 1
+            kind = payload.get("kind")
+            if kind == "session":
+                self.session, self.session_offset, self.before = payload.get("session"), start, records - 1
+                committed, pending, timestamp = [], [], 0
+            elif kind == "whale":
+                pending.append(payload["whale"])
+                continue
+            elif kind == "commit":
+                committed.extend(pending)
+                pending = []
+                timestamp = payload.get("timestamp", 0)
+            self.records, self.end = records, end
+        return committed, timestamp
+
+    def replay(self, session):
+        """Whale feed dicts committed during session (append order) and the last commit timestamp."""
+        with self.lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return [], 0
+            with f:
+                whales, timestamp = self._walk(f, os.fstat(f.fileno()).st_size)
+            if self.session != session:
+                return [], 0
+            self.counters["replays"] += 1
+            self.counters["replayed_whales"] += len(whales)
+            return whales, timestamp
+
+    def _sync_tail(self):
+        """Before writing: re-walk if the file changed under us and cut off a torn tail."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            self.session, self.session_offset, self.before, self.records, self.end = None, 0, 0, 0, 0
+            return
+        if size == self.end:
+            return
+        with open(self.path, "r+b") as f:
+            self._walk(f, size)
+            if size > self.end:
+                f.truncate(self.end)
+                self.counters["torn_tails"] += 1
+                self.counters["truncated_bytes"] += size - self.end
+
+    def append(self, session, whales, timestamp):
+        """Append one batch of whale feed dicts + a commit (opening a session record when the session changed)."""
+        with self.lock:
+            self._sync_tail()
+            chunks = []
+            new_session = session != self.session
+            if new_session:
+                chunks.append(_encode({"kind": "session", "session": session}))
+            chunks.extend(_encode({"kind": "whale", "whale": whale}) for whale in whales)
+            chunks.append(_encode({"kind": "commit", "timestamp": timestamp, "count": len(whales)}))
+            with open(self.path, "ab") as f:
+                f.write(b"".join(chunks))
+            if new_session:
+                self.session, self.session_offset, self.before = session, self.end, self.records
+            self.records += len(chunks)
+            self.end += sum(len(chunk) for chunk in chunks)
+            self._write_checkpoint()
+            self.counters["appends"] += 1
+            self.counters["appended_whales"] += len(whales)
+
+    def needs_compaction(self):
+        return self.records > self.compact_after
+
+    def compact(self, session, whales, timestamp):
+        """Rewrite the log as just session + whales (the live feed)."""
+        chunks = [_encode({"kind": "session", "session": session})]
+        chunks.extend(_encode({"kind": "whale", "whale": whale}) for whale in whales)
+        chunks.append(_encode({"kind": "commit", "timestamp": timestamp, "count": len(whales)}))
+        data = b"".join(chunks)
+        with self.lock:
+            self._atomic_write(self.path, data)
+            self.session, self.session_offset, self.before = session, 0, 0
+            self.records, self.end = len(chunks), len(data)
+            self._write_checkpoint()
+            self.counters["compactions"] += 1
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["session"] = self.session
+            counters["records"] = self.records
+            counters["session_records"] = self.records - self.before
+            counters["bytes"] = self.end
+        counters["compact_after"] = self.compact_after
+        counters["path"] = self.path
+        return counters